@@ -8,15 +8,18 @@ import discord
 from discord.ext import commands
 import asyncio
 import logging
+import re
+import time
 from datetime import datetime
 import aiohttp
 from aiohttp_socks import ProxyConnector
 from config import Config
 from lm_studio_client import LMStudioClient
 from conversation_manager import ConversationManager
-from utils import setup_logging, error_handler
+from utils import setup_logging, error_handler, first_image_url
 from web_search import WebSearchTool, SearchEnhancedLLM
 from image_processing import ImageProcessor
+from semantic_cache import SemanticCache
 
 # Настройка логирования
 setup_logging()
@@ -57,15 +60,22 @@ class AdvancedDiscordBot(commands.Bot):
                 logger.error(f"❌ Ошибка создания прокси коннектора: {e}")
                 logger.warning("⚠️ Продолжение без прокси")
         
+        # Общая HTTP сессия для веб-поиска и изображений (keep-alive между запросами)
+        self._http_session = self._create_http_session(proxy_url)
+        
         # Инициализация компонентов
         self.lm_client = LMStudioClient(Config.LM_STUDIO_URL)
         self.conversation_manager = ConversationManager(
-            max_history=Config.MAX_CONTEXT_MESSAGES
+            max_history=Config.MAX_CONTEXT_MESSAGES,
+            history_buffer=Config.PREFIX_CACHE_BUFFER
         )
         
         # Инициализация веб-поиска С ПРОКСИ
         logger.info("🔧 Инициализация веб-поиска...")
-        self.web_search = WebSearchTool(proxy_url=proxy_url)
+        self.web_search = WebSearchTool(
+            proxy_url=proxy_url,
+            session=self._http_session
+        )
         self.search_enhanced_llm = SearchEnhancedLLM(self.lm_client, self.web_search)
         logger.info("✅ Веб-поиск инициализирован")
         
@@ -73,11 +83,64 @@ class AdvancedDiscordBot(commands.Bot):
         logger.info("🔧 Инициализация обработки изображений...")
         self.image_processor = ImageProcessor(
             lm_client=self.lm_client,
-            proxy_url=proxy_url
+            proxy_url=proxy_url,
+            session=self._http_session,
+            cpu_workers=Config.IMAGE_POOL_WORKERS
         )
         logger.info("✅ Обработка изображений инициализирована")
         
+        # Семантический кэш ответов на упоминания и команды чата
+        self.semantic_cache = SemanticCache(
+            model=Config.SEMANTIC_CACHE_MODEL,
+            tau=Config.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES,
+            enabled=Config.SEMANTIC_CACHE_ENABLED,
+            ttl=Config.SEMANTIC_CACHE_TTL
+        )
+        
+        # Регулярка для удаления упоминания бота (<@id> и <@!id>), создаётся в on_ready
+        self._mention_re: re.Pattern = None
+        
         self.start_time = datetime.now()
+        # Монотонные часы для подсчёта времени работы (не зависят от перевода системных часов)
+        self.start_monotonic = time.monotonic()
+    
+    @staticmethod
+    def _create_http_session(proxy_url: str = None) -> aiohttp.ClientSession:
+        """
+        Создание общей HTTP сессии для внешних запросов
+        
+        Args:
+            proxy_url: URL прокси (None = прямое подключение)
+            
+        Returns:
+            Сессия с пулом соединений
+        """
+        connector = None
+        
+        if proxy_url:
+            try:
+                connector = ProxyConnector.from_url(
+                    proxy_url,
+                    limit=100,
+                    limit_per_host=20,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=75
+                )
+                logger.info(f"✅ Общая HTTP сессия использует прокси {proxy_url}")
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось создать прокси коннектор для общей сессии: {e}")
+        
+        if connector is None:
+            # limit_per_host: один медленный хост (CDN, поисковик) не занимает весь пул
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=20,
+                ttl_dns_cache=300,
+                keepalive_timeout=75
+            )
+        
+        return aiohttp.ClientSession(connector=connector)
         
     async def setup_hook(self):
         """Инициализация при запуске бота"""
@@ -98,6 +161,8 @@ class AdvancedDiscordBot(commands.Bot):
         logger.info(f"📊 ID: {self.user.id}")
         logger.info(f"🌐 Серверов: {len(self.guilds)}")
         
+        self._mention_re = re.compile(rf"<@!?{self.user.id}>")
+        
         # Проверка подключения к LM Studio
         if await self.lm_client.check_connection():
             logger.info("✅ Подключение к LM Studio установлено")
@@ -116,8 +181,8 @@ class AdvancedDiscordBot(commands.Bot):
         if message.author.bot:
             return
         
-        # Обработка упоминаний бота
-        if self.user in message.mentions and not message.mention_everyone:
+        # Обработка упоминаний бота (raw_mentions - список int ID, без разрешения Member)
+        if self.user.id in message.raw_mentions and not message.mention_everyone:
             await self.handle_mention(message)
             return
         
@@ -132,7 +197,9 @@ class AdvancedDiscordBot(commands.Bot):
         async with message.channel.typing():
             try:
                 # Удаляем упоминание из текста
-                content = message.content.replace(f'<@{self.user.id}>', '').strip()
+                if self._mention_re is None:
+                    self._mention_re = re.compile(rf"<@!?{self.user.id}>")
+                content = self._mention_re.sub('', message.content).strip()
                 
                 if not content:
                     await message.reply("Да, я здесь! Чем могу помочь?")
@@ -142,35 +209,48 @@ class AdvancedDiscordBot(commands.Bot):
                 image_url = None
                 image_data = None
                 
+                # Сообщение, на которое ответил пользователь, запрашиваем заранее,
+                # параллельно с проверкой собственных вложений
+                ref_task = None
+                if message.reference and message.reference.message_id:
+                    ref_task = asyncio.create_task(
+                        message.channel.fetch_message(message.reference.message_id)
+                    )
+                    # Ошибку забираем сразу, чтобы не было предупреждения о
+                    # необработанном исключении, если результат не понадобится
+                    ref_task.add_done_callback(
+                        lambda task: task.cancelled() or task.exception()
+                    )
+                
                 # Проверяем вложения в сообщении
-                if message.attachments:
-                    for attachment in message.attachments:
-                        if attachment.content_type and attachment.content_type.startswith('image/'):
-                            image_url = attachment.url
-                            logger.info(f"🖼️ Обнаружено изображение: {image_url}")
-                            image_data = await self.image_processor.download_image(image_url)
-                            if image_data:
-                                logger.info(f"✅ Изображение загружено ({len(image_data)} байт)")
-                            else:
-                                logger.error("❌ Не удалось загрузить изображение")
-                            break
+                image_url = first_image_url(message.attachments)
+                if image_url:
+                    logger.info(f"🖼️ Обнаружено изображение: {image_url}")
+                    
+                    # Изображение найдено в самом сообщении - ответ не нужен
+                    if ref_task:
+                        ref_task.cancel()
+                        ref_task = None
+                    
+                    image_data = await self.image_processor.download_image(image_url)
+                    if image_data:
+                        logger.info(f"✅ Изображение загружено ({len(image_data)} байт)")
+                    else:
+                        logger.error("❌ Не удалось загрузить изображение")
                 
                 # Если изображение не найдено, проверяем ссылку на сообщение
-                if not image_url and message.reference:
+                if not image_url and ref_task:
                     try:
-                        referenced_msg = await message.channel.fetch_message(message.reference.message_id)
-                        if referenced_msg.attachments:
-                            for attachment in referenced_msg.attachments:
-                                if attachment.content_type and attachment.content_type.startswith('image/'):
-                                    image_url = attachment.url
-                                    logger.info(f"🖼️ Обнаружено изображение в ответе: {image_url}")
-                                    image_data = await self.image_processor.download_image(image_url)
-                                    break
+                        referenced_msg = await ref_task
+                        image_url = first_image_url(referenced_msg.attachments)
+                        if image_url:
+                            logger.info(f"🖼️ Обнаружено изображение в ответе: {image_url}")
+                            image_data = await self.image_processor.download_image(image_url)
                     except:
                         pass
                 
                 # Получаем историю разговора
-                conversation_history = await self.conversation_manager.get_history(
+                conversation_history = self.conversation_manager.get_history(
                     message.channel.id,
                     message.author.id
                 )
@@ -202,18 +282,41 @@ class AdvancedDiscordBot(commands.Bot):
                 
                 # Если изображения нет - используем веб-поиск при необходимости
                 else:
-                    logger.info(f"💬 Обработка текстового запроса с автоматическим веб-поиском")
-                    
-                    # Используем SearchEnhancedLLM для автоматического поиска
-                    response = await self.search_enhanced_llm.generate_with_search(
-                        user_message=content,
-                        conversation_history=conversation_history,
-                        system_prompt=Config.SYSTEM_PROMPT,
-                        auto_search=True  # Автоматически определяем необходимость поиска
+                    # Кэш только для начала разговора: ответ зависит от истории, а она меняется
+                    # с каждым обменом - с историей повтор не встретится, а эмбеддинг стоит дорого.
+                    # Ответ с веб-поиском зависит от времени (новости, "сегодня") - его не кэшируем
+                    cacheable = (
+                        not conversation_history
+                        and not self.search_enhanced_llm.needs_search(content)
                     )
+                    
+                    hit = None
+                    if cacheable:
+                        cache_scope = message.channel.id
+                        
+                        # Проверяем семантический кэш перед обращением к LLM
+                        embedding = await self.semantic_cache.encode(content)
+                        hit = self.semantic_cache.lookup(embedding, cache_scope)
+                    
+                    if hit:
+                        response, similarity = hit
+                        logger.info(f"⚡ Ответ из семантического кэша (близость {similarity:.3f})")
+                    else:
+                        logger.info(f"💬 Обработка текстового запроса с автоматическим веб-поиском")
+                        
+                        # Используем SearchEnhancedLLM для автоматического поиска
+                        response = await self.search_enhanced_llm.generate_with_search(
+                            user_message=content,
+                            conversation_history=conversation_history,
+                            system_prompt=Config.SYSTEM_PROMPT,
+                            auto_search=True  # Автоматически определяем необходимость поиска
+                        )
+                        
+                        if cacheable:
+                            self.semantic_cache.insert(embedding, cache_scope, response)
                 
                 # Сохраняем в историю
-                await self.conversation_manager.add_message(
+                self.conversation_manager.add_message(
                     channel_id=message.channel.id,
                     user_id=message.author.id,
                     user_message=content,
@@ -246,30 +349,38 @@ class AdvancedDiscordBot(commands.Bot):
                 await channel.send(content)
             return
         
-        # Разбиваем на части
+        # Разбиваем на части, двигая индекс по строке без копирования хвоста
         parts = []
-        while content:
-            if len(content) <= max_length:
-                parts.append(content)
-                break
+        i = 0
+        n = len(content)
+        while i < n:
+            end = min(i + max_length, n)
             
-            # Ищем последний перенос строки или пробел
-            split_pos = content.rfind('\n', 0, max_length)
-            if split_pos == -1:
-                split_pos = content.rfind(' ', 0, max_length)
-            if split_pos == -1:
-                split_pos = max_length
+            if end < n:
+                # Ищем последний перенос строки или пробел
+                split_pos = content.rfind('\n', i, end)
+                if split_pos <= i:
+                    split_pos = content.rfind(' ', i, end)
+                if split_pos <= i:
+                    split_pos = end
+            else:
+                split_pos = end
+            
+            parts.append(content[i:split_pos])
             
-            parts.append(content[:split_pos])
-            content = content[split_pos:].lstrip()
+            # Пропускаем пробельные символы в начале следующей части
+            i = split_pos
+            while i < n and content[i].isspace():
+                i += 1
         
-        # Отправляем части
+        # Отправляем части строго по очереди: при параллельной отправке (gather)
+        # Discord не гарантирует порядок сообщений, и ответ мог бы перемешаться.
+        # Rate limit соблюдает HTTP-слой discord.py
         for i, part in enumerate(parts):
             if i == 0 and reference:
                 await reference.reply(part)
             else:
                 await channel.send(part)
-            await asyncio.sleep(0.5)  # Небольшая задержка между сообщениями
     
     async def on_command_error(self, ctx: commands.Context, error: Exception):
         """Глобальная обработка ошибок команд"""
@@ -286,6 +397,12 @@ class AdvancedDiscordBot(commands.Bot):
         if hasattr(self, 'image_processor'):
             await self.image_processor.close()
         
+        if hasattr(self, 'lm_client'):
+            await self.lm_client.close()
+        
+        if hasattr(self, '_http_session') and not self._http_session.closed:
+            await self._http_session.close()
+        
         await super().close()
         logger.info("✅ Все соединения закрыты")
 
@@ -4,7 +4,9 @@ Cog с административными командами
 
 import discord
 from discord.ext import commands
+import asyncio
 import logging
+import time
 from utils import (
     create_embed,
     create_error_embed,
@@ -23,6 +25,24 @@ class AdminCommands(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
+        
+        # Кэш текста поля параметров: (значения Config, готовый текст)
+        self._params_field: tuple = (None, "")
+    
+    def _get_params_field(self) -> str:
+        """Текст поля параметров генерации (пересобирается только при изменении Config)"""
+        # Температура меняется и из других cog, поэтому сравниваем сами значения
+        key = (Config.TEMPERATURE, Config.MAX_TOKENS, Config.MAX_CONTEXT_MESSAGES)
+        
+        if self._params_field[0] != key:
+            self._params_field = (
+                key,
+                f"Температура: {Config.TEMPERATURE}\n"
+                f"Max токенов: {Config.MAX_TOKENS}\n"
+                f"Max история: {Config.MAX_CONTEXT_MESSAGES}"
+            )
+        
+        return self._params_field[1]
     
     async def cog_check(self, ctx: commands.Context) -> bool:
         """Проверка прав для всех команд в этом cog"""
@@ -52,7 +72,7 @@ class AdminCommands(commands.Cog):
             await ctx.send("Операция отменена.")
             return
         
-        await self.bot.conversation_manager.clear_history(ctx.channel.id)
+        self.bot.conversation_manager.clear_history(ctx.channel.id)
         
         await ctx.send(
             embed=create_success_embed(
@@ -68,15 +88,16 @@ class AdminCommands(commands.Cog):
     async def stats_bot(self, ctx: commands.Context):
         """Показать статистику работы бота"""
         stats = self.bot.conversation_manager.get_stats()
-        conv_count = await self.bot.conversation_manager.get_all_conversations_count()
+        
+        models = await self.bot.lm_client.get_available_models()
+        conv_count = self.bot.conversation_manager.get_all_conversations_count()
         
         # Время работы
-        uptime = (datetime.now() - self.bot.start_time).total_seconds()
+        uptime = time.monotonic() - self.bot.start_monotonic
         uptime_str = format_uptime(uptime)
         
-        # Информация о LM Studio
-        models = await self.bot.lm_client.get_available_models()
-        lm_status = "✅ Подключено" if await self.bot.lm_client.check_connection() else "❌ Отключено"
+        # Информация о LM Studio: если список моделей получен, подключение есть
+        lm_status = "✅ Подключено" if models else "❌ Отключено"
         
         embed = create_embed(
             "📊 Статистика бота",
@@ -108,11 +129,7 @@ class AdminCommands(commands.Cog):
         
         embed.add_field(
             name="⚙️ Параметры",
-            value=(
-                f"Температура: {Config.TEMPERATURE}\n"
-                f"Max токенов: {Config.MAX_TOKENS}\n"
-                f"Max история: {Config.MAX_CONTEXT_MESSAGES}"
-            ),
+            value=self._get_params_field(),
             inline=True
         )
         
@@ -162,7 +179,7 @@ class AdminCommands(commands.Cog):
     )
     async def set_model(self, ctx: commands.Context, *, model_name: str):
         """Установка модели для генерации"""
-        models = await self.bot.lm_client.get_available_models()
+        models = await self.bot.lm_client.get_available_models_set()
         
         if model_name not in models:
             await ctx.send(
@@ -175,6 +192,7 @@ class AdminCommands(commands.Cog):
             return
         
         Config.LM_STUDIO_MODEL = model_name
+        self.bot.lm_client.invalidate_cache()
         
         await ctx.send(
             embed=create_success_embed(
@@ -208,12 +226,43 @@ class AdminCommands(commands.Cog):
             try:
                 extensions = [
                     'cogs.chat_commands',
-                    'cogs.admin_commands',
-                    'cogs.utility_commands'
+                    'cogs.utility_commands',
+                    'cogs.web_image_commands'
+                ]
+                
+                # Независимые расширения перезагружаем параллельно
+                results = await asyncio.gather(
+                    *(self.bot.reload_extension(ext) for ext in extensions),
+                    return_exceptions=True
+                )
+                
+                # Этот cog перезагружаем последним, т.к. команда выполняется внутри него
+                extensions.append('cogs.admin_commands')
+                try:
+                    await self.bot.reload_extension('cogs.admin_commands')
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+                
+                failed = [
+                    (ext, result)
+                    for ext, result in zip(extensions, results)
+                    if isinstance(result, Exception)
                 ]
                 
-                for ext in extensions:
-                    await self.bot.reload_extension(ext)
+                if failed:
+                    for ext, error in failed:
+                        logger.error(f"Ошибка перезагрузки {ext}: {error}", exc_info=error)
+                    
+                    await ctx.send(
+                        embed=create_error_embed(
+                            "Ошибка перезагрузки",
+                            "Не удалось перезагрузить расширения:\n" + "\n".join(
+                                f"• `{ext}`: {error}" for ext, error in failed
+                            )
+                        )
+                    )
+                    return
                 
                 await ctx.send(
                     embed=create_success_embed(
@@ -254,18 +303,27 @@ class AdminCommands(commands.Cog):
         )
         embed.set_footer(text=f"От: {ctx.author.display_name}")
         
-        sent_count = 0
-        failed_count = 0
+        # Ограничиваем число одновременных отправок, чтобы не упираться в rate limit
+        semaphore = asyncio.Semaphore(10)
         
-        for guild in self.bot.guilds:
-            for channel in guild.text_channels:
-                try:
-                    await channel.send(embed=embed)
-                    sent_count += 1
-                    break  # Отправляем только в первый доступный канал
-                except discord.Forbidden:
-                    failed_count += 1
-                    continue
+        async def send_to_guild(guild: discord.Guild) -> tuple[int, int]:
+            """Отправка в первый доступный канал сервера, возвращает (успешно, ошибок)"""
+            failed = 0
+            async with semaphore:
+                for channel in guild.text_channels:
+                    try:
+                        await channel.send(embed=embed)
+                        return 1, failed  # Отправляем только в первый доступный канал
+                    except discord.Forbidden:
+                        failed += 1
+            return 0, failed
+        
+        results = await asyncio.gather(
+            *(send_to_guild(guild) for guild in self.bot.guilds)
+        )
+        
+        sent_count = sum(sent for sent, _ in results)
+        failed_count = sum(failed for _, failed in results)
         
         await ctx.send(
             embed=create_success_embed(
@@ -280,7 +338,7 @@ class AdminCommands(commands.Cog):
     )
     async def cleanup_conversations(self, ctx: commands.Context):
         """Очистка неактивных разговоров"""
-        await self.bot.conversation_manager.cleanup_old_conversations(
+        self.bot.conversation_manager.cleanup_old_conversations(
             Config.CONTEXT_TIMEOUT
         )
         
@@ -297,5 +355,4 @@ async def setup(bot):
     await bot.add_cog(AdminCommands(bot))
 
 
-from datetime import datetime
 from utils import format_uptime
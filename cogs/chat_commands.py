@@ -4,19 +4,179 @@ Cog с командами для работы с чатом и AI
 
 import discord
 from discord.ext import commands
+import hashlib
 import logging
-from typing import Optional
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from utils import create_embed, create_error_embed, create_success_embed
 from config import Config
+import fast_json
 
 logger = logging.getLogger(__name__)
 
+# Подписи ролей в выводе истории
+ROLE_ICON = {'user': '👤 Вы', 'assistant': '🤖 Бот'}
+
+# Лимит описания embed в Discord - 4096 символов, оставляем запас
+HISTORY_DESCRIPTION_LIMIT = 4000
+EMBED_DESCRIPTION_LIMIT = 4090
+
+# Минимальный интервал между правками сообщения при потоковой генерации (секунды)
+STREAM_EDIT_INTERVAL = 1.0
+
 
 class ChatCommands(commands.Cog):
     """Команды для взаимодействия с AI"""
     
     def __init__(self, bot):
         self.bot = bot
+        
+        # Кэш ответов по точному тексту запроса (!code, !translate, !summarize): {sha256: (время, ответ)}
+        self._exact_cache: OrderedDict = OrderedDict()
+        self.exact_cache_max_entries = 1024
+    
+    async def _reject_long_input(self, ctx: commands.Context, text: str) -> bool:
+        """
+        Проверка длины запроса до обращения к LLM
+        
+        Returns:
+            True если запрос слишком длинный (сообщение об ошибке уже отправлено)
+        """
+        if len(text) <= Config.MAX_USER_INPUT_CHARS:
+            return False
+        
+        await ctx.send(
+            embed=create_error_embed(
+                "Слишком длинный запрос",
+                f"Максимальная длина запроса - {Config.MAX_USER_INPUT_CHARS} символов "
+                f"(получено {len(text)})."
+            )
+        )
+        return True
+    
+    @staticmethod
+    def _exact_key(scope: tuple, system_prompt: str, text: str) -> str:
+        """
+        Ключ кэша по точному тексту запроса
+        
+        Модель и параметры генерации меняются командами во время работы - они входят в ключ.
+        Пробелы нормализуются: запросы, отличающиеся только ими, дают один ключ.
+        """
+        return hashlib.sha256(fast_json.dumps([
+            list(scope),
+            system_prompt,
+            ' '.join(text.split()),
+            Config.LM_STUDIO_MODEL,
+            Config.TEMPERATURE,
+            Config.TOP_P,
+            Config.MAX_TOKENS
+        ])).hexdigest()
+    
+    async def _cache_lookup(
+        self,
+        scope: tuple,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        exact_text: Optional[str] = None
+    ) -> Tuple[Optional[str], tuple]:
+        """
+        Поиск ответа в кэше
+        
+        Args:
+            scope: Область кэша (команда и всё, от чего зависит ответ кроме текста запроса)
+            user_message: Сообщение пользователя
+            system_prompt: Системный промпт
+            conversation_history: История разговора
+            exact_text: Текст, по которому ответ ищется только точным совпадением
+                (перевод и код должны соответствовать именно этому тексту, а близкие
+                по смыслу запросы отличаются числом или отрицанием). None - семантический поиск
+            
+        Returns:
+            (ответ из кэша или None, ключи для сохранения ответа через _cache_store)
+        """
+        if exact_text is not None:
+            exact_key = self._exact_key(scope, system_prompt, exact_text)
+            
+            entry = self._exact_cache.get(exact_key)
+            if entry is not None:
+                stored_at, response = entry
+                if time.monotonic() - stored_at < Config.SEMANTIC_CACHE_TTL:
+                    self._exact_cache.move_to_end(exact_key)
+                    logger.info(f"⚡ Ответ команды {scope[0]} из точного кэша")
+                    return response, (None, None, None)
+                del self._exact_cache[exact_key]
+            
+            return None, (exact_key, None, None)
+        
+        # История меняется с каждым обменом, и ответ с ней повторно почти не встретится -
+        # семантический кэш (и вычисление эмбеддинга) используется только без истории.
+        # При температуре 0 точные повторы кэширует сам LMStudioClient
+        if conversation_history:
+            return None, (None, None, None)
+        
+        cache = self.bot.semantic_cache
+        scope = (system_prompt,) + scope
+        
+        embedding = await cache.encode(user_message)
+        hit = cache.lookup(embedding, scope, tau=Config.COMMAND_CACHE_THRESHOLD)
+        
+        if hit:
+            response, similarity = hit
+            logger.info(f"⚡ Ответ команды {scope[1]} из семантического кэша (близость {similarity:.3f})")
+            return response, (None, None, None)
+        
+        return None, (None, embedding, scope)
+    
+    def _cache_store(self, cache_keys: tuple, response: str):
+        """Сохранение ответа по ключам, полученным из _cache_lookup"""
+        exact_key, embedding, scope = cache_keys
+        
+        if scope is not None:
+            self.bot.semantic_cache.insert(embedding, scope, response)
+        
+        if exact_key is not None:
+            self._exact_cache[exact_key] = (time.monotonic(), response)
+            self._exact_cache.move_to_end(exact_key)
+            if len(self._exact_cache) > self.exact_cache_max_entries:
+                self._exact_cache.popitem(last=False)
+    
+    async def _generate_cached(
+        self,
+        scope: tuple,
+        user_message: str,
+        system_prompt: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        exact_text: Optional[str] = None
+    ) -> str:
+        """
+        Генерация ответа через кэш
+        
+        Args:
+            scope: Область кэша (команда и всё, от чего зависит ответ кроме текста запроса)
+            user_message: Сообщение пользователя
+            system_prompt: Системный промпт
+            conversation_history: История разговора
+            exact_text: Текст для поиска только по точному совпадению (см. _cache_lookup)
+            
+        Returns:
+            Ответ из кэша или сгенерированный ответ
+        """
+        response, cache_keys = await self._cache_lookup(
+            scope, user_message, system_prompt, conversation_history, exact_text
+        )
+        if response is not None:
+            return response
+        
+        response = await self.bot.lm_client.generate_response(
+            user_message=user_message,
+            conversation_history=conversation_history,
+            system_prompt=system_prompt
+        )
+        
+        self._cache_store(cache_keys, response)
+        return response
     
     @commands.command(
         name="ask",
@@ -29,23 +189,27 @@ class ChatCommands(commands.Cog):
         
         Использование: !ask <ваш вопрос>
         """
+        if await self._reject_long_input(ctx, question):
+            return
+        
         async with ctx.typing():
             try:
                 # Получаем историю
-                history = await self.bot.conversation_manager.get_history(
+                history = self.bot.conversation_manager.get_history(
                     ctx.channel.id,
                     ctx.author.id
                 )
                 
                 # Генерируем ответ
-                response = await self.bot.lm_client.generate_response(
+                response = await self._generate_cached(
+                    scope=("ask", ctx.channel.id, ctx.author.id),
                     user_message=question,
-                    conversation_history=history,
-                    system_prompt=Config.SYSTEM_PROMPT
+                    system_prompt=Config.SYSTEM_PROMPT,
+                    conversation_history=history
                 )
                 
                 # Сохраняем в историю
-                await self.bot.conversation_manager.add_message(
+                self.bot.conversation_manager.add_message(
                     channel_id=ctx.channel.id,
                     user_id=ctx.author.id,
                     user_message=question,
@@ -71,7 +235,7 @@ class ChatCommands(commands.Cog):
     )
     async def clear_history(self, ctx: commands.Context):
         """Очистка истории разговора с AI"""
-        await self.bot.conversation_manager.clear_history(
+        self.bot.conversation_manager.clear_history(
             ctx.channel.id,
             ctx.author.id
         )
@@ -90,12 +254,7 @@ class ChatCommands(commands.Cog):
     )
     async def show_history(self, ctx: commands.Context):
         """Показать текущую историю разговора"""
-        history = await self.bot.conversation_manager.get_history(
-            ctx.channel.id,
-            ctx.author.id
-        )
-        
-        if not history:
+        if not self.bot.conversation_manager.history_len(ctx.channel.id, ctx.author.id):
             await ctx.send(
                 embed=create_embed(
                     "История разговора",
@@ -104,12 +263,24 @@ class ChatCommands(commands.Cog):
             )
             return
         
-        # Форматируем историю
+        history = self.bot.conversation_manager.get_history(
+            ctx.channel.id,
+            ctx.author.id
+        )
+        
+        # Форматируем историю, пока она помещается в описание embed
         formatted = []
+        total_length = 0
         for i, msg in enumerate(history, 1):
-            role = "👤 Вы" if msg['role'] == 'user' else "🤖 Бот"
-            content = msg['content'][:100] + "..." if len(msg['content']) > 100 else msg['content']
-            formatted.append(f"**{i}. {role}:** {content}")
+            content = msg['content']
+            if len(content) > 100:
+                content = content[:100] + "..."
+            
+            line = f"**{i}. {ROLE_ICON.get(msg['role'], '🤖 Бот')}:** {content}"
+            total_length += len(line) + 2
+            if total_length > HISTORY_DESCRIPTION_LIMIT:
+                break
+            formatted.append(line)
         
         embed = create_embed(
             "История разговора",
@@ -125,12 +296,12 @@ class ChatCommands(commands.Cog):
     )
     async def export_history(self, ctx: commands.Context):
         """Экспорт истории разговора в файл"""
-        export = await self.bot.conversation_manager.export_conversation(
+        export = self.bot.conversation_manager.export_conversation_file(
             ctx.channel.id,
             ctx.author.id
         )
         
-        if export == "История разговора пуста.":
+        if export is None:
             await ctx.send(
                 embed=create_embed(
                     "Экспорт истории",
@@ -141,7 +312,7 @@ class ChatCommands(commands.Cog):
         
         # Создаем файл
         file = discord.File(
-            fp=export.encode('utf-8'),
+            fp=export,
             filename=f"conversation_{ctx.author.id}_{ctx.channel.id}.txt"
         )
         
@@ -157,12 +328,7 @@ class ChatCommands(commands.Cog):
     )
     async def summarize_conversation(self, ctx: commands.Context):
         """Получить AI-сводку разговора"""
-        history = await self.bot.conversation_manager.get_history(
-            ctx.channel.id,
-            ctx.author.id
-        )
-        
-        if not history:
+        if not self.bot.conversation_manager.history_len(ctx.channel.id, ctx.author.id):
             await ctx.send(
                 embed=create_error_embed(
                     "Нет истории",
@@ -171,40 +337,90 @@ class ChatCommands(commands.Cog):
             )
             return
         
+        # Суммаризируем только последние обмены, чтобы ограничить размер промпта
+        history = self.bot.conversation_manager.get_history(
+            ctx.channel.id,
+            ctx.author.id,
+            limit=Config.MAX_SUMMARY_TURNS
+        )
+        
+        # Формируем промпт для суммаризации
+        conversation_text = "\n".join([
+            f"{msg['role']}: {msg['content']}"
+            for msg in history
+        ])
+        
+        # Историю нельзя сократить самому пользователю, поэтому оставляем только её конец
+        if len(conversation_text) > Config.MAX_USER_INPUT_CHARS:
+            conversation_text = conversation_text[-Config.MAX_USER_INPUT_CHARS:]
+        
+        summary_prompt = (
+            f"Пожалуйста, создай краткое содержание следующего разговора:\n\n"
+            f"{conversation_text}\n\n"
+            f"Выдели основные темы и важные моменты."
+        )
+        system_prompt = "Ты эксперт по анализу и суммаризации текстов."
+        scope = ("summarize", ctx.channel.id, ctx.author.id)
+        title = "📝 Краткое содержание разговора"
+        error_embed = create_error_embed("Ошибка", "Не удалось создать краткое содержание.")
+        message = None
+        
         async with ctx.typing():
             try:
-                # Формируем промпт для суммаризации
-                conversation_text = "\n".join([
-                    f"{msg['role']}: {msg['content']}"
-                    for msg in history
-                ])
-                
-                summary_prompt = (
-                    f"Пожалуйста, создай краткое содержание следующего разговора:\n\n"
-                    f"{conversation_text}\n\n"
-                    f"Выдели основные темы и важные моменты."
+                # Сводка переиспользуется только для той же истории - то есть для того же промпта,
+                # поэтому ключ - хэш промпта, а не эмбеддинг (модель обрезала бы длинный вход)
+                summary, cache_keys = await self._cache_lookup(
+                    scope, summary_prompt, system_prompt, exact_text=summary_prompt
                 )
                 
-                summary = await self.bot.lm_client.generate_response(
+                if summary is not None:
+                    await ctx.send(embed=create_embed(title, summary))
+                    return
+                
+                # Показываем сводку по мере генерации, редактируя одно сообщение
+                message = await ctx.send(embed=create_embed(title, "⏳ Генерация..."))
+                
+                parts = []
+                shown_length = 0
+                last_edit = time.monotonic()
+                
+                async for delta in self.bot.lm_client.generate_response_stream(
                     user_message=summary_prompt,
-                    system_prompt="Ты эксперт по анализу и суммаризации текстов."
-                )
+                    system_prompt=system_prompt
+                ):
+                    parts.append(delta)
+                    
+                    # Ограничиваем частоту правок, чтобы не упереться в rate limit Discord
+                    now = time.monotonic()
+                    if now - last_edit >= STREAM_EDIT_INTERVAL:
+                        text = "".join(parts)
+                        if len(text) != shown_length:
+                            await message.edit(embed=create_embed(title, text[:EMBED_DESCRIPTION_LIMIT] + " ▌"))
+                            shown_length = len(text)
+                        last_edit = now
                 
-                embed = create_embed(
-                    "📝 Краткое содержание разговора",
-                    summary
-                )
+                summary = "".join(parts)
                 
-                await ctx.send(embed=embed)
+                # Пустой ответ модели не показываем и не кэшируем
+                if not summary.strip():
+                    logger.warning("Модель вернула пустую сводку")
+                    await message.edit(embed=error_embed)
+                    return
+                
+                await message.edit(embed=create_embed(title, summary[:EMBED_DESCRIPTION_LIMIT]))
+                
+                self._cache_store(cache_keys, summary)
                 
             except Exception as e:
                 logger.error(f"Ошибка суммаризации: {e}", exc_info=True)
-                await ctx.send(
-                    embed=create_error_embed(
-                        "Ошибка",
-                        "Не удалось создать краткое содержание."
-                    )
-                )
+                # Сообщение с частичной сводкой заменяем ошибкой, а не оставляем рядом с ней
+                try:
+                    if message is not None:
+                        await message.edit(embed=error_embed)
+                    else:
+                        await ctx.send(embed=error_embed)
+                except discord.HTTPException:
+                    pass
     
     @commands.command(
         name="code",
@@ -216,6 +432,9 @@ class ChatCommands(commands.Cog):
         
         Использование: !code <описание задачи>
         """
+        if await self._reject_long_input(ctx, description):
+            return
+        
         async with ctx.typing():
             try:
                 code_prompt = (
@@ -223,9 +442,11 @@ class ChatCommands(commands.Cog):
                     f"Предоставь чистый, документированный код с комментариями."
                 )
                 
-                response = await self.bot.lm_client.generate_response(
+                response = await self._generate_cached(
+                    scope=("code",),
                     user_message=code_prompt,
-                    system_prompt="Ты опытный программист. Создавай качественный, читаемый код."
+                    system_prompt="Ты опытный программист. Создавай качественный, читаемый код.",
+                    exact_text=description
                 )
                 
                 # Отправляем в code block
@@ -259,15 +480,21 @@ class ChatCommands(commands.Cog):
         Использование: !translate <язык> <текст>
         Пример: !translate english Привет, как дела?
         """
+        if await self._reject_long_input(ctx, text):
+            return
+        
         async with ctx.typing():
             try:
                 translate_prompt = (
                     f"Переведи следующий текст на {target_language}:\n\n{text}"
                 )
                 
-                translation = await self.bot.lm_client.generate_response(
+                # Язык входит в область кэша: промпты на разные языки почти совпадают
+                translation = await self._generate_cached(
+                    scope=("translate", target_language.lower()),
                     user_message=translate_prompt,
-                    system_prompt="Ты профессиональный переводчик. Делай точные и естественные переводы."
+                    system_prompt="Ты профессиональный переводчик. Делай точные и естественные переводы.",
+                    exact_text=text
                 )
                 
                 embed = create_embed(
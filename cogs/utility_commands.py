@@ -4,10 +4,14 @@ Cog с утилитными командами
 
 import discord
 from discord.ext import commands
+import asyncio
 import logging
-from datetime import datetime
+import time
 import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 import psutil
+from typing import Dict, Optional
 try:
     import GPUtil
     GPU_AVAILABLE = True
@@ -22,22 +26,158 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Шаблон embed для !info: неизменяемые части собираются один раз при загрузке модуля
+_INFO_TEMPLATE = {
+    'title': "🤖 Информация о боте",
+    'description': "Продвинутый Discord бот с интеграцией LM Studio",
+    'color': Config.EMBED_COLOR,
+    'fields': [
+        {
+            'name': "⚙️ Технологии",
+            'value': (
+                f"**Python:** {platform.python_version()}\n"
+                f"**Discord.py:** {discord.__version__}\n"
+                f"**Префикс:** {Config.PREFIX}"
+            ),
+            'inline': True
+        }
+    ]
+}
+
+
+def _embed_from_template(template: dict) -> discord.Embed:
+    """Создание embed из шаблона (список полей копируется, чтобы не изменять шаблон)"""
+    embed = discord.Embed.from_dict({**template, 'fields': list(template.get('fields', []))})
+    embed.timestamp = discord.utils.utcnow()
+    return embed
+
 
 class UtilityCommands(commands.Cog):
     """Утилитные команды"""
     
     def __init__(self, bot):
         self.bot = bot
+        
+        # Неизменяемые за время работы процесса данные для !system
+        self._cpu_count = psutil.cpu_count()
+        self._python_version = platform.python_version()
+        self._discord_version = discord.__version__
+        self._static_gpu_info: Optional[Dict] = None  # Заполняется при первом опросе GPU
+        
+        # Подключения WMI живут в одном потоке (COM привязан к потоку):
+        # None - ещё не создавалось, False - создать не удалось
+        self._wmi_executor: Optional[ThreadPoolExecutor] = None
+        self._wmi_root = None
+        self._wmi_ohm = None
+        
+        # Кэш embed справки: (набор загруженных cog, embed)
+        self._help_embed_cache: Optional[tuple] = None
     
-    def get_amd_gpu_info(self):
-        """Получить информацию об AMD GPU (Windows)"""
-        gpu_info = {}
+    def _aggregate_guild_stats(self) -> tuple:
+        """
+        Подсчёт серверов, пользователей и каналов за один проход
+        
+        Returns:
+            (серверов, пользователей, каналов)
+        """
+        guild_count = 0
+        channel_count = 0
+        
+        for guild in self.bot.guilds:
+            guild_count += 1
+            channel_count += len(guild.channels)
         
-        # Метод 1: Базовая информация через WMI
+        return guild_count, len(self.bot.users), channel_count
+    
+    def cog_unload(self):
+        """Остановка потока WMI при выгрузке cog"""
+        if self._wmi_executor is not None:
+            self._wmi_executor.shutdown(wait=False)
+    
+    @staticmethod
+    def _init_com():
+        """Инициализация COM в потоке WMI"""
         try:
-            import wmi
-            c = wmi.WMI(namespace="root\\OpenHardwareMonitor")
+            import pythoncom
+            pythoncom.CoInitialize()
+        except ImportError:
+            pass
+    
+    async def _run_wmi(self, func):
+        """Выполнение функции в выделенном потоке WMI"""
+        if self._wmi_executor is None:
+            self._wmi_executor = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="wmi",
+                initializer=self._init_com
+            )
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._wmi_executor, func)
+    
+    def _get_wmi(self, attr: str, namespace: Optional[str] = None):
+        """
+        Получение сохранённого подключения WMI (создаётся один раз)
+        
+        Args:
+            attr: Атрибут, в котором хранится подключение
+            namespace: Пространство имён WMI (None = стандартное)
             
+        Returns:
+            Подключение WMI или None если оно недоступно
+        """
+        connection = getattr(self, attr)
+        
+        if connection is None:
+            try:
+                import wmi
+                connection = wmi.WMI(namespace=namespace) if namespace else wmi.WMI()
+            except Exception as e:
+                logger.debug(f"Не удалось подключиться к WMI ({namespace or 'стандартное пространство имён'}): {e}")
+                connection = False
+            setattr(self, attr, connection)
+        
+        return connection or None
+    
+    def get_amd_gpu_info_static(self) -> Dict:
+        """Неизменяемая информация об AMD GPU: модель, объём памяти, статус (Windows)"""
+        gpu_info = {}
+        
+        # Базовая информация через стандартный WMI
+        c = self._get_wmi('_wmi_root')
+        if c is None:
+            return gpu_info
+        
+        try:
+            for gpu in c.Win32_VideoController():
+                if 'AMD' in gpu.Name or 'Radeon' in gpu.Name or 'ATI' in gpu.Name:
+                    gpu_info['name'] = gpu.Name
+                    
+                    # Память (в байтах, конвертируем в GB)
+                    if gpu.AdapterRAM and gpu.AdapterRAM > 0:
+                        gpu_info['memory_total'] = gpu.AdapterRAM / (1024 ** 3)
+                    
+                    # Статус
+                    if hasattr(gpu, 'Status'):
+                        gpu_info['status'] = gpu.Status
+                    
+                    break
+        except Exception as e:
+            logger.warning(f"Ошибка при получении базовой информации через WMI: {e}")
+            self._wmi_root = None  # Пересоздадим подключение при следующем опросе
+        
+        return gpu_info
+    
+    def _probe_ohm(self) -> Dict:
+        """Текущие показатели AMD GPU из OpenHardwareMonitor: температура, загрузка, частота"""
+        gpu_info = {}
+        
+        # Датчики через WMI (OpenHardwareMonitor)
+        c = self._get_wmi('_wmi_ohm', namespace="root\\OpenHardwareMonitor")
+        if c is None:
+            return gpu_info
+        
+        try:
             # Пробуем получить данные из OpenHardwareMonitor (если запущен)
             sensors_found = False
             for sensor in c.Sensor():
@@ -54,71 +194,111 @@ class UtilityCommands(commands.Cog):
                 logger.info("Данные GPU получены через OpenHardwareMonitor")
         except Exception as e:
             logger.debug(f"OpenHardwareMonitor недоступен: {e}")
+            self._wmi_ohm = None  # Пересоздадим подключение при следующем опросе
         
-        # Метод 2: Базовая информация через стандартный WMI
+        return gpu_info
+    
+    def _probe_gpuz_shm(self) -> Dict:
+        """Показатели AMD GPU из shared memory GPU-Z"""
+        gpu_info = {}
+        
+        # Пробуем через py3nvml для AMD (если доступно)
         try:
-            import wmi
-            c = wmi.WMI()
+            # Пробуем использовать GPU-Z shared memory (если GPU-Z запущен)
+            import mmap
+            import struct
             
-            for gpu in c.Win32_VideoController():
-                if 'AMD' in gpu.Name or 'Radeon' in gpu.Name or 'ATI' in gpu.Name:
-                    gpu_info['name'] = gpu.Name
-                    
-                    # Память (в байтах, конвертируем в GB)
-                    if gpu.AdapterRAM and gpu.AdapterRAM > 0:
-                        gpu_info['memory_total'] = gpu.AdapterRAM / (1024 ** 3)
-                    
-                    # Статус
-                    if hasattr(gpu, 'Status'):
-                        gpu_info['status'] = gpu.Status
-                    
-                    break
+            try:
+                # GPU-Z использует shared memory с именем "GPUZShMem"
+                shm = mmap.mmap(-1, 256, "GPUZShMem", access=mmap.ACCESS_READ)
+                # Структура данных GPU-Z (упрощенная)
+                # Это не всегда работает, но можно попробовать
+                shm.close()
+            except:
+                pass
         except Exception as e:
-            logger.warning(f"Ошибка при получении базовой информации через WMI: {e}")
+            logger.debug(f"GPU-Z shared memory недоступен: {e}")
         
-        # Метод 3: Пробуем через py3nvml для AMD (если доступно)
-        if not gpu_info.get('load') or not gpu_info.get('temperature'):
+        return gpu_info
+    
+    async def _probe_powershell_load(self) -> Dict:
+        """Загрузка GPU через PowerShell и Get-Counter без блокировки event loop"""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                'powershell', '-Command',
+                '(Get-Counter "\\GPU Engine(*engtype_3D)\\Utilization Percentage").CounterSamples | Select-Object -First 1 | Select-Object -ExpandProperty CookedValue',
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
+            )
+            
             try:
-                # Пробуем использовать GPU-Z shared memory (если GPU-Z запущен)
-                import mmap
-                import struct
-                
+                stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=3)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # Не оставляем PowerShell работать после таймаута или отмены
+                proc.kill()
+                await proc.wait()
+                raise
+            
+            output = stdout.decode(errors='ignore').strip()
+            if proc.returncode == 0 and output:
                 try:
-                    # GPU-Z использует shared memory с именем "GPUZShMem"
-                    shm = mmap.mmap(-1, 256, "GPUZShMem", access=mmap.ACCESS_READ)
-                    # Структура данных GPU-Z (упрощенная)
-                    # Это не всегда работает, но можно попробовать
-                    shm.close()
-                except:
+                    load = float(output)
+                    if load > 0:
+                        logger.info(f"Загрузка GPU получена через PowerShell: {load}%")
+                        return {'load': load}
+                except ValueError:
                     pass
-            except Exception as e:
-                logger.debug(f"GPU-Z shared memory недоступен: {e}")
+        except Exception as e:
+            logger.debug(f"Не удалось получить загрузку через PowerShell: {e}")
         
-        # Метод 4: Через PowerShell и Get-Counter
-        if not gpu_info.get('load'):
-            try:
-                import subprocess
+        return {}
+    
+    async def _get_amd_gpu_info_async(self) -> Optional[Dict]:
+        """
+        Получить информацию об AMD GPU (Windows)
+        
+        Все методы опрашиваются параллельно, результаты объединяются по мере готовности.
+        Как только известны модель, загрузка и температура, оставшиеся опросы отменяются.
+        
+        Returns:
+            Словарь с информацией о GPU или None
+        """
+        # Модель и объём памяти не меняются - запрашиваем WMI только один раз
+        gpu_info = dict(self._static_gpu_info or {})
+        
+        static_task = None
+        if self._static_gpu_info is None:
+            static_task = asyncio.create_task(self._run_wmi(self.get_amd_gpu_info_static))
+        
+        pending = {
+            asyncio.create_task(self._run_wmi(self._probe_ohm)),
+            asyncio.create_task(asyncio.to_thread(self._probe_gpuz_shm)),
+            asyncio.create_task(self._probe_powershell_load())
+        }
+        if static_task is not None:
+            pending.add(static_task)
+        
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
                 
-                # Пробуем получить загрузку GPU через PowerShell
-                result = subprocess.run(
-                    ['powershell', '-Command', 
-                     '(Get-Counter "\\GPU Engine(*engtype_3D)\\Utilization Percentage").CounterSamples | Select-Object -First 1 | Select-Object -ExpandProperty CookedValue'],
-                    capture_output=True,
-                    text=True,
-                    timeout=3,
-                    creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
-                )
+                for task in done:
+                    result = task.result()
+                    # Пустой ответ - временный сбой WMI: не запоминаем, чтобы опросить снова
+                    if task is static_task and result:
+                        self._static_gpu_info = result
+                    
+                    # Нулевые значения (датчик не ответил) заменяются данными других методов
+                    for key, value in result.items():
+                        if not gpu_info.get(key):
+                            gpu_info[key] = value
                 
-                if result.returncode == 0 and result.stdout.strip():
-                    try:
-                        load = float(result.stdout.strip())
-                        if load > 0:
-                            gpu_info['load'] = load
-                            logger.info(f"Загрузка GPU получена через PowerShell: {load}%")
-                    except ValueError:
-                        pass
-            except Exception as e:
-                logger.debug(f"Не удалось получить загрузку через PowerShell: {e}")
+                if all(gpu_info.get(key) for key in ('name', 'load', 'temperature')):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
         
         # Если так и не получили загрузку и температуру, убираем их из вывода
         # чтобы не показывать нули
@@ -129,6 +309,42 @@ class UtilityCommands(commands.Cog):
         
         return gpu_info if gpu_info else None
     
+    def _collect_nvidia_gpu_info(self) -> Optional[Dict]:
+        """Синхронный опрос NVIDIA GPU через GPUtil"""
+        # GPU - пробуем NVIDIA через GPUtil
+        if GPU_AVAILABLE:
+            try:
+                gpus = GPUtil.getGPUs()
+                if gpus:
+                    gpu = gpus[0]  # Берем первый GPU
+                    return {
+                        'name': gpu.name,
+                        'load': gpu.load * 100,
+                        'memory_used': gpu.memoryUsed / 1024,  # GB
+                        'memory_total': gpu.memoryTotal / 1024,  # GB
+                        'memory_percent': (gpu.memoryUsed / gpu.memoryTotal) * 100,
+                        'temperature': gpu.temperature
+                    }
+            except Exception as e:
+                logger.warning(f"Ошибка получения информации о NVIDIA GPU: {e}")
+        
+        return None
+    
+    async def _collect_gpu_info_async(self) -> Optional[Dict]:
+        """
+        Опрос GPU: сначала NVIDIA через GPUtil, затем AMD
+        
+        Returns:
+            Словарь с информацией о GPU или None
+        """
+        gpu_info = await asyncio.to_thread(self._collect_nvidia_gpu_info)
+        
+        # Если NVIDIA GPU не найден, пробуем AMD
+        if not gpu_info:
+            gpu_info = await self._get_amd_gpu_info_async()
+        
+        return gpu_info
+    
     @commands.command(
         name="ping",
         help="Проверить задержку бота"
@@ -162,32 +378,33 @@ class UtilityCommands(commands.Cog):
     )
     async def info_bot(self, ctx: commands.Context):
         """Информация о боте"""
-        uptime = (datetime.now() - self.bot.start_time).total_seconds()
+        uptime = time.monotonic() - self.bot.start_monotonic
         uptime_str = format_uptime(uptime)
         
-        # Подключение к LM Studio
-        lm_connected = await self.bot.lm_client.check_connection()
+        # Запрос к LM Studio идёт, пока считаем статистику серверов
+        lm_task = asyncio.create_task(self.bot.lm_client.check_connection())
+        guild_count, user_count, channel_count = self._aggregate_guild_stats()
+        
+        lm_connected = await lm_task
         lm_status = "✅ Подключено" if lm_connected else "❌ Не подключено"
         
-        embed = discord.Embed(
-            title="🤖 Информация о боте",
-            description="Продвинутый Discord бот с интеграцией LM Studio",
-            color=Config.EMBED_COLOR,
-            timestamp=datetime.utcnow()
-        )
+        embed = _embed_from_template(_INFO_TEMPLATE)
         
-        embed.add_field(
+        # Динамические поля ставим перед статическим полем "Технологии" из шаблона
+        embed.insert_field_at(
+            0,
             name="📊 Статистика",
             value=(
-                f"**Серверов:** {len(self.bot.guilds)}\n"
-                f"**Пользователей:** {len(self.bot.users)}\n"
-                f"**Каналов:** {sum(len(guild.channels) for guild in self.bot.guilds)}\n"
+                f"**Серверов:** {guild_count}\n"
+                f"**Пользователей:** {user_count}\n"
+                f"**Каналов:** {channel_count}\n"
                 f"**Время работы:** {uptime_str}"
             ),
             inline=True
         )
         
-        embed.add_field(
+        embed.insert_field_at(
+            1,
             name="🤖 AI",
             value=(
                 f"**Статус:** {lm_status}\n"
@@ -197,16 +414,6 @@ class UtilityCommands(commands.Cog):
             inline=True
         )
         
-        embed.add_field(
-            name="⚙️ Технологии",
-            value=(
-                f"**Python:** {platform.python_version()}\n"
-                f"**Discord.py:** {discord.__version__}\n"
-                f"**Префикс:** {Config.PREFIX}"
-            ),
-            inline=True
-        )
-        
         embed.set_footer(text=f"Запрошено {ctx.author.display_name}")
         
         if self.bot.user.avatar:
@@ -214,6 +421,37 @@ class UtilityCommands(commands.Cog):
         
         await ctx.send(embed=embed)
     
+    def _build_help_embed(self) -> discord.Embed:
+        """Сборка embed со списком всех команд"""
+        embed = discord.Embed(
+            title="📚 Список команд",
+            description=f"Используйте `{Config.PREFIX}help <команда>` для подробной информации",
+            color=Config.EMBED_COLOR
+        )
+        
+        # Группируем команды по cog
+        for cog_name, cog in self.bot.cogs.items():
+            commands_list = []
+            for cmd in cog.get_commands():
+                if not cmd.hidden:
+                    commands_list.append(f"`{cmd.name}`")
+            
+            if commands_list:
+                embed.add_field(
+                    name=cog_name.replace('Commands', ''),
+                    value=" • ".join(commands_list),
+                    inline=False
+                )
+        
+        # Добавляем информацию об упоминаниях
+        embed.add_field(
+            name="💬 Естественный диалог",
+            value=f"Упомяните бота (@{self.bot.user.name}) чтобы начать беседу!",
+            inline=False
+        )
+        
+        return embed
+    
     @commands.command(
         name="com_help",
         help="Показать список команд"
@@ -255,34 +493,12 @@ class UtilityCommands(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        # Общая помощь
-        embed = discord.Embed(
-            title="📚 Список команд",
-            description=f"Используйте `{Config.PREFIX}help <команда>` для подробной информации",
-            color=Config.EMBED_COLOR
-        )
-        
-        # Группируем команды по cog
-        for cog_name, cog in self.bot.cogs.items():
-            commands_list = []
-            for cmd in cog.get_commands():
-                if not cmd.hidden:
-                    commands_list.append(f"`{cmd.name}`")
-            
-            if commands_list:
-                embed.add_field(
-                    name=cog_name.replace('Commands', ''),
-                    value=" • ".join(commands_list),
-                    inline=False
-                )
-        
-        # Добавляем информацию об упоминаниях
-        embed.add_field(
-            name="💬 Естественный диалог",
-            value=f"Упомяните бота (@{self.bot.user.name}) чтобы начать беседу!",
-            inline=False
-        )
+        # Общая помощь: список команд меняется только при загрузке/выгрузке cog
+        cogs_key = tuple(id(cog) for cog in self.bot.cogs.values())
+        if self._help_embed_cache is None or self._help_embed_cache[0] != cogs_key:
+            self._help_embed_cache = (cogs_key, self._build_help_embed())
         
+        embed = self._help_embed_cache[1]
         await ctx.send(embed=embed)
     
     @commands.command(
@@ -294,10 +510,26 @@ class UtilityCommands(commands.Cog):
         """Информация о текущем сервере"""
         guild = ctx.guild
         
+        # Участники и каналы считаем за один проход по каждому списку
+        members = guild.members
+        bots = 0
+        for member in members:
+            bots += member.bot
+        humans = len(members) - bots
+        
+        text_channels = voice_channels = categories = 0
+        for channel in guild.channels:
+            if isinstance(channel, discord.TextChannel):
+                text_channels += 1
+            elif isinstance(channel, discord.VoiceChannel):
+                voice_channels += 1
+            elif isinstance(channel, discord.CategoryChannel):
+                categories += 1
+        
         embed = discord.Embed(
             title=f"🏰 {guild.name}",
             color=Config.EMBED_COLOR,
-            timestamp=datetime.utcnow()
+            timestamp=discord.utils.utcnow()
         )
         
         if guild.icon:
@@ -317,8 +549,8 @@ class UtilityCommands(commands.Cog):
             name="👥 Участники",
             value=(
                 f"**Всего:** {guild.member_count}\n"
-                f"**Людей:** {sum(1 for m in guild.members if not m.bot)}\n"
-                f"**Ботов:** {sum(1 for m in guild.members if m.bot)}"
+                f"**Людей:** {humans}\n"
+                f"**Ботов:** {bots}"
             ),
             inline=True
         )
@@ -326,9 +558,9 @@ class UtilityCommands(commands.Cog):
         embed.add_field(
             name="📝 Каналы",
             value=(
-                f"**Текстовых:** {len(guild.text_channels)}\n"
-                f"**Голосовых:** {len(guild.voice_channels)}\n"
-                f"**Категорий:** {len(guild.categories)}"
+                f"**Текстовых:** {text_channels}\n"
+                f"**Голосовых:** {voice_channels}\n"
+                f"**Категорий:** {categories}"
             ),
             inline=True
         )
@@ -359,7 +591,7 @@ class UtilityCommands(commands.Cog):
         embed = discord.Embed(
             title=f"👤 {member.display_name}",
             color=member.color or Config.EMBED_COLOR,
-            timestamp=datetime.utcnow()
+            timestamp=discord.utils.utcnow()
         )
         
         embed.set_thumbnail(url=member.display_avatar.url)
@@ -383,14 +615,17 @@ class UtilityCommands(commands.Cog):
             inline=True
         )
         
-        if len(member.roles) > 1:  # > 1 потому что @everyone
-            roles = [role.mention for role in member.roles[1:][:10]]  # Первые 10 ролей
-            roles_text = ", ".join(roles)
-            if len(member.roles) > 11:
-                roles_text += f" и еще {len(member.roles) - 11}"
+        # member.roles каждый раз собирает и сортирует новый список - получаем его один раз
+        roles = member.roles
+        role_count = len(roles) - 1  # Без @everyone
+        
+        if role_count > 0:
+            roles_text = ", ".join(role.mention for role in roles[1:11])  # Первые 10 ролей
+            if role_count > 10:
+                roles_text += f" и еще {role_count - 10}"
             
             embed.add_field(
-                name=f"🎭 Роли ({len(member.roles) - 1})",
+                name=f"🎭 Роли ({role_count})",
                 value=roles_text,
                 inline=False
             )
@@ -426,44 +661,27 @@ class UtilityCommands(commands.Cog):
     )
     async def system_info(self, ctx: commands.Context):
         """Показать системную информацию"""
+        # Все блокирующие опросы выполняются параллельно вне event loop
+        cpu_percent, memory, disk, gpu_info = await asyncio.gather(
+            asyncio.to_thread(psutil.cpu_percent, interval=1),
+            asyncio.to_thread(psutil.virtual_memory),
+            asyncio.to_thread(psutil.disk_usage, '/'),
+            self._collect_gpu_info_async()
+        )
+        
         # CPU
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_count = psutil.cpu_count()
+        cpu_count = self._cpu_count
         
         # RAM
-        memory = psutil.virtual_memory()
         memory_used = memory.used / (1024 ** 3)  # GB
         memory_total = memory.total / (1024 ** 3)  # GB
         memory_percent = memory.percent
         
         # Disk
-        disk = psutil.disk_usage('/')
         disk_used = disk.used / (1024 ** 3)  # GB
         disk_total = disk.total / (1024 ** 3)  # GB
         disk_percent = disk.percent
         
-        # GPU - пробуем NVIDIA через GPUtil
-        gpu_info = None
-        if GPU_AVAILABLE:
-            try:
-                gpus = GPUtil.getGPUs()
-                if gpus:
-                    gpu = gpus[0]  # Берем первый GPU
-                    gpu_info = {
-                        'name': gpu.name,
-                        'load': gpu.load * 100,
-                        'memory_used': gpu.memoryUsed / 1024,  # GB
-                        'memory_total': gpu.memoryTotal / 1024,  # GB
-                        'memory_percent': (gpu.memoryUsed / gpu.memoryTotal) * 100,
-                        'temperature': gpu.temperature
-                    }
-            except Exception as e:
-                logger.warning(f"Ошибка получения информации о NVIDIA GPU: {e}")
-        
-        # Если NVIDIA GPU не найден, пробуем AMD
-        if not gpu_info:
-            gpu_info = self.get_amd_gpu_info()
-        
         embed = create_embed(
             "💻 Системная информация",
             ""
@@ -521,13 +739,13 @@ class UtilityCommands(commands.Cog):
         
         embed.add_field(
             name="🐍 Python",
-            value=f"**Версия:** {platform.python_version()}",
+            value=f"**Версия:** {self._python_version}",
             inline=True
         )
         
         embed.add_field(
             name="💬 Discord.py",
-            value=f"**Версия:** {discord.__version__}",
+            value=f"**Версия:** {self._discord_version}",
             inline=True
         )
         
@@ -4,20 +4,184 @@ Cog с командами для веб-поиска и обработки из
 
 import discord
 from discord.ext import commands
+import asyncio
 import logging
-from typing import Optional
-from utils import create_embed, create_error_embed, create_success_embed
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from utils import create_embed, create_error_embed, create_success_embed, first_image_url, truncate_text
 from config import Config
+from image_processing import ANALYSIS_ERROR_MESSAGES, FILTERS, image_cache_key
 import io
 
 logger = logging.getLogger(__name__)
 
 
+# Повторяющиеся ошибки команд изображений: {ключ: (заголовок, описание)}
+_ERRORS = {
+    'no_processor': ("Функция недоступна", "Обработка изображений не настроена."),
+    'no_image': ("Изображение не найдено", "Пожалуйста, прикрепите изображение к команде."),
+    'no_image_or_reply': ("Изображение не найдено", "Прикрепите изображение или ответьте на сообщение с изображением."),
+    'download_failed': ("Ошибка", "Не удалось скачать изображение."),
+}
+
+
 class WebAndImageCommands(commands.Cog):
     """Команды для веб-поиска и работы с изображениями"""
     
     def __init__(self, bot):
         self.bot = bot
+        
+        # Кэш результатов поиска: {нормализованный запрос: (время, результаты)}
+        self._search_cache: OrderedDict = OrderedDict()
+        
+        # Кэши по изображению: {URL без параметров: (время, информация)}
+        # и {(URL без параметров, промпт): (время, анализ)}
+        self._info_cache: OrderedDict = OrderedDict()
+        self._analyze_cache: OrderedDict = OrderedDict()
+    
+    async def _send_error(self, ctx: commands.Context, key: str):
+        """Отправка типовой ошибки из _ERRORS (embed создаётся заново ради актуального времени)"""
+        await ctx.send(embed=create_error_embed(*_ERRORS[key]))
+    
+    @staticmethod
+    def _ttl_get(cache: OrderedDict, key, ttl: float):
+        """Значение из LRU кэша с TTL (None если нет или устарело)"""
+        cached = cache.get(key)
+        if cached is None:
+            return None
+        
+        cached_at, value = cached
+        if time.monotonic() - cached_at >= ttl:
+            del cache[key]
+            return None
+        
+        cache.move_to_end(key)
+        return value
+    
+    @staticmethod
+    def _ttl_put(cache: OrderedDict, key, value, max_entries: int):
+        """Запись в LRU кэш с TTL с вытеснением самой старой записи"""
+        cache[key] = (time.monotonic(), value)
+        cache.move_to_end(key)
+        if len(cache) > max_entries:
+            cache.popitem(last=False)
+    
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Нормализация запроса для ключа кэша (регистр и лишние пробелы не важны)"""
+        return " ".join(query.lower().split())
+    
+    async def _cached_search(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
+        """
+        Веб-поиск с TTL кэшем результатов
+        
+        Args:
+            query: Поисковый запрос
+            max_results: Максимальное количество результатов
+        
+        Returns:
+            Список результатов поиска
+        """
+        key = (self._normalize_query(query), max_results)
+        
+        results = self._ttl_get(self._search_cache, key, Config.SEARCH_CACHE_TTL)
+        if results is not None:
+            logger.info(f"⚡ Результаты поиска '{query}' из кэша")
+            return results
+        
+        results = await self.bot.web_search.search(query, max_results=max_results)
+        
+        # Пустой результат не кэшируем - это может быть временная ошибка
+        if results:
+            self._ttl_put(self._search_cache, key, results, Config.SEARCH_CACHE_MAX_ENTRIES)
+        
+        return results
+    
+    async def _semantic_cached(self, scope: tuple, text: str, generate) -> str:
+        """
+        Ответ через семантический кэш бота
+        
+        Args:
+            scope: Область кэша (команда и всё, от чего зависит ответ кроме текста запроса)
+            text: Текст запроса для эмбеддинга
+            generate: Функция без аргументов, возвращающая корутину с ответом при промахе
+        
+        Returns:
+            Ответ из кэша или сгенерированный ответ
+        """
+        cache = self.bot.semantic_cache
+        
+        embedding = await cache.encode(text)
+        hit = cache.lookup(embedding, scope, tau=Config.COMMAND_CACHE_THRESHOLD)
+        
+        if hit:
+            response, similarity = hit
+            logger.info(f"⚡ Ответ команды {scope[0]} из семантического кэша (близость {similarity:.3f})")
+            return response
+        
+        response = await generate()
+        cache.insert(embedding, scope, response)
+        return response
+    
+    def _start_reference_fetch(self, ctx: commands.Context) -> Optional[asyncio.Task]:
+        """
+        Запуск загрузки сообщения, на которое ответили (только если она понадобится)
+        
+        Returns:
+            Задача загрузки или None, если загружать ничего не нужно
+        """
+        reference = ctx.message.reference
+        
+        if not reference or not reference.message_id:
+            return None
+        
+        # Своё изображение или уже присланное Discord сообщение - загрузка не нужна
+        if first_image_url(ctx.message.attachments) or isinstance(reference.resolved, discord.Message):
+            return None
+        
+        task = asyncio.create_task(ctx.channel.fetch_message(reference.message_id))
+        # Ошибку забираем сразу, чтобы не было предупреждения о
+        # необработанном исключении, если команда завершится раньше
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+    
+    async def _first_image_url(
+        self,
+        ctx: commands.Context,
+        use_reference: bool = False,
+        ref_task: Optional[asyncio.Task] = None
+    ) -> Optional[str]:
+        """
+        URL первого изображения: из вложений команды, затем из сообщения, на которое ответили
+        
+        Args:
+            ctx: Контекст команды
+            use_reference: Искать изображение в сообщении, на которое ответили
+            ref_task: Задача из _start_reference_fetch
+        
+        Returns:
+            URL изображения или None
+        """
+        image_url = first_image_url(ctx.message.attachments)
+        if image_url or not use_reference:
+            return image_url
+        
+        reference = ctx.message.reference
+        referenced_msg = None
+        
+        if reference and isinstance(reference.resolved, discord.Message):
+            referenced_msg = reference.resolved
+        elif ref_task is not None:
+            try:
+                referenced_msg = await ref_task
+            except discord.HTTPException as e:
+                logger.warning(f"Не удалось получить сообщение, на которое ответили: {e}")
+        
+        if referenced_msg is None:
+            return None
+        
+        return first_image_url(referenced_msg.attachments)
     
     @commands.command(
         name="search",
@@ -43,7 +207,7 @@ class WebAndImageCommands(commands.Cog):
                     return
                 
                 # Выполняем поиск
-                results = await self.bot.web_search.search(query, max_results=5)
+                results = await self._cached_search(query, max_results=5)
                 
                 if not results:
                     await ctx.send(
@@ -56,29 +220,29 @@ class WebAndImageCommands(commands.Cog):
                 
                 # Создаем embed с результатами
                 embed = create_embed(
-                    f"🔍 Результаты поиска: {query}",
+                    truncate_text(f"🔍 Результаты поиска: {query}", 256),
                     f"Найдено {len(results)} результатов"
                 )
                 
                 for i, result in enumerate(results, 1):
-                    title = result.get('title', 'Без названия')[:256]
-                    snippet = result.get('snippet', 'Нет описания')[:1024]
-                    url = result.get('url', '')
-                    source = result.get('source', 'Неизвестно')
+                    title = result['title']
+                    url = result['url']
+                    source = result['source']
                     
-                    field_value = f"{snippet}\n"
+                    # Ссылка и источник идут целиком, сниппет обрезается под остаток лимита поля
+                    tail = f"*Источник: {source}*"
                     if url:
-                        field_value += f"[Перейти к источнику]({url})\n"
-                    field_value += f"*Источник: {source}*"
+                        tail = f"[Перейти к источнику]({url})\n{tail}"
+                    snippet = result['snippet'][:max(0, 1023 - len(tail))]
                     
                     embed.add_field(
-                        name=f"{i}. {title}",
-                        value=field_value[:1024],
+                        name=truncate_text(f"{i}. {title}", 256),
+                        value=f"{snippet}\n{tail}"[:1024],
                         inline=False
                     )
                 
                 await ctx.send(embed=embed)
-                
+            
             except Exception as e:
                 logger.error(f"Ошибка веб-поиска: {e}", exc_info=True)
                 await ctx.send(
@@ -111,7 +275,8 @@ class WebAndImageCommands(commands.Cog):
                     )
                     return
                 
-                # Поиск и суммаризация
+                # Поиск и суммаризация (сводка актуальна на момент запроса - семантически не кэшируется,
+                # ответы источников кэширует WebSearchTool на SEARCH_CACHE_TTL)
                 summary = await self.bot.search_enhanced_llm.search_and_summarize(query)
                 
                 # Отправляем результат
@@ -122,7 +287,7 @@ class WebAndImageCommands(commands.Cog):
                 embed.set_footer(text="Информация получена из веб-источников и обработана AI")
                 
                 await ctx.send(embed=embed)
-                
+            
             except Exception as e:
                 logger.error(f"Ошибка AI поиска: {e}", exc_info=True)
                 await ctx.send(
@@ -152,21 +317,32 @@ class WebAndImageCommands(commands.Cog):
                     return
                 
                 # Получаем историю
-                history = await self.bot.conversation_manager.get_history(
+                history = self.bot.conversation_manager.get_history(
                     ctx.channel.id,
                     ctx.author.id
                 )
                 
-                # Генерируем ответ с веб-поиском
-                response = await self.bot.search_enhanced_llm.generate_with_search(
-                    user_message=question,
-                    conversation_history=history,
-                    system_prompt=Config.SYSTEM_PROMPT,
-                    auto_search=True
-                )
+                def generate():
+                    return self.bot.search_enhanced_llm.generate_with_search(
+                        user_message=question,
+                        conversation_history=history,
+                        system_prompt=Config.SYSTEM_PROMPT,
+                        auto_search=True
+                    )
+                
+                # Ответ с веб-поиском зависит от времени, а ответ с историей - от неё
+                # (и повторно не встретится) - кэшируем только ответы без поиска и без истории
+                if history or self.bot.search_enhanced_llm.needs_search(question):
+                    response = await generate()
+                else:
+                    response = await self._semantic_cached(
+                        ("askweb", Config.SYSTEM_PROMPT, ctx.channel.id),
+                        question,
+                        generate
+                    )
                 
                 # Сохраняем в историю
-                await self.bot.conversation_manager.add_message(
+                self.bot.conversation_manager.add_message(
                     channel_id=ctx.channel.id,
                     user_id=ctx.author.id,
                     user_message=question,
@@ -175,7 +351,7 @@ class WebAndImageCommands(commands.Cog):
                 
                 # Отправляем ответ
                 await self.bot.send_long_message(ctx.channel, response, reference=ctx.message)
-                
+            
             except Exception as e:
                 logger.error(f"Ошибка askweb: {e}", exc_info=True)
                 await ctx.send(
@@ -197,49 +373,39 @@ class WebAndImageCommands(commands.Cog):
         Использование: !imageinfo (прикрепите изображение)
         """
         async with ctx.typing():
+            image_file = None
             try:
                 if not hasattr(self.bot, 'image_processor'):
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Функция недоступна",
-                            "Обработка изображений не настроена."
-                        )
-                    )
+                    await self._send_error(ctx, 'no_processor')
                     return
                 
                 # Проверяем наличие изображения
-                image_url = None
-                
-                # Проверяем вложения
-                if ctx.message.attachments:
-                    for attachment in ctx.message.attachments:
-                        if attachment.content_type and attachment.content_type.startswith('image/'):
-                            image_url = attachment.url
-                            break
+                image_url = await self._first_image_url(ctx)
                 
                 if not image_url:
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Изображение не найдено",
-                            "Пожалуйста, прикрепите изображение к команде."
-                        )
-                    )
+                    await self._send_error(ctx, 'no_image')
                     return
                 
-                # Скачиваем изображение
-                image_data = await self.bot.image_processor.download_image(image_url)
+                cache_key = image_cache_key(image_url)
+                info = self._ttl_get(self._info_cache, cache_key, Config.IMAGE_RESULT_CACHE_TTL)
                 
-                if not image_data:
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Ошибка",
-                            "Не удалось скачать изображение."
+                if info is None:
+                    # Скачиваем потоком во временный файл, не держа все байты в памяти
+                    image_file = await self.bot.image_processor.download_image_stream(image_url)
+                    
+                    if image_file is None:
+                        await self._send_error(ctx, 'download_failed')
+                        return
+                    
+                    # Получаем информацию
+                    info = await self.bot.image_processor.get_image_info_async(image_file)
+                    if info:
+                        self._ttl_put(
+                            self._info_cache,
+                            cache_key,
+                            info,
+                            Config.IMAGE_RESULT_CACHE_MAX_ENTRIES
                         )
-                    )
-                    return
-                
-                # Получаем информацию
-                info = self.bot.image_processor.get_image_info(image_data)
                 
                 # Создаем embed
                 embed = create_embed(
@@ -276,7 +442,7 @@ class WebAndImageCommands(commands.Cog):
                 embed.set_thumbnail(url=image_url)
                 
                 await ctx.send(embed=embed)
-                
+            
             except Exception as e:
                 logger.error(f"Ошибка imageinfo: {e}", exc_info=True)
                 await ctx.send(
@@ -285,6 +451,9 @@ class WebAndImageCommands(commands.Cog):
                         "Не удалось получить информацию об изображении."
                     )
                 )
+            finally:
+                if image_file is not None:
+                    image_file.close()
     
     @commands.command(
         name="analyze",
@@ -298,65 +467,53 @@ class WebAndImageCommands(commands.Cog):
         Использование: !analyze [описание] (прикрепите изображение)
         Пример: !analyze что изображено на картинке?
         """
+        # Сообщение, на которое ответили, загружается параллельно с индикатором набора
+        ref_task = self._start_reference_fetch(ctx)
+        
         async with ctx.typing():
             try:
                 if not hasattr(self.bot, 'image_processor'):
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Функция недоступна",
-                            "Обработка изображений не настроена."
-                        )
-                    )
+                    await self._send_error(ctx, 'no_processor')
                     return
                 
-                # Проверяем наличие изображения
-                image_url = None
-                
-                if ctx.message.attachments:
-                    for attachment in ctx.message.attachments:
-                        if attachment.content_type and attachment.content_type.startswith('image/'):
-                            image_url = attachment.url
-                            break
-                
-                # Проверяем ссылку на сообщение
-                if not image_url and ctx.message.reference:
-                    referenced_msg = await ctx.channel.fetch_message(ctx.message.reference.message_id)
-                    if referenced_msg.attachments:
-                        for attachment in referenced_msg.attachments:
-                            if attachment.content_type and attachment.content_type.startswith('image/'):
-                                image_url = attachment.url
-                                break
+                # Проверяем наличие изображения (во вложениях или в сообщении, на которое ответили)
+                image_url = await self._first_image_url(ctx, use_reference=True, ref_task=ref_task)
                 
                 if not image_url:
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Изображение не найдено",
-                            "Прикрепите изображение или ответьте на сообщение с изображением."
-                        )
-                    )
-                    return
-                
-                # Скачиваем изображение
-                image_data = await self.bot.image_processor.download_image(image_url)
-                
-                if not image_data:
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Ошибка",
-                            "Не удалось скачать изображение."
-                        )
-                    )
+                    await self._send_error(ctx, 'no_image_or_reply')
                     return
                 
-                # Анализируем
                 if not prompt:
                     prompt = "Опиши это изображение подробно. Что на нем изображено?"
                 
-                analysis = await self.bot.image_processor.analyze_image_with_llm(
-                    image_data,
-                    prompt=prompt,
-                    resize=True
-                )
+                cache_key = (image_cache_key(image_url), prompt)
+                analysis = self._ttl_get(self._analyze_cache, cache_key, Config.IMAGE_RESULT_CACHE_TTL)
+                
+                if analysis is not None:
+                    logger.info("⚡ Анализ изображения из кэша")
+                else:
+                    # Скачиваем изображение
+                    image_data = await self.bot.image_processor.download_image(image_url)
+                    
+                    if not image_data:
+                        await self._send_error(ctx, 'download_failed')
+                        return
+                    
+                    # Анализируем
+                    analysis = await self.bot.image_processor.analyze_image_with_llm(
+                        image_data,
+                        prompt=prompt,
+                        resize=True
+                    )
+                    
+                    # Сообщения об ошибках не кэшируем - следующая попытка может пройти
+                    if analysis not in ANALYSIS_ERROR_MESSAGES:
+                        self._ttl_put(
+                            self._analyze_cache,
+                            cache_key,
+                            analysis,
+                            Config.IMAGE_RESULT_CACHE_MAX_ENTRIES
+                        )
                 
                 # Отправляем результат
                 embed = create_embed(
@@ -369,7 +526,7 @@ class WebAndImageCommands(commands.Cog):
                     embed.set_footer(text=f"Запрос: {prompt}")
                 
                 await ctx.send(embed=embed)
-                
+            
             except Exception as e:
                 logger.error(f"Ошибка analyze: {e}", exc_info=True)
                 await ctx.send(
@@ -392,49 +549,40 @@ class WebAndImageCommands(commands.Cog):
         Доступные фильтры: grayscale, blur, sharpen, edge, emboss, brightness, contrast
         """
         async with ctx.typing():
+            image_file = None
             try:
                 if not hasattr(self.bot, 'image_processor'):
+                    await self._send_error(ctx, 'no_processor')
+                    return
+                
+                # Неизвестный фильтр отклоняем до скачивания изображения
+                if filter_type not in FILTERS:
                     await ctx.send(
                         embed=create_error_embed(
-                            "Функция недоступна",
-                            "Обработка изображений не настроена."
+                            "Ошибка",
+                            f"Неизвестный фильтр: {filter_type}\n"
+                            f"Доступные: {', '.join(FILTERS)}"
                         )
                     )
                     return
                 
                 # Проверяем наличие изображения
-                image_url = None
-                
-                if ctx.message.attachments:
-                    for attachment in ctx.message.attachments:
-                        if attachment.content_type and attachment.content_type.startswith('image/'):
-                            image_url = attachment.url
-                            break
+                image_url = await self._first_image_url(ctx)
                 
                 if not image_url:
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Изображение не найдено",
-                            "Пожалуйста, прикрепите изображение к команде."
-                        )
-                    )
+                    await self._send_error(ctx, 'no_image')
                     return
                 
-                # Скачиваем изображение
-                image_data = await self.bot.image_processor.download_image(image_url)
+                # Скачиваем потоком во временный файл, не держа все байты в памяти
+                image_file = await self.bot.image_processor.download_image_stream(image_url)
                 
-                if not image_data:
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Ошибка",
-                            "Не удалось скачать изображение."
-                        )
-                    )
+                if image_file is None:
+                    await self._send_error(ctx, 'download_failed')
                     return
                 
                 # Применяем фильтр
-                filtered_image = self.bot.image_processor.apply_filter(
-                    image_data,
+                filtered_image = await self.bot.image_processor.apply_filter_async(
+                    image_file,
                     filter_type=filter_type
                 )
                 
@@ -442,8 +590,7 @@ class WebAndImageCommands(commands.Cog):
                     await ctx.send(
                         embed=create_error_embed(
                             "Ошибка",
-                            f"Неизвестный фильтр: {filter_type}\n"
-                            f"Доступные: grayscale, blur, sharpen, edge, emboss, brightness, contrast"
+                            "Не удалось применить фильтр."
                         )
                     )
                     return
@@ -460,7 +607,7 @@ class WebAndImageCommands(commands.Cog):
                 )
                 
                 await ctx.send(embed=embed, file=file)
-                
+            
             except Exception as e:
                 logger.error(f"Ошибка filter: {e}", exc_info=True)
                 await ctx.send(
@@ -469,6 +616,9 @@ class WebAndImageCommands(commands.Cog):
                         "Не удалось применить фильтр."
                     )
                 )
+            finally:
+                if image_file is not None:
+                    image_file.close()
     
     @commands.command(
         name="resize",
@@ -488,35 +638,13 @@ class WebAndImageCommands(commands.Cog):
         Пример: !resize 800 600
         """
         async with ctx.typing():
+            image_file = None
             try:
                 if not hasattr(self.bot, 'image_processor'):
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Функция недоступна",
-                            "Обработка изображений не настроена."
-                        )
-                    )
-                    return
-                
-                # Проверяем наличие изображения
-                image_url = None
-                
-                if ctx.message.attachments:
-                    for attachment in ctx.message.attachments:
-                        if attachment.content_type and attachment.content_type.startswith('image/'):
-                            image_url = attachment.url
-                            break
-                
-                if not image_url:
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Изображение не найдено",
-                            "Пожалуйста, прикрепите изображение к команде."
-                        )
-                    )
+                    await self._send_error(ctx, 'no_processor')
                     return
                 
-                # Проверяем размеры
+                # Проверяем размеры (до поиска и скачивания изображения)
                 if width < 10 or height < 10 or width > 4096 or height > 4096:
                     await ctx.send(
                         embed=create_error_embed(
@@ -526,21 +654,23 @@ class WebAndImageCommands(commands.Cog):
                     )
                     return
                 
-                # Скачиваем изображение
-                image_data = await self.bot.image_processor.download_image(image_url)
+                # Проверяем наличие изображения
+                image_url = await self._first_image_url(ctx)
                 
-                if not image_data:
-                    await ctx.send(
-                        embed=create_error_embed(
-                            "Ошибка",
-                            "Не удалось скачать изображение."
-                        )
-                    )
+                if not image_url:
+                    await self._send_error(ctx, 'no_image')
+                    return
+                
+                # Скачиваем потоком во временный файл, не держа все байты в памяти
+                image_file = await self.bot.image_processor.download_image_stream(image_url)
+                
+                if image_file is None:
+                    await self._send_error(ctx, 'download_failed')
                     return
                 
                 # Изменяем размер
-                resized_image = self.bot.image_processor.resize_image(
-                    image_data,
+                resized_image = await self.bot.image_processor.resize_image_async(
+                    image_file,
                     max_width=width,
                     max_height=height
                 )
@@ -566,7 +696,7 @@ class WebAndImageCommands(commands.Cog):
                 )
                 
                 await ctx.send(embed=embed, file=file)
-                
+            
             except Exception as e:
                 logger.error(f"Ошибка resize: {e}", exc_info=True)
                 await ctx.send(
@@ -575,6 +705,9 @@ class WebAndImageCommands(commands.Cog):
                         "Не удалось изменить размер изображения."
                     )
                 )
+            finally:
+                if image_file is not None:
+                    image_file.close()
 
 
 async def setup(bot):
@@ -3,37 +3,79 @@
 """
 
 import os
+import re
+from dataclasses import dataclass
+from typing import FrozenSet
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
-class Config:
-    """Класс конфигурации бота"""
+_ID_RE = re.compile(r'\d+')
+
+
+def _parse_id_set(name: str) -> FrozenSet[int]:
+    """Разбор списка ID из переменной окружения (разделители - любые нецифровые символы)"""
+    return frozenset(int(match) for match in _ID_RE.findall(os.getenv(name, '')))
+
+
+@dataclass(slots=True)
+class BotConfig:
+    """
+    Конфигурация бота
+    
+    Значения читаются из окружения один раз при импорте. Экземпляр не заморожен:
+    модель, температура и системный промпт меняются командами во время работы.
+    """
     
     # Discord настройки
-    DISCORD_TOKEN = os.getenv('DISCORD_TOKEN', 'YOUR_DISCORD_TOKEN_HERE')
-    PREFIX = os.getenv('PREFIX', '!')
+    DISCORD_TOKEN: str = os.getenv('DISCORD_TOKEN', 'YOUR_DISCORD_TOKEN_HERE')
+    PREFIX: str = os.getenv('PREFIX', '!')
     
     # Прокси настройки (для обхода блокировок)
-    PROXY_URL = os.getenv('PROXY_URL', '')  # Например: socks5://127.0.0.1:10808
-    USE_PROXY = os.getenv('USE_PROXY', 'false').lower() == 'true'
+    PROXY_URL: str = os.getenv('PROXY_URL', '')  # Например: socks5://127.0.0.1:10808
+    USE_PROXY: bool = os.getenv('USE_PROXY', 'false').lower() == 'true'
     
     # LM Studio настройки
-    LM_STUDIO_URL = os.getenv('LM_STUDIO_URL', 'http://localhost:1234/v1')
-    LM_STUDIO_MODEL = os.getenv('LM_STUDIO_MODEL', 'local-model')
+    LM_STUDIO_URL: str = os.getenv('LM_STUDIO_URL', 'http://localhost:1234/v1')
+    LM_STUDIO_MODEL: str = os.getenv('LM_STUDIO_MODEL', 'local-model')
+    LLM_CONCURRENCY: int = int(os.getenv('LLM_CONCURRENCY', '2'))  # Одновременных генераций в LM Studio
     
     # Параметры генерации
-    MAX_TOKENS = int(os.getenv('MAX_TOKENS', '2000'))
-    TEMPERATURE = float(os.getenv('TEMPERATURE', '0.7'))
-    TOP_P = float(os.getenv('TOP_P', '0.9'))
+    MAX_TOKENS: int = int(os.getenv('MAX_TOKENS', '2000'))
+    MAX_USER_INPUT_CHARS: int = int(os.getenv('MAX_USER_INPUT_CHARS', '8000'))  # Лимит длины запроса к AI
+    TEMPERATURE: float = float(os.getenv('TEMPERATURE', '0.7'))
+    TOP_P: float = float(os.getenv('TOP_P', '0.9'))
     
     # Управление контекстом
-    MAX_CONTEXT_MESSAGES = int(os.getenv('MAX_CONTEXT_MESSAGES', '10'))
-    CONTEXT_TIMEOUT = int(os.getenv('CONTEXT_TIMEOUT', '3600'))  # 1 час в секундах
+    MAX_CONTEXT_MESSAGES: int = int(os.getenv('MAX_CONTEXT_MESSAGES', '10'))
+    # Запас обменов сверх MAX_CONTEXT_MESSAGES: история обрезается сразу на столько,
+    # а между обрезками префикс промпта не меняется и LM Studio переиспользует KV-кэш
+    PREFIX_CACHE_BUFFER: int = int(os.getenv('PREFIX_CACHE_BUFFER', '4'))
+    CONTEXT_TIMEOUT: int = int(os.getenv('CONTEXT_TIMEOUT', '3600'))  # 1 час в секундах
+    # Обменов в промпте !summarize (меньше хранимой истории - MAX_CONTEXT_MESSAGES + PREFIX_CACHE_BUFFER)
+    MAX_SUMMARY_TURNS: int = int(os.getenv('MAX_SUMMARY_TURNS', '6'))
+    
+    # Семантический кэш ответов (требует numpy и sentence-transformers)
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+    SEMANTIC_CACHE_MODEL: str = os.getenv('SEMANTIC_CACHE_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.85'))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '5000'))
+    SEMANTIC_CACHE_TTL: float = float(os.getenv('SEMANTIC_CACHE_TTL', '3600'))
+    # Порог для команд !ask/!translate/!code/!summarize (строже, чем для упоминаний)
+    COMMAND_CACHE_THRESHOLD: float = float(os.getenv('COMMAND_CACHE_THRESHOLD', '0.92'))
+    
+    # Обработка изображений
+    IMAGE_POOL_WORKERS: int = int(os.getenv('IMAGE_POOL_WORKERS', '2'))  # Процессов для !filter/!resize (0 = потоки)
+    IMAGE_RESULT_CACHE_TTL: float = float(os.getenv('IMAGE_RESULT_CACHE_TTL', '1800'))  # Кэш !imageinfo/!analyze, 30 минут
+    IMAGE_RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv('IMAGE_RESULT_CACHE_MAX_ENTRIES', '256'))
+    
+    # Кэш результатов веб-поиска
+    SEARCH_CACHE_TTL: float = float(os.getenv('SEARCH_CACHE_TTL', '300'))  # 5 минут
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '512'))
     
     # Системный промпт
-    SYSTEM_PROMPT = os.getenv(
+    SYSTEM_PROMPT: str = os.getenv(
         'SYSTEM_PROMPT',
         "Ты умный и дружелюбный ИИ-ассистент в Discord. "
         "Отвечай полезно, точно и вежливо. "
@@ -49,32 +91,42 @@ class Config:
     )
     
     # Роли и разрешения
-    ADMIN_ROLE_IDS = [int(x) for x in os.getenv('ADMIN_ROLE_IDS', '').split(',') if x]
-    MODERATOR_ROLE_IDS = [int(x) for x in os.getenv('MODERATOR_ROLE_IDS', '').split(',') if x]
+    ADMIN_ROLE_IDS: FrozenSet[int] = _parse_id_set('ADMIN_ROLE_IDS')
+    MODERATOR_ROLE_IDS: FrozenSet[int] = _parse_id_set('MODERATOR_ROLE_IDS')
     
     # Лимиты
-    RATE_LIMIT_MESSAGES = int(os.getenv('RATE_LIMIT_MESSAGES', '5'))  # сообщений
-    RATE_LIMIT_PERIOD = int(os.getenv('RATE_LIMIT_PERIOD', '60'))  # за период в секундах
+    RATE_LIMIT_MESSAGES: int = int(os.getenv('RATE_LIMIT_MESSAGES', '5'))  # сообщений
+    RATE_LIMIT_PERIOD: int = int(os.getenv('RATE_LIMIT_PERIOD', '60'))  # за период в секундах
     
     # Логирование
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-    LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+    LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FILE: str = os.getenv('LOG_FILE', 'bot.log')
     
     # Эмбеддинги и цвета
-    EMBED_COLOR = int(os.getenv('EMBED_COLOR', '0x00ff00'), 16)
-    ERROR_COLOR = int(os.getenv('ERROR_COLOR', '0xff0000'), 16)
-    WARNING_COLOR = int(os.getenv('WARNING_COLOR', '0xffaa00'), 16)
+    EMBED_COLOR: int = int(os.getenv('EMBED_COLOR', '0x00ff00'), 16)
+    ERROR_COLOR: int = int(os.getenv('ERROR_COLOR', '0xff0000'), 16)
+    WARNING_COLOR: int = int(os.getenv('WARNING_COLOR', '0xffaa00'), 16)
     
     @classmethod
-    def validate(cls):
+    def _load(cls) -> "BotConfig":
+        """Создание конфигурации из переменных окружения"""
+        return cls()
+    
+    def validate(self):
         """Проверка конфигурации"""
-        if cls.DISCORD_TOKEN == 'YOUR_DISCORD_TOKEN_HERE':
+        if self.DISCORD_TOKEN == 'YOUR_DISCORD_TOKEN_HERE':
             raise ValueError("DISCORD_TOKEN не настроен! Установите его в файле .env")
         
-        if cls.MAX_CONTEXT_MESSAGES < 1:
+        if self.MAX_CONTEXT_MESSAGES < 1:
             raise ValueError("MAX_CONTEXT_MESSAGES должен быть больше 0")
         
-        if not (0 <= cls.TEMPERATURE <= 2):
+        if not (0 <= self.TEMPERATURE <= 2):
             raise ValueError("TEMPERATURE должна быть между 0 и 2")
         
         return True
+
+
+CONFIG = BotConfig._load()
+
+# Совместимость: модули импортируют `from config import Config`
+Config = CONFIG
@@ -2,32 +2,80 @@
 Менеджер разговоров для управления историей и контекстом
 """
 
-import asyncio
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
-from collections import defaultdict
+import io
+import math
+import time
+from typing import List, Dict, Optional, Tuple
+from dataclasses import dataclass
+from datetime import datetime
+from collections import deque, OrderedDict
+from itertools import islice
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Сдвиг от time.monotonic() к времени Unix: метки сообщений хранятся как monotonic,
+# а в настенное время переводятся только при экспорте
+_MONOTONIC_TO_WALL = time.time() - time.monotonic()
+
+
+def _wall_clock(timestamp: float) -> datetime:
+    """Перевод метки time.monotonic() в локальное время"""
+    return datetime.fromtimestamp(_MONOTONIC_TO_WALL + timestamp)
+
+
+@dataclass(slots=True, eq=False)
+class Conversation:
+    """
+    Разговор одного пользователя в канале
+    
+    Сообщения добавляются и удаляются только парами (user + assistant) в deque
+    чётной длины, поэтому сообщений пользователя и бота всегда поровну.
+    messages хранит готовые для LLM словари {role, content}, а время каждой пары
+    лежит отдельно в timestamps - get_history не пересобирает сообщения.
+    eq=False: хэш по идентичности - объект сам служит ключом LRU.
+    """
+    
+    channel_id: int
+    user_id: int
+    messages: deque
+    timestamps: deque  # time.monotonic() каждой пары сообщений
+    last_activity: float = 0.0  # time.monotonic()
+    
+    def iter_with_timestamps(self):
+        """Пары (метка времени, сообщение) в хронологическом порядке"""
+        messages = iter(self.messages)
+        # zip по одному итератору дважды разбивает сообщения на пары user/assistant
+        for timestamp, user_msg, bot_msg in zip(self.timestamps, messages, messages):
+            yield timestamp, user_msg
+            yield timestamp, bot_msg
+
 
 class ConversationManager:
     """Управление историей разговоров"""
     
-    def __init__(self, max_history: int = 10):
+    def __init__(
+        self,
+        max_history: int = 10,
+        max_conversations: int = 10000,
+        history_buffer: int = 0
+    ):
         """
         Args:
             max_history: Максимальное количество сообщений в истории
+            max_conversations: Максимум разговоров в памяти (вытесняются давно неактивные)
+            history_buffer: Обменов сверх max_history до обрезки истории (0 = обрезка каждый ход)
         """
         self.max_history = max_history
+        self.max_conversations = max_conversations
+        self.history_buffer = history_buffer
         
-        # Структура: {channel_id: {user_id: [messages]}}
-        self.conversations: Dict[int, Dict[int, List[Dict]]] = defaultdict(
-            lambda: defaultdict(list)
-        )
+        # Структура: {channel_id: {user_id: Conversation}}
+        # Обычные dict: чтение отсутствующего разговора не создаёт пустых записей
+        self.conversations: Dict[int, Dict[int, Conversation]] = {}
         
-        # Время последнего сообщения для таймаута
-        self.last_activity: Dict[tuple, datetime] = {}
+        # Разговоры в порядке активности (LRU): самый давно неактивный первый
+        self._activity: OrderedDict[Conversation, None] = OrderedDict()
         
         # Глобальная статистика
         self.stats = {
@@ -35,7 +83,7 @@ class ConversationManager:
             'total_conversations': 0
         }
     
-    async def add_message(
+    def add_message(
         self,
         channel_id: int,
         user_id: int,
@@ -51,33 +99,75 @@ class ConversationManager:
             user_message: Сообщение пользователя
             bot_response: Ответ бота
         """
-        conversation = self.conversations[channel_id][user_id]
-        
-        # Добавляем сообщение пользователя
-        conversation.append({
-            "role": "user",
-            "content": user_message,
-            "timestamp": datetime.now()
-        })
-        
-        # Добавляем ответ бота
-        conversation.append({
-            "role": "assistant",
-            "content": bot_response,
-            "timestamp": datetime.now()
-        })
-        
-        # Обрезаем историю если слишком длинная
-        if len(conversation) > self.max_history * 2:  # *2 потому что user+assistant
-            conversation[:] = conversation[-(self.max_history * 2):]
+        channel = self.conversations.setdefault(channel_id, {})
+        conversation = channel.get(user_id)
+        if conversation is None:
+            conversation = channel[user_id] = Conversation(
+                channel_id,
+                user_id,
+                deque(),
+                deque()
+            )
+        
+        messages = conversation.messages
+        timestamps = conversation.timestamps
+        now = time.monotonic()
+        
+        # Добавляем сообщение пользователя и ответ бота
+        messages.append({"role": "user", "content": user_message})
+        messages.append({"role": "assistant", "content": bot_response})
+        timestamps.append(now)
+        
+        # История обрезается пачкой, а не по обмену за ход: пока обрезки нет,
+        # каждый следующий промпт продолжает предыдущий и LM Studio
+        # переиспользует KV-кэш общего префикса
+        if len(timestamps) > self.max_history + self.history_buffer:
+            for _ in range(len(timestamps) - self.max_history):
+                timestamps.popleft()
+                messages.popleft()
+                messages.popleft()
         
         # Обновляем время последней активности
-        self.last_activity[(channel_id, user_id)] = datetime.now()
+        conversation.last_activity = now
+        self._activity[conversation] = None
+        self._activity.move_to_end(conversation)
+        
+        # Вытесняем самые давно неактивные разговоры
+        while len(self._activity) > self.max_conversations:
+            oldest, _ = self._activity.popitem(last=False)
+            self._remove(oldest)
         
         # Обновляем статистику
         self.stats['total_messages'] += 2
     
-    async def get_history(
+    def _get(self, channel_id: int, user_id: int) -> Optional[Conversation]:
+        """Разговор пользователя в канале без создания пустой записи"""
+        channel = self.conversations.get(channel_id)
+        if channel is None:
+            return None
+        return channel.get(user_id)
+    
+    def _get_messages(self, channel_id: int, user_id: int) -> Optional[deque]:
+        """Сообщения разговора пользователя в канале (None если разговора нет)"""
+        conversation = self._get(channel_id, user_id)
+        return conversation.messages if conversation else None
+    
+    def _remove(self, conversation: Conversation):
+        """Удаление разговора из хранилища и из LRU"""
+        self._activity.pop(conversation, None)
+        
+        channel = self.conversations.get(conversation.channel_id)
+        if channel is None:
+            return
+        
+        if channel.get(conversation.user_id) is conversation:
+            del channel[conversation.user_id]
+        
+        # Пустой канал не держим в памяти
+        if not channel:
+            del self.conversations[conversation.channel_id]
+    
+    def get_history(
         self,
         channel_id: int,
         user_id: int,
@@ -94,22 +184,36 @@ class ConversationManager:
         Returns:
             Список сообщений в формате OpenAI
         """
-        conversation = self.conversations[channel_id][user_id]
+        conversation = self._get_messages(channel_id, user_id)
         
         if not conversation:
             return []
         
-        # Применяем лимит если указан
+        # Сообщения уже в формате OpenAI - копируется только список
         if limit:
-            conversation = conversation[-(limit * 2):]
+            return list(islice(
+                conversation,
+                max(0, len(conversation) - limit * 2),
+                None
+            ))
+        
+        return list(conversation)
+    
+    def history_len(self, channel_id: int, user_id: int) -> int:
+        """
+        Количество сообщений в истории разговора (без копирования истории)
         
-        # Возвращаем без временных меток
-        return [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in conversation
-        ]
+        Args:
+            channel_id: ID канала
+            user_id: ID пользователя
+            
+        Returns:
+            Число сообщений
+        """
+        conversation = self._get_messages(channel_id, user_id)
+        return len(conversation) if conversation else 0
     
-    async def clear_history(
+    def clear_history(
         self,
         channel_id: int,
         user_id: Optional[int] = None
@@ -121,17 +225,22 @@ class ConversationManager:
             channel_id: ID канала
             user_id: ID пользователя (None = все пользователи в канале)
         """
+        channel = self.conversations.get(channel_id)
+        if not channel:
+            return
+        
         if user_id:
-            if channel_id in self.conversations:
-                if user_id in self.conversations[channel_id]:
-                    del self.conversations[channel_id][user_id]
-                    logger.info(f"История очищена для user {user_id} в канале {channel_id}")
+            conversation = channel.get(user_id)
+            if conversation is not None:
+                self._remove(conversation)
+                logger.info(f"История очищена для user {user_id} в канале {channel_id}")
         else:
-            if channel_id in self.conversations:
-                del self.conversations[channel_id]
-                logger.info(f"Вся история очищена для канала {channel_id}")
+            for conversation in channel.values():
+                self._activity.pop(conversation, None)
+            del self.conversations[channel_id]
+            logger.info(f"Вся история очищена для канала {channel_id}")
     
-    async def get_conversation_summary(
+    def get_conversation_summary(
         self,
         channel_id: int,
         user_id: int
@@ -142,9 +251,9 @@ class ConversationManager:
         Returns:
             Словарь с информацией о разговоре
         """
-        conversation = self.conversations[channel_id][user_id]
+        conversation = self._get(channel_id, user_id)
         
-        if not conversation:
+        if not conversation or not conversation.messages:
             return {
                 'message_count': 0,
                 'user_messages': 0,
@@ -153,48 +262,44 @@ class ConversationManager:
                 'last_message': None
             }
         
-        user_msgs = [m for m in conversation if m['role'] == 'user']
-        bot_msgs = [m for m in conversation if m['role'] == 'assistant']
+        # Сообщения хранятся парами - считать роли не нужно
+        pairs = len(conversation.timestamps)
         
         return {
-            'message_count': len(conversation),
-            'user_messages': len(user_msgs),
-            'bot_messages': len(bot_msgs),
-            'first_message': conversation[0]['timestamp'] if conversation else None,
-            'last_message': conversation[-1]['timestamp'] if conversation else None
+            'message_count': len(conversation.messages),
+            'user_messages': pairs,
+            'bot_messages': pairs,
+            'first_message': _wall_clock(conversation.timestamps[0]),
+            'last_message': _wall_clock(conversation.timestamps[-1])
         }
     
-    async def cleanup_old_conversations(self, timeout_seconds: int = 3600):
+    def cleanup_old_conversations(self, timeout_seconds: int = 3600):
         """
         Очистка старых неактивных разговоров
         
         Args:
             timeout_seconds: Таймаут неактивности в секундах
         """
-        now = datetime.now()
-        timeout = timedelta(seconds=timeout_seconds)
-        
-        keys_to_remove = []
-        
-        for key, last_time in self.last_activity.items():
-            if now - last_time > timeout:
-                keys_to_remove.append(key)
-        
-        for channel_id, user_id in keys_to_remove:
-            await self.clear_history(channel_id, user_id)
-            del self.last_activity[(channel_id, user_id)]
-        
-        if keys_to_remove:
-            logger.info(f"Очищено {len(keys_to_remove)} неактивных разговоров")
+        cutoff = time.monotonic() - timeout_seconds
+        removed = 0
+        
+        # LRU упорядочен по активности: просматриваем только устаревшие с начала
+        while self._activity:
+            oldest = next(iter(self._activity))
+            if oldest.last_activity >= cutoff:
+                break
+            self._remove(oldest)
+            removed += 1
+        
+        if removed:
+            logger.info(f"Очищено {removed} неактивных разговоров")
     
-    async def get_all_conversations_count(self) -> int:
+    def get_all_conversations_count(self) -> int:
         """Получение общего количества активных разговоров"""
-        count = 0
-        for channel_conversations in self.conversations.values():
-            count += len(channel_conversations)
-        return count
+        # В LRU ровно по одной записи на разговор - счётчик поддерживается сам
+        return len(self._activity)
     
-    async def export_conversation(
+    def export_conversation(
         self,
         channel_id: int,
         user_id: int
@@ -205,32 +310,64 @@ class ConversationManager:
         Returns:
             Форматированная строка с историей разговора
         """
-        conversation = self.conversations[channel_id][user_id]
+        conversation = self._get(channel_id, user_id)
         
-        if not conversation:
+        if not conversation or not conversation.messages:
             return "История разговора пуста."
         
         lines = ["=== История разговора ===\n"]
         
-        for msg in conversation:
-            timestamp = msg['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+        for msg_time, msg in conversation.iter_with_timestamps():
+            timestamp = _wall_clock(msg_time).strftime('%Y-%m-%d %H:%M:%S')
             role = "Пользователь" if msg['role'] == 'user' else "Бот"
             lines.append(f"[{timestamp}] {role}:")
             lines.append(f"{msg['content']}\n")
         
         return "\n".join(lines)
     
+    def export_conversation_file(
+        self,
+        channel_id: int,
+        user_id: int
+    ) -> Optional[io.BytesIO]:
+        """
+        Экспорт разговора сразу в байтовый буфер UTF-8 (без промежуточной строки)
+        
+        Returns:
+            Буфер с историей разговора, готовый для отправки файлом, или None если история пуста
+        """
+        conversation = self._get(channel_id, user_id)
+        
+        if not conversation or not conversation.messages:
+            return None
+        
+        buffer = io.BytesIO()
+        buffer.write("=== История разговора ===\n\n".encode('utf-8'))
+        
+        for msg_time, msg in conversation.iter_with_timestamps():
+            timestamp = _wall_clock(msg_time).strftime('%Y-%m-%d %H:%M:%S')
+            role = "Пользователь" if msg['role'] == 'user' else "Бот"
+            buffer.write(f"[{timestamp}] {role}:\n{msg['content']}\n\n".encode('utf-8', errors='replace'))
+        
+        buffer.seek(0)
+        return buffer
+    
     def get_stats(self) -> Dict:
         """Получение общей статистики"""
         return {
             **self.stats,
-            'active_conversations': len(self.last_activity),
+            'active_conversations': len(self._activity),
             'channels_with_conversations': len(self.conversations)
         }
 
 
 class RateLimiter:
-    """Ограничитель частоты запросов"""
+    """
+    Ограничитель частоты запросов (скользящее окно со счётчиками)
+    
+    Для каждого пользователя хранятся только счётчики предыдущего и текущего
+    окна длиной period. Нагрузка оценивается как prev * доля_перекрытия + curr.
+    """
     
     def __init__(self, max_requests: int, period: int):
         """
@@ -240,35 +377,54 @@ class RateLimiter:
         """
         self.max_requests = max_requests
         self.period = period
-        self.requests: Dict[int, List[datetime]] = defaultdict(list)
+        # Структура: {user_id: (запросов в прошлом окне, в текущем, начало текущего окна)}
+        self.buckets: Dict[int, Tuple[int, int, float]] = {}
     
-    async def check_rate_limit(self, user_id: int) -> tuple[bool, Optional[int]]:
+    def check_rate_limit(self, user_id: int) -> tuple[bool, Optional[int]]:
         """
         Проверка лимита запросов
         
         Returns:
             (разрешено, секунд до сброса)
         """
-        now = datetime.now()
-        cutoff = now - timedelta(seconds=self.period)
-        
-        # Удаляем старые запросы
-        self.requests[user_id] = [
-            req_time for req_time in self.requests[user_id]
-            if req_time > cutoff
-        ]
+        now = time.monotonic()
+        prev_count, curr_count, window_start = self.buckets.get(user_id, (0, 0, now))
+        
+        # Сдвигаем окна: прошло одно окно - текущее становится прошлым, два и больше - сброс
+        elapsed = now - window_start
+        if elapsed >= 2 * self.period:
+            prev_count, curr_count, window_start = 0, 0, now
+            elapsed = 0.0
+        elif elapsed >= self.period:
+            prev_count, curr_count = curr_count, 0
+            window_start += self.period
+            elapsed -= self.period
+        
+        weight = 1 - elapsed / self.period
+        estimated = prev_count * weight + curr_count
         
         # Проверяем лимит
-        if len(self.requests[user_id]) >= self.max_requests:
-            oldest = self.requests[user_id][0]
-            wait_time = int((oldest + timedelta(seconds=self.period) - now).total_seconds())
-            return False, wait_time
+        if estimated + 1 > self.max_requests:
+            self.buckets[user_id] = (prev_count, curr_count, window_start)
+            return False, self._wait_time(prev_count, curr_count, elapsed)
         
         # Добавляем текущий запрос
-        self.requests[user_id].append(now)
+        self.buckets[user_id] = (prev_count, curr_count + 1, window_start)
         return True, None
     
-    async def reset_user(self, user_id: int):
+    def _wait_time(self, prev_count: int, curr_count: int, elapsed: float) -> int:
+        """Секунд до момента, когда оценка нагрузки позволит ещё один запрос"""
+        allowed = self.max_requests - 1
+        
+        if curr_count <= allowed and prev_count:
+            # Достаточно, чтобы вклад прошлого окна уменьшился до allowed - curr_count
+            wait = self.period * (1 - (allowed - curr_count) / prev_count) - elapsed
+        else:
+            # Ждём следующего окна, где текущий счётчик станет прошлым
+            wait = (self.period - elapsed) + self.period * (1 - allowed / curr_count)
+        
+        return max(0, math.ceil(wait))
+    
+    def reset_user(self, user_id: int):
         """Сброс лимита для пользователя"""
-        if user_id in self.requests:
-            del self.requests[user_id]
+        self.buckets.pop(user_id, None)
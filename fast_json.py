@@ -0,0 +1,63 @@
+"""
+Быстрая сериализация JSON для HTTP запросов
+Использует orjson если установлен, иначе стандартный json
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# Заголовки для запросов с телом, сериализованным через dumps()
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Сериализация объекта в JSON
+    
+    Args:
+        obj: Объект для сериализации
+        
+    Returns:
+        JSON в виде байтов UTF-8
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Разбор JSON
+    
+    Args:
+        data: JSON в виде байтов или строки
+        
+    Returns:
+        Разобранный объект
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+async def read_json(response) -> Any:
+    """
+    Чтение и разбор JSON тела ответа aiohttp
+    
+    В отличие от response.json() не проверяет Content-Type
+    (DuckDuckGo отдаёт JSON как application/x-javascript)
+    
+    Args:
+        response: Ответ aiohttp
+        
+    Returns:
+        Разобранный объект
+    """
+    return loads(await response.read())
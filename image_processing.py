@@ -5,35 +5,404 @@
 
 import aiohttp
 from aiohttp_socks import ProxyConnector
+import asyncio
 import logging
 import base64
+import binascii
 import io
-from typing import Optional, Dict, List
-from PIL import Image
-import json
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Callable, Optional, Dict, List, Tuple, Union
+from urllib.parse import urlsplit
+from PIL import Image, ImageEnhance, ImageFilter
+import fast_json
+
+try:
+    import pyvips
+    PYVIPS_AVAILABLE = True
+except (ImportError, OSError):
+    # OSError: модуль установлен, но нет самой библиотеки libvips
+    PYVIPS_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# Ответы analyze_image_with_llm, которые означают ошибку, а не описание
+NO_LM_CLIENT_MESSAGE = "LLM клиент не настроен для анализа изображений."
+ANALYSIS_FAILED_MESSAGE = "Не удалось проанализировать изображение."
+ANALYSIS_ERROR_MESSAGES = frozenset((NO_LM_CLIENT_MESSAGE, ANALYSIS_FAILED_MESSAGE))
+
+
+# Порог SpooledTemporaryFile: изображения до 1 МБ остаются в памяти, крупнее - на диске
+SPOOL_MAX_SIZE = 1 << 20
+
+
+# CDN Discord: параметры ?ex=&is=&hm= - подпись с истечением, сам файл определяется путём
+DISCORD_CDN_HOSTS = frozenset(('cdn.discordapp.com', 'media.discordapp.net'))
+
+
+def image_cache_key(url: str) -> str:
+    """
+    Ключ кэша для URL изображения
+    
+    У вложений Discord подпись в параметрах меняется со временем, поэтому она
+    отбрасывается. Остальные URL используются как есть - параметры могут
+    определять само изображение.
+    """
+    parts = urlsplit(url)
+    if parts.query and parts.hostname in DISCORD_CDN_HOSTS:
+        return url.split('?', 1)[0]
+    return url
+
+
+def _open_image(image_data: Union[bytes, BinaryIO]) -> Image.Image:
+    """Открытие изображения из байтов или файла (PIL декодирует лениво)"""
+    if isinstance(image_data, (bytes, bytearray)):
+        return Image.open(io.BytesIO(image_data))
+    
+    image_data.seek(0)
+    return Image.open(image_data)
+
+
+def _image_info(image: Image.Image, file_size: int) -> Dict[str, any]:
+    """Информация об уже открытом изображении (читается только заголовок)"""
+    return {
+        'format': image.format,
+        'mode': image.mode,
+        'size': image.size,
+        'width': image.width,
+        'height': image.height,
+        'file_size': file_size,
+        'has_transparency': image.mode in ('RGBA', 'LA', 'P')
+    }
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    """Есть ли у изображения прозрачность (у палитровых - только если задан прозрачный цвет)"""
+    if image.mode in ('RGBA', 'LA', 'PA'):
+        return True
+    return image.mode == 'P' and 'transparency' in image.info
+
+
+# Кусок для base64 кратен 3 - между кусками не появляется выравнивание '='
+_BASE64_CHUNK = 3 * 64 * 1024
+
+
+def _data_url(image_data: bytes, mime_type: str) -> str:
+    """
+    data URL изображения для vision запроса
+    
+    base64 дописывается по кускам в один буфер и декодируется в строку один
+    раз, без промежуточной полноразмерной base64 строки и f-строки поверх неё.
+    """
+    view = memoryview(image_data)
+    buffer = bytearray(f"data:{mime_type};base64,".encode('ascii'))
+    for start in range(0, len(view), _BASE64_CHUNK):
+        buffer += binascii.b2a_base64(view[start:start + _BASE64_CHUNK], newline=False)
+    return buffer.decode('ascii')
+
+
+# Фильтры !filter: {название: функция над PIL изображением}
+FILTERS: Dict[str, Callable[[Image.Image], Image.Image]] = {
+    'grayscale': lambda image: image.convert('L'),
+    'blur': lambda image: image.filter(ImageFilter.BLUR),
+    'sharpen': lambda image: image.filter(ImageFilter.SHARPEN),
+    'edge': lambda image: image.filter(ImageFilter.FIND_EDGES),
+    'emboss': lambda image: image.filter(ImageFilter.EMBOSS),
+    'brightness': lambda image: ImageEnhance.Brightness(image).enhance(1.5),
+    'contrast': lambda image: ImageEnhance.Contrast(image).enhance(1.5),
+}
+
+
+def _resize_with_vips(
+    image_data: Union[bytes, BinaryIO],
+    max_width: int,
+    max_height: int
+) -> Optional[bytes]:
+    """
+    Уменьшение изображения через libvips (SIMD и потоковая обработка)
+    
+    Returns:
+        Байты PNG или None, если уменьшать не нужно или libvips не справился
+        (тогда используется Pillow)
+    """
+    if not isinstance(image_data, (bytes, bytearray)):
+        image_data.seek(0)
+        image_data = image_data.read()
+    
+    try:
+        # Читается только заголовок - пиксели не декодируются
+        header = pyvips.Image.new_from_buffer(image_data, '')
+        if header.width <= max_width and header.height <= max_height:
+            return None
+        
+        image = pyvips.Image.thumbnail_buffer(
+            image_data,
+            max_width,
+            height=max_height,
+            size='down'
+        )
+        # Как и в ветке Pillow, уменьшенное изображение сохраняется в PNG
+        return image.write_to_buffer('.png')
+        
+    except pyvips.Error as e:
+        logger.debug(f"libvips не обработал изображение, используется Pillow: {e}")
+        return None
+
+
+def _resize_image_data(
+    image_data: Union[bytes, BinaryIO],
+    max_width: int = 1024,
+    max_height: int = 1024,
+    quality: int = 85,
+    high_quality: bool = True
+) -> Optional[bytes]:
+    """
+    Изменение размера изображения (функция модуля - можно выполнять в пуле процессов)
+    
+    Args:
+        image_data: Исходное изображение (байты или файл)
+        max_width: Максимальная ширина
+        max_height: Максимальная высота
+        quality: Качество сжатия (для JPEG)
+        high_quality: LANCZOS для показа людям; False - быстрый BILINEAR (для vision модели)
+        
+    Returns:
+        Байты измененного изображения или None
+    """
+    if PYVIPS_AVAILABLE:
+        resized = _resize_with_vips(image_data, max_width, max_height)
+        if resized is not None:
+            return resized
+    
+    try:
+        image = _open_image(image_data)
+        
+        # Вычисляем новый размер с сохранением пропорций
+        ratio = min(max_width / image.width, max_height / image.height)
+        
+        # Уменьшенное изображение сохраняется в PNG, исходное - в своём формате
+        format_to_save = image.format if image.format else 'PNG'
+        
+        if ratio < 1:
+            new_size = (int(image.width * ratio), int(image.height * ratio))
+            # thumbnail сначала грубо уменьшает (reduce / JPEG draft), затем
+            # применяет фильтр уже к небольшому изображению
+            if high_quality:
+                image.thumbnail(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            else:
+                image.thumbnail(new_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+            format_to_save = 'PNG'
+        
+        # Сохраняем в буфер
+        output = io.BytesIO()
+        
+        if format_to_save == 'JPEG':
+            image.save(output, format=format_to_save, quality=quality, optimize=True)
+        else:
+            image.save(output, format=format_to_save, optimize=True)
+        
+        return output.getvalue()
+        
+    except Exception as e:
+        logger.error(f"Ошибка изменения размера: {e}")
+        return None
+
+
+def _apply_filter_data(
+    image_data: Union[bytes, BinaryIO],
+    filter_type: str = 'grayscale'
+) -> Optional[bytes]:
+    """
+    Применение фильтра к изображению (функция модуля - можно выполнять в пуле процессов)
+    
+    Args:
+        image_data: Исходное изображение (байты или файл)
+        filter_type: Тип фильтра (grayscale, blur, sharpen, etc.)
+        
+    Returns:
+        Обработанное изображение
+    """
+    try:
+        apply = FILTERS.get(filter_type)
+        if apply is None:
+            return None
+        
+        image = apply(_open_image(image_data))
+        
+        # Сохраняем результат
+        output = io.BytesIO()
+        image.save(output, format='PNG', optimize=True)
+        
+        return output.getvalue()
+        
+    except Exception as e:
+        logger.error(f"Ошибка применения фильтра: {e}")
+        return None
+
+
+def _create_image_grid_data(
+    images: List[bytes],
+    grid_size: tuple = None,
+    padding: int = 10
+) -> Optional[bytes]:
+    """
+    Создание сетки из нескольких изображений (функция модуля - можно выполнять в пуле процессов)
+    
+    Args:
+        images: Список изображений в байтах
+        grid_size: Размер сетки (ширина, высота), auto если None
+        padding: Отступ между изображениями
+        
+    Returns:
+        Байты объединенного изображения
+    """
+    try:
+        if not images:
+            return None
+        
+        # Открываем все изображения за один проход: сразу приводим к RGB холста
+        # (вставка того же режима - простое копирование) и ищем максимальный размер
+        pil_images = []
+        max_width = max_height = 0
+        for raw in images:
+            img = Image.open(io.BytesIO(raw))
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            pil_images.append(img)
+            max_width = max(max_width, img.width)
+            max_height = max(max_height, img.height)
+        
+        # Определяем размер сетки
+        if grid_size is None:
+            import math
+            count = len(pil_images)
+            cols = math.ceil(math.sqrt(count))
+            rows = math.ceil(count / cols)
+            grid_size = (cols, rows)
+        
+        cols, rows = grid_size
+        
+        # Создаем холст
+        canvas_width = cols * max_width + (cols + 1) * padding
+        canvas_height = rows * max_height + (rows + 1) * padding
+        
+        # Image.new уже заливает холст одним проходом в C. Если изображения
+        # одного размера без отступов закрывают все ячейки, заливка не нужна вовсе
+        covers_canvas = (
+            padding == 0
+            and len(pil_images) == cols * rows
+            and all(img.size == (max_width, max_height) for img in pil_images)
+        )
+        canvas = Image.new(
+            'RGB',
+            (canvas_width, canvas_height),
+            color=None if covers_canvas else 'white'
+        )
+        
+        # Размещаем изображения
+        for i, img in enumerate(pil_images):
+            row = i // cols
+            col = i % cols
+            
+            x = col * (max_width + padding) + padding
+            y = row * (max_height + padding) + padding
+            
+            # Центрируем изображение если оно меньше
+            x_offset = (max_width - img.width) // 2
+            y_offset = (max_height - img.height) // 2
+            
+            canvas.paste(img, (x + x_offset, y + y_offset))
+        
+        # Сохраняем результат
+        output = io.BytesIO()
+        canvas.save(output, format='PNG', optimize=True)
+        
+        return output.getvalue()
+        
+    except Exception as e:
+        logger.error(f"Ошибка создания сетки изображений: {e}")
+        return None
+
 
 class ImageProcessor:
     """Обработчик изображений для Discord бота"""
     
-    def __init__(self, lm_client=None, proxy_url: str = None):
+    def __init__(
+        self,
+        lm_client=None,
+        proxy_url: str = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        cpu_workers: int = 0,
+        thread_workers: int = 4
+    ):
         """
         Инициализация процессора изображений
         
         Args:
             lm_client: Клиент LM Studio (для моделей с поддержкой vision)
             proxy_url: URL прокси для обхода блокировок
+            session: Общая HTTP сессия бота (если None - создаётся своя)
+            cpu_workers: Процессов для фильтров и ресайза (0 = потоки вместо процессов)
+            thread_workers: Потоков для работы PIL внутри процесса бота
         """
+        self._lm_client = None
+        self._vision_endpoint: Optional[str] = None
+        self._model_name = "local-model"
         self.lm_client = lm_client
         self.proxy_url = proxy_url
-        self.session: Optional[aiohttp.ClientSession] = None
+        self.session: Optional[aiohttp.ClientSession] = session
+        # Внешнюю сессию закрывает её владелец (бот)
+        self._owns_session = session is None
         self.max_image_size = 5 * 1024 * 1024  # 5 MB
         
+        # Скачивания, которые выполняются прямо сейчас: {url: задача}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        
+        # LRU кэш недавно скачанных изображений: {url: байты}
+        self._image_cache: OrderedDict = OrderedDict()
+        self._image_cache_bytes = 0
+        self.image_cache_max_entries = 64
+        self.image_cache_max_bytes = 32 * 1024 * 1024  # 32 MB
+        
+        # Пул процессов для фильтров и ресайза: PIL не блокирует event loop и GIL
+        self._cpu_workers = cpu_workers
+        self._cpu_pool: Optional[ProcessPoolExecutor] = (
+            ProcessPoolExecutor(max_workers=cpu_workers) if cpu_workers > 0 else None
+        )
+        
+        # Свои потоки для PIL: работа с изображениями не ждёт в очереди пула
+        # по умолчанию вместе с DNS и другими run_in_executor
+        self._thread_pool = ThreadPoolExecutor(
+            max_workers=thread_workers,
+            thread_name_prefix='image'
+        )
+        
+    @property
+    def lm_client(self):
+        """Клиент LM Studio"""
+        return self._lm_client
+    
+    @lm_client.setter
+    def lm_client(self, lm_client):
+        self._lm_client = lm_client
+        self._refresh_lm_config()
+    
+    def _refresh_lm_config(self):
+        """Кэширование endpoint и имени модели vision запроса (при смене клиента)"""
+        if self._lm_client is None:
+            self._vision_endpoint = None
+            self._model_name = "local-model"
+            return
+        
+        self._vision_endpoint = self._lm_client.base_url.rstrip('/') + '/chat/completions'
+        self._model_name = getattr(self._lm_client, 'model', "local-model")
+    
     async def _get_session(self) -> aiohttp.ClientSession:
         """Получение или создание сессии с прокси"""
         if self.session is None or self.session.closed:
+            self._owns_session = True
             # Создаём сессию с прокси если указан
             if self.proxy_url:
                 try:
@@ -47,21 +416,142 @@ class ImageProcessor:
                 self.session = aiohttp.ClientSession()
         return self.session
     
+    async def _get_lm_session(self) -> aiohttp.ClientSession:
+        """
+        Сессия для запросов к LM Studio
+        
+        Берётся у клиента LM Studio: его прямые keep-alive соединения уже открыты
+        для чата, а общая сессия бота может идти через прокси
+        """
+        get_session = getattr(self._lm_client, 'get_session', None)
+        if get_session is not None:
+            return await get_session()
+        return await self._get_session()
+    
     async def close(self):
-        """Закрытие сессии"""
-        if self.session and not self.session.closed:
+        """Закрытие сессии и пулов обработки"""
+        if self._owns_session and self.session and not self.session.closed:
             await self.session.close()
+        
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self._cpu_pool = None
+        
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
     
     async def download_image(self, url: str) -> Optional[bytes]:
         """
         Скачивание изображения по URL
         
+        Повторные запросы того же URL берутся из кэша, а одновременные
+        запросы ждут одно общее скачивание
+        
         Args:
             url: URL изображения
             
         Returns:
             Байты изображения или None
         """
+        key = image_cache_key(url)
+        cached = self._cached_image(key)
+        if cached is not None:
+            return cached
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._download_image(url))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        
+        # shield: отмена одного ожидающего не отменяет скачивание для остальных
+        image_data = await asyncio.shield(task)
+        
+        if image_data is not None and key not in self._image_cache:
+            self._cache_image(key, image_data)
+        
+        return image_data
+    
+    def _cached_image(self, key: str) -> Optional[bytes]:
+        """Изображение из LRU кэша (None если его там нет)"""
+        cached = self._image_cache.get(key)
+        if cached is not None:
+            self._image_cache.move_to_end(key)
+        return cached
+    
+    def _cache_image(self, key: str, image_data: bytes):
+        """Добавление изображения в LRU кэш с вытеснением самых старых"""
+        if len(image_data) > self.image_cache_max_bytes:
+            return
+        
+        previous = self._image_cache.pop(key, None)
+        if previous is not None:
+            self._image_cache_bytes -= len(previous)
+        
+        self._image_cache[key] = image_data
+        self._image_cache_bytes += len(image_data)
+        
+        while (
+            len(self._image_cache) > self.image_cache_max_entries
+            or self._image_cache_bytes > self.image_cache_max_bytes
+        ):
+            _, evicted = self._image_cache.popitem(last=False)
+            self._image_cache_bytes -= len(evicted)
+    
+    async def _download_image(self, url: str) -> Optional[bytes]:
+        """Скачивание изображения по URL без кэширования"""
+        buffer = bytearray()
+        
+        if not await self._fetch_into(url, buffer.extend):
+            return None
+        
+        return bytes(buffer)
+    
+    async def download_image_stream(self, url: str) -> Optional[BinaryIO]:
+        """
+        Скачивание изображения во временный файл без буферизации всех байтов в памяти
+        
+        Небольшие изображения остаются в памяти, крупные сбрасываются на диск.
+        Вызывающий код должен закрыть файл.
+        
+        Args:
+            url: URL изображения
+            
+        Returns:
+            Файл, перемотанный в начало, или None
+        """
+        key = image_cache_key(url)
+        
+        # Изображение уже скачано другой командой (например, !imageinfo, затем !analyze)
+        cached = self._cached_image(key)
+        if cached is not None:
+            return io.BytesIO(cached)
+        
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        
+        if not await self._fetch_into(url, spooled.write):
+            spooled.close()
+            return None
+        
+        # Кэшируем для следующих команд над тем же вложением только то, что и так
+        # в памяти: крупные файлы остаются на диске, иначе спулинг не ограничивал бы память
+        if spooled.tell() <= SPOOL_MAX_SIZE:
+            spooled.seek(0)
+            self._cache_image(key, spooled.read())
+        
+        spooled.seek(0)
+        return spooled
+    
+    async def _fetch_into(self, url: str, write: Callable[[bytes], object]) -> bool:
+        """
+        Потоковое скачивание изображения с проверкой размера
+        
+        Args:
+            url: URL изображения
+            write: Функция, принимающая очередной фрагмент данных
+            
+        Returns:
+            True если изображение скачано полностью
+        """
         try:
             session = await self._get_session()
             
@@ -71,65 +561,95 @@ class ImageProcessor:
             ) as response:
                 if response.status != 200:
                     logger.error(f"Ошибка скачивания изображения: {response.status}")
-                    return None
+                    return False
                 
                 # Проверка размера
                 content_length = response.headers.get('Content-Length')
                 if content_length and int(content_length) > self.max_image_size:
                     logger.error(f"Изображение слишком большое: {content_length} bytes")
-                    return None
-                
-                image_data = await response.read()
+                    return False
                 
-                if len(image_data) > self.max_image_size:
-                    logger.error(f"Изображение слишком большое: {len(image_data)} bytes")
-                    return None
+                # Читаем по частям, прерываясь как только превышен лимит
+                received = 0
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    received += len(chunk)
+                    if received > self.max_image_size:
+                        logger.error(f"Изображение слишком большое: более {self.max_image_size} bytes")
+                        return False
+                    write(chunk)
                 
-                return image_data
+                return True
                 
         except Exception as e:
             logger.error(f"Ошибка скачивания изображения: {e}", exc_info=True)
-            return None
+            return False
+    
+    @staticmethod
+    def _data_size(image_data: Union[bytes, BinaryIO]) -> int:
+        """Размер изображения в байтах"""
+        if isinstance(image_data, (bytes, bytearray)):
+            return len(image_data)
+        
+        position = image_data.tell()
+        size = image_data.seek(0, io.SEEK_END)
+        image_data.seek(position)
+        return size
     
-    def get_image_info(self, image_data: bytes) -> Dict[str, any]:
+    def get_image_info(self, image_data: Union[bytes, BinaryIO]) -> Dict[str, any]:
         """
         Получение информации об изображении
         
         Args:
-            image_data: Байты изображения
+            image_data: Байты или файл изображения
             
         Returns:
             Словарь с информацией об изображении
         """
         try:
-            image = Image.open(io.BytesIO(image_data))
-            
-            return {
-                'format': image.format,
-                'mode': image.mode,
-                'size': image.size,
-                'width': image.width,
-                'height': image.height,
-                'file_size': len(image_data),
-                'has_transparency': image.mode in ('RGBA', 'LA', 'P')
-            }
+            file_size = self._data_size(image_data)
+            return _image_info(_open_image(image_data), file_size)
             
         except Exception as e:
             logger.error(f"Ошибка анализа изображения: {e}")
             return {}
     
+    async def get_image_info_async(self, image_data: Union[bytes, BinaryIO]) -> Dict[str, any]:
+        """
+        Получение информации об изображении вне event loop
+        
+        Крупный файл может лежать на диске - чтение заголовка не блокирует бота
+        
+        Args:
+            image_data: Байты или файл изображения
+            
+        Returns:
+            Словарь с информацией об изображении
+        """
+        return await self._run_thread(self.get_image_info, image_data)
+    
     def resize_image(
         self,
-        image_data: bytes,
+        image_data: Union[bytes, BinaryIO],
+        max_width: int = 1024,
+        max_height: int = 1024,
+        quality: int = 85,
+        high_quality: bool = True
+    ) -> Optional[bytes]:
+        """Изменение размера изображения (синхронно, см. _resize_image_data)"""
+        return _resize_image_data(image_data, max_width, max_height, quality, high_quality)
+    
+    async def resize_image_async(
+        self,
+        image_data: Union[bytes, BinaryIO],
         max_width: int = 1024,
         max_height: int = 1024,
         quality: int = 85
     ) -> Optional[bytes]:
         """
-        Изменение размера изображения
+        Изменение размера изображения вне event loop
         
         Args:
-            image_data: Исходное изображение
+            image_data: Исходное изображение (байты или файл)
             max_width: Максимальная ширина
             max_height: Максимальная высота
             quality: Качество сжатия (для JPEG)
@@ -137,31 +657,13 @@ class ImageProcessor:
         Returns:
             Байты измененного изображения или None
         """
-        try:
-            image = Image.open(io.BytesIO(image_data))
-            
-            # Вычисляем новый размер с сохранением пропорций
-            ratio = min(max_width / image.width, max_height / image.height)
-            
-            if ratio < 1:
-                new_size = (int(image.width * ratio), int(image.height * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-            
-            # Сохраняем в буфер
-            output = io.BytesIO()
-            
-            # Определяем формат для сохранения
-            format_to_save = image.format if image.format else 'PNG'
-            if format_to_save == 'JPEG':
-                image.save(output, format=format_to_save, quality=quality, optimize=True)
-            else:
-                image.save(output, format=format_to_save, optimize=True)
-            
-            return output.getvalue()
-            
-        except Exception as e:
-            logger.error(f"Ошибка изменения размера: {e}")
-            return None
+        return await self._run_cpu(
+            _resize_image_data,
+            self._for_worker(image_data),
+            max_width,
+            max_height,
+            quality
+        )
     
     def encode_image_base64(self, image_data: bytes) -> str:
         """
@@ -193,43 +695,85 @@ class ImageProcessor:
             Описание изображения
         """
         if not self.lm_client:
-            return "LLM клиент не настроен для анализа изображений."
+            return NO_LM_CLIENT_MESSAGE
         
         try:
-            # Изменяем размер для экономии токенов
-            if resize:
-                processed_image = self.resize_image(image_data, max_width=512, max_height=512)
-                if processed_image:
-                    image_data = processed_image
-            
-            # Кодируем в base64
-            image_base64 = self.encode_image_base64(image_data)
+            # Декодирование, ресайз и base64 - CPU-нагрузка, выполняем вне event loop
+            info, image_url = await self._run_thread(
+                self._prepare_vision_image,
+                image_data,
+                resize
+            )
             
             # Пробуем разные методы анализа
             try:
                 # Способ 1: Пробуем vision API (LLaVA, BakLLaVA и другие vision модели)
-                response = await self._analyze_with_vision_api(image_base64, prompt)
+                response = await self._analyze_with_vision_api(image_url, prompt)
                 return response
             except Exception as vision_error:
                 logger.warning(f"Vision API недоступен: {vision_error}")
                 
                 try:
                     # Способ 2: Пробуем как обычный текстовый запрос с описанием
-                    response = await self._analyze_with_text_description(image_data, prompt)
+                    response = await self._analyze_with_text_description(info, prompt)
                     return response
                 except Exception as text_error:
                     logger.warning(f"Текстовый анализ недоступен: {text_error}")
                     
                     # Способ 3: Базовая информация об изображении
-                    return await self._analyze_without_vision(image_data, prompt)
+                    return await self._analyze_without_vision(info, prompt)
                 
         except Exception as e:
             logger.error(f"Ошибка анализа изображения: {e}", exc_info=True)
-            return "Не удалось проанализировать изображение."
+            return ANALYSIS_FAILED_MESSAGE
+    
+    def _prepare_vision_image(
+        self,
+        image_data: bytes,
+        resize: bool = True
+    ) -> Tuple[Dict[str, any], str]:
+        """
+        Подготовка изображения для vision запроса (синхронно, для запуска в потоке)
+        
+        Изображение открывается один раз: из него же берётся информация для
+        запасных способов анализа и делается уменьшенная копия. Модели
+        отправляется JPEG - скриншот в PNG в несколько раз тяжелее, а base64
+        увеличивает его ещё на треть. PNG остаётся только для прозрачных изображений.
+        
+        Args:
+            image_data: Байты изображения
+            resize: Изменить размер перед отправкой
+            
+        Returns:
+            (информация об исходном изображении, data URL изображения)
+        """
+        image = _open_image(image_data)
+        info = _image_info(image, len(image_data))
+        
+        resized = resize and (image.width > 512 or image.height > 512)
+        if resized:
+            # Модель не отличит LANCZOS от BILINEAR на 512px - берём быстрый фильтр
+            image.thumbnail((512, 512), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        
+        if _has_alpha(image):
+            mime_type = 'image/png'
+            output = io.BytesIO()
+            image.save(output, format='PNG', optimize=True)
+            image_data = output.getvalue()
+        elif resized or image.format != 'JPEG':
+            # Исходный JPEG без ресайза отправляется как есть
+            mime_type = 'image/jpeg'
+            output = io.BytesIO()
+            image.convert('RGB').save(output, format='JPEG', quality=85, optimize=True)
+            image_data = output.getvalue()
+        else:
+            mime_type = 'image/jpeg'
+        
+        return info, _data_url(image_data, mime_type)
     
     async def _analyze_with_vision_api(
         self,
-        image_base64: str,
+        image_url: str,
         prompt: str
     ) -> str:
         """
@@ -237,16 +781,11 @@ class ImageProcessor:
         
         Работает с моделями типа: LLaVA, BakLLaVA, и другими multimodal моделями
         """
-        session = await self._get_session()
-        
-        # Получаем название модели из клиента или используем дефолтное
-        model_name = "local-model"
-        if hasattr(self.lm_client, 'model'):
-            model_name = self.lm_client.model
+        session = await self._get_lm_session()
         
         # Формат для OpenAI-compatible API с vision
         payload = {
-            "model": model_name,  # Используем актуальное имя модели
+            "model": self._model_name,  # Имя модели из клиента или дефолтное
             "messages": [
                 {
                     "role": "user",
@@ -255,7 +794,7 @@ class ImageProcessor:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
+                                "url": image_url
                             }
                         }
                     ]
@@ -265,21 +804,19 @@ class ImageProcessor:
             "temperature": 0.7
         }
         
-        # Используем LM Studio endpoint
-        endpoint = self.lm_client.base_url.rstrip('/') + '/chat/completions'
-        
-        logger.info(f"Отправка запроса vision к {endpoint} с моделью {model_name}")
+        logger.info(f"Отправка запроса vision к {self._vision_endpoint} с моделью {self._model_name}")
         
         async with session.post(
-            endpoint,
-            json=payload,
+            self._vision_endpoint,
+            data=fast_json.dumps(payload),
+            headers=fast_json.JSON_HEADERS,
             timeout=aiohttp.ClientTimeout(total=60)
         ) as response:
             if response.status != 200:
                 error_text = await response.text()
                 raise Exception(f"Vision API error {response.status}: {error_text}")
             
-            data = await response.json()
+            data = await fast_json.read_json(response)
             
             if 'choices' in data and len(data['choices']) > 0:
                 content = data['choices'][0]['message']['content']
@@ -290,14 +827,12 @@ class ImageProcessor:
     
     async def _analyze_with_text_description(
         self,
-        image_data: bytes,
+        info: Dict[str, any],
         prompt: str
     ) -> str:
         """
         Альтернативный метод: генерация текста с описанием характеристик изображения
         """
-        info = self.get_image_info(image_data)
-        
         # Формируем детальное описание изображения
         description = f"""Изображение со следующими характеристиками:
 - Формат: {info.get('format', 'Неизвестно')}
@@ -336,15 +871,13 @@ class ImageProcessor:
     
     async def _analyze_without_vision(
         self,
-        image_data: bytes,
+        info: Dict[str, any],
         prompt: str
     ) -> str:
         """
         Базовый анализ изображения без vision модели
         Возвращает только техническую информацию
         """
-        info = self.get_image_info(image_data)
-        
         analysis = f"""📊 Техническая информация об изображении:
 
 • Формат: {info.get('format', 'Неизвестно')}
@@ -380,9 +913,18 @@ class ImageProcessor:
         images: List[bytes],
         grid_size: tuple = None,
         padding: int = 10
+    ) -> Optional[bytes]:
+        """Создание сетки из нескольких изображений (синхронно, см. _create_image_grid_data)"""
+        return _create_image_grid_data(images, grid_size, padding)
+    
+    async def create_image_grid_async(
+        self,
+        images: List[bytes],
+        grid_size: tuple = None,
+        padding: int = 10
     ) -> Optional[bytes]:
         """
-        Создание сетки из нескольких изображений
+        Создание сетки из нескольких изображений вне event loop
         
         Args:
             images: Список изображений в байтах
@@ -392,102 +934,67 @@ class ImageProcessor:
         Returns:
             Байты объединенного изображения
         """
-        try:
-            if not images:
-                return None
-            
-            # Открываем все изображения
-            pil_images = [Image.open(io.BytesIO(img)) for img in images]
-            
-            # Определяем размер сетки
-            if grid_size is None:
-                import math
-                count = len(pil_images)
-                cols = math.ceil(math.sqrt(count))
-                rows = math.ceil(count / cols)
-                grid_size = (cols, rows)
-            
-            cols, rows = grid_size
-            
-            # Находим максимальный размер для стандартизации
-            max_width = max(img.width for img in pil_images)
-            max_height = max(img.height for img in pil_images)
-            
-            # Создаем холст
-            canvas_width = cols * max_width + (cols + 1) * padding
-            canvas_height = rows * max_height + (rows + 1) * padding
-            
-            canvas = Image.new('RGB', (canvas_width, canvas_height), color='white')
-            
-            # Размещаем изображения
-            for i, img in enumerate(pil_images):
-                row = i // cols
-                col = i % cols
-                
-                x = col * (max_width + padding) + padding
-                y = row * (max_height + padding) + padding
-                
-                # Центрируем изображение если оно меньше
-                x_offset = (max_width - img.width) // 2
-                y_offset = (max_height - img.height) // 2
-                
-                canvas.paste(img, (x + x_offset, y + y_offset))
-            
-            # Сохраняем результат
-            output = io.BytesIO()
-            canvas.save(output, format='PNG', optimize=True)
-            
-            return output.getvalue()
-            
-        except Exception as e:
-            logger.error(f"Ошибка создания сетки изображений: {e}")
-            return None
+        return await self._run_cpu(_create_image_grid_data, images, grid_size, padding)
     
     def apply_filter(
         self,
-        image_data: bytes,
+        image_data: Union[bytes, BinaryIO],
+        filter_type: str = 'grayscale'
+    ) -> Optional[bytes]:
+        """Применение фильтра к изображению (синхронно, см. _apply_filter_data)"""
+        return _apply_filter_data(image_data, filter_type)
+    
+    async def apply_filter_async(
+        self,
+        image_data: Union[bytes, BinaryIO],
         filter_type: str = 'grayscale'
     ) -> Optional[bytes]:
         """
-        Применение фильтра к изображению
+        Применение фильтра к изображению вне event loop
         
         Args:
-            image_data: Исходное изображение
+            image_data: Исходное изображение (байты или файл)
             filter_type: Тип фильтра (grayscale, blur, sharpen, etc.)
             
         Returns:
             Обработанное изображение
         """
+        return await self._run_cpu(
+            _apply_filter_data,
+            self._for_worker(image_data),
+            filter_type
+        )
+    
+    def _for_worker(self, image_data: Union[bytes, BinaryIO]) -> Union[bytes, BinaryIO]:
+        """Подготовка данных для исполнителя: в другой процесс передаются только байты"""
+        if self._cpu_pool is None or isinstance(image_data, (bytes, bytearray)):
+            return image_data
+        
+        image_data.seek(0)
+        return image_data.read()
+    
+    async def _run_thread(self, func: Callable, *args):
+        """Запуск работы PIL в потоках обработчика (для функций, которым нужен self)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._thread_pool, func, *args)
+    
+    async def _run_cpu(self, func: Callable, *args) -> Optional[bytes]:
+        """
+        Запуск CPU-нагруженной обработки PIL
+        
+        В пуле процессов, если он включён, иначе в потоках обработчика
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._cpu_pool
         try:
-            from PIL import ImageFilter, ImageEnhance
-            
-            image = Image.open(io.BytesIO(image_data))
-            
-            if filter_type == 'grayscale':
-                image = image.convert('L')
-            elif filter_type == 'blur':
-                image = image.filter(ImageFilter.BLUR)
-            elif filter_type == 'sharpen':
-                image = image.filter(ImageFilter.SHARPEN)
-            elif filter_type == 'edge':
-                image = image.filter(ImageFilter.FIND_EDGES)
-            elif filter_type == 'emboss':
-                image = image.filter(ImageFilter.EMBOSS)
-            elif filter_type == 'brightness':
-                enhancer = ImageEnhance.Brightness(image)
-                image = enhancer.enhance(1.5)
-            elif filter_type == 'contrast':
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(1.5)
-            else:
-                return None
-            
-            # Сохраняем результат
-            output = io.BytesIO()
-            image.save(output, format='PNG', optimize=True)
-            
-            return output.getvalue()
-            
-        except Exception as e:
-            logger.error(f"Ошибка применения фильтра: {e}")
+            return await loop.run_in_executor(pool or self._thread_pool, func, *args)
+        except BrokenProcessPool as e:
+            logger.error(f"Пул обработки изображений остановлен: {e}")
+            # Сломанный пул отклоняет все задачи - пересоздаём его (один раз, даже если
+            # сбой получили несколько задач сразу). Упавшую задачу не повторяем:
+            # скорее всего, процесс завершило именно это изображение
+            if pool is not None and pool is self._cpu_pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._cpu_pool = ProcessPoolExecutor(max_workers=self._cpu_workers)
+                logger.info("Пул обработки изображений пересоздан")
             return None
@@ -3,12 +3,40 @@
 """
 
 import aiohttp
+import asyncio
+import functools
+import hashlib
 import logging
-from typing import List, Dict, Optional
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from config import Config
+import fast_json
 
 logger = logging.getLogger(__name__)
 
+# Заголовки потокового запроса chat/completions (ответ - Server-Sent Events)
+_SSE_HEADERS = {**fast_json.JSON_HEADERS, 'Accept': 'text/event-stream'}
+
+# Шаблоны промпта с контекстом по типу вопроса (generate_with_context)
+_CONTEXTUAL_PROMPTS = {
+    "code": "Контекст: {context}\n\nВопрос по коду: {message}",
+    "creative": "Творческий контекст: {context}\n\nЗадание: {message}",
+    "analysis": "Данные для анализа: {context}\n\nВопрос: {message}",
+    "general": "Дополнительная информация: {context}\n\n{message}"
+}
+
+
+@functools.lru_cache(maxsize=8)
+def _system_message(system_prompt: str) -> Dict[str, str]:
+    """
+    Системное сообщение для промпта (один объект на промпт, не изменяется)
+    
+    Системный промпт всегда идёт первым и побайтно одинаков между запросами,
+    поэтому LM Studio переиспользует KV-кэш этого префикса.
+    """
+    return {"role": "system", "content": system_prompt}
+
 
 class LMStudioClient:
     """Клиент для работы с LM Studio через OpenAI-совместимое API"""
@@ -18,20 +46,82 @@ class LMStudioClient:
         self.chat_endpoint = f"{self.base_url}/chat/completions"
         self.models_endpoint = f"{self.base_url}/models"
         self.session: Optional[aiohttp.ClientSession] = None
+        
+        # Общий таймаут запросов: генерация может идти долго, но недоступный
+        # LM Studio должен обнаруживаться за секунды, а не по общему таймауту
+        self.timeout = aiohttp.ClientTimeout(total=120, connect=5)
+        
+        # Кэш только-для-чтения эндпоинтов: (время получения, значение)
+        self._models_cache: Tuple[float, Optional[List[str]]] = (0.0, None)
+        self._connection_cache: Tuple[float, Optional[bool]] = (0.0, None)
+        # Проверка подключения, которая выполняется прямо сейчас (общая для всех ожидающих)
+        self._connection_check: Optional[asyncio.Task] = None
+        self._models_set: frozenset = frozenset()
+        self.models_cache_ttl = 20.0
+        self.connection_cache_ttl = 10.0
+        
+        # Точный кэш детерминированных ответов (температура 0): {ключ запроса: ответ}
+        self._response_cache: OrderedDict[bytes, str] = OrderedDict()
+        self.response_cache_max_entries = 512
+        
+        # Запросы, которые выполняются прямо сейчас: {ключ запроса: задача}
+        self._inflight: Dict[bytes, asyncio.Task] = {}
+        
+        # Одна локальная GPU: лишние одновременные генерации только делят её между
+        # собой, поэтому остальные ждут здесь, а не в очереди LM Studio
+        self._generation_slots = asyncio.Semaphore(max(1, Config.LLM_CONCURRENCY))
     
     async def _get_session(self) -> aiohttp.ClientSession:
         """Получение или создание сессии"""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            # LM Studio работает локально - всегда прямое подключение без прокси
+            # Все запросы идут на один хост, поэтому ограничиваем и общий пул, и пул на хост
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=20,
+                ttl_dns_cache=300,
+                keepalive_timeout=75
+            )
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
         return self.session
     
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Сессия с пулом keep-alive соединений к LM Studio
+        
+        Для других компонентов, которые сами отправляют запросы в LM Studio
+        (vision запросы ImageProcessor)
+        """
+        return await self._get_session()
+    
     async def close(self):
         """Закрытие сессии"""
         if self.session and not self.session.closed:
             await self.session.close()
     
+    def invalidate_cache(self):
+        """Сброс кэша списка моделей и статуса подключения"""
+        self._models_cache = (0.0, None)
+        self._connection_cache = (0.0, None)
+        self._models_set = frozenset()
+    
     async def check_connection(self) -> bool:
-        """Проверка подключения к LM Studio"""
+        """Проверка подключения к LM Studio (с кэшированием на короткое время)"""
+        now = time.monotonic()
+        checked_at, connected = self._connection_cache
+        if connected is not None and now - checked_at < self.connection_cache_ttl:
+            return connected
+        
+        # Кэш истёк: одновременные вызовы ждут один запрос, а не шлют каждый свой
+        if self._connection_check is None or self._connection_check.done():
+            self._connection_check = asyncio.create_task(self._check_connection())
+        
+        connected = await asyncio.shield(self._connection_check)
+        self._connection_cache = (now, connected)
+        return connected
+    
+    async def _check_connection(self) -> bool:
+        """Запрос к LM Studio для проверки подключения"""
         try:
             session = await self._get_session()
             async with session.get(
@@ -44,18 +134,88 @@ class LMStudioClient:
             return False
     
     async def get_available_models(self) -> List[str]:
-        """Получение списка доступных моделей"""
+        """Получение списка доступных моделей (с кэшированием на короткое время)"""
+        now = time.monotonic()
+        fetched_at, models = self._models_cache
+        if models and now - fetched_at < self.models_cache_ttl:
+            return models
+        
+        models = await self._fetch_models()
+        self._models_cache = (now, models)
+        self._models_set = frozenset(models)
+        return models
+    
+    async def get_available_models_set(self) -> frozenset:
+        """Множество доступных моделей для быстрой проверки наличия"""
+        await self.get_available_models()
+        return self._models_set
+    
+    async def _fetch_models(self) -> List[str]:
+        """Запрос списка доступных моделей у LM Studio"""
         try:
             session = await self._get_session()
             async with session.get(self.models_endpoint) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await fast_json.read_json(response)
                     return [model['id'] for model in data.get('data', [])]
                 return []
         except Exception as e:
             logger.error(f"Ошибка получения списка моделей: {e}")
             return []
     
+    def _build_payload(
+        self,
+        user_message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        system_prompt: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        top_p: Optional[float],
+        stream: bool
+    ) -> dict:
+        """Формирование тела запроса к chat/completions"""
+        # Формируем сообщения, начиная с системного промпта
+        messages = [_system_message(system_prompt)] if system_prompt else []
+        
+        # Добавляем историю
+        if conversation_history:
+            messages.extend(conversation_history)
+        
+        # Добавляем текущее сообщение
+        messages.append({
+            "role": "user",
+            "content": user_message
+        })
+        
+        # Параметры запроса
+        payload = {
+            "model": Config.LM_STUDIO_MODEL,
+            "messages": messages,
+            "temperature": temperature or Config.TEMPERATURE,
+            "max_tokens": max_tokens or Config.MAX_TOKENS,
+            "top_p": top_p or Config.TOP_P,
+            "stream": stream
+        }
+        
+        return payload
+    
+    @staticmethod
+    def _payload_key(payload: dict) -> bytes:
+        """Ключ запроса: всё, от чего зависит ответ модели (кроме способа доставки)"""
+        return hashlib.blake2b(fast_json.dumps([
+            payload['model'],
+            payload['temperature'],
+            payload['top_p'],
+            payload['max_tokens'],
+            payload['messages']
+        ]), digest_size=16).digest()
+    
+    def _cache_response(self, key: bytes, response: str):
+        """Сохранение ответа в точный кэш с вытеснением самых старых"""
+        self._response_cache[key] = response
+        if len(self._response_cache) > self.response_cache_max_entries:
+            self._response_cache.popitem(last=False)
+    
     async def generate_response(
         self,
         user_message: str,
@@ -82,63 +242,143 @@ class LMStudioClient:
             Сгенерированный ответ
         """
         try:
-            # Формируем сообщения
-            messages = []
+            payload = self._build_payload(
+                user_message,
+                conversation_history,
+                system_prompt,
+                temperature,
+                max_tokens,
+                top_p,
+                stream
+            )
             
-            # Добавляем системный промпт
-            if system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
+            key = self._payload_key(payload)
             
-            # Добавляем историю
-            if conversation_history:
-                messages.extend(conversation_history)
+            # При температуре 0 одинаковый запрос даёт одинаковый ответ
+            deterministic = payload['temperature'] == 0
+            if deterministic:
+                cached = self._response_cache.get(key)
+                if cached is not None:
+                    self._response_cache.move_to_end(key)
+                    return cached
             
-            # Добавляем текущее сообщение
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
+            # Одинаковые одновременные запросы ждут одну общую генерацию
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.create_task(self._generate(payload, stream))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
             
-            # Параметры запроса
-            payload = {
-                "model": Config.LM_STUDIO_MODEL,
-                "messages": messages,
-                "temperature": temperature or Config.TEMPERATURE,
-                "max_tokens": max_tokens or Config.MAX_TOKENS,
-                "top_p": top_p or Config.TOP_P,
-                "stream": stream
-            }
+            # shield: отмена одного ожидающего не отменяет генерацию для остальных
+            response = await asyncio.shield(task)
             
-            session = await self._get_session()
+            if deterministic:
+                self._cache_response(key, response)
             
-            if stream:
-                return await self._generate_stream(session, payload)
-            else:
-                return await self._generate_sync(session, payload)
+            return response
                 
         except Exception as e:
-            logger.error(f"Ошибка генерации ответа: {e}", exc_info=True)
+            # Исключение пробрасывается дальше - полную трассировку пишет вызывающий код
+            logger.warning(f"Ошибка генерации ответа: {e}")
+            logger.debug("Трассировка ошибки генерации", exc_info=True)
             raise
     
+    async def _generate(self, payload: dict, stream: bool) -> str:
+        """Отправка запроса генерации без кэша и объединения запросов"""
+        session = await self._get_session()
+        
+        if stream:
+            return await self._generate_stream(session, payload)
+        return await self._generate_sync(session, payload)
+    
+    async def generate_response_stream(
+        self,
+        user_message: str,
+        conversation_history: List[Dict[str, str]] = None,
+        system_prompt: str = None,
+        temperature: float = None,
+        max_tokens: int = None,
+        top_p: float = None
+    ) -> AsyncIterator[str]:
+        """
+        Потоковая генерация ответа через LM Studio (Server-Sent Events)
+        
+        Args:
+            user_message: Сообщение пользователя
+            conversation_history: История разговора
+            system_prompt: Системный промпт
+            temperature: Температура генерации
+            max_tokens: Максимум токенов
+            top_p: Top-p sampling
+            
+        Yields:
+            Фрагменты ответа по мере генерации
+        """
+        payload = self._build_payload(
+            user_message,
+            conversation_history,
+            system_prompt,
+            temperature,
+            max_tokens,
+            top_p,
+            True
+        )
+        
+        session = await self._get_session()
+        
+        async for delta in self._iter_stream(session, payload):
+            yield delta
+    
+    async def _iter_stream(
+        self,
+        session: aiohttp.ClientSession,
+        payload: dict
+    ) -> AsyncIterator[str]:
+        """Отправка запроса со stream=True и разбор фрагментов ответа из SSE"""
+        async with self._generation_slots, session.post(
+            self.chat_endpoint,
+            data=fast_json.dumps(payload),
+            headers=_SSE_HEADERS
+        ) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"Ошибка API: {response.status} - {error_text}")
+            
+            # Каждое событие - строка вида "data: {...}", поток завершается "data: [DONE]"
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                
+                chunk = fast_json.loads(data)
+                choices = chunk.get('choices')
+                if not choices:
+                    continue
+                
+                delta = choices[0].get('delta', {}).get('content')
+                if delta:
+                    yield delta
+    
     async def _generate_sync(
         self,
         session: aiohttp.ClientSession,
         payload: dict
     ) -> str:
         """Синхронная генерация"""
-        async with session.post(
+        async with self._generation_slots, session.post(
             self.chat_endpoint,
-            json=payload,
-            timeout=aiohttp.ClientTimeout(total=120)
+            data=fast_json.dumps(payload),
+            headers=fast_json.JSON_HEADERS
         ) as response:
             if response.status != 200:
                 error_text = await response.text()
                 raise Exception(f"Ошибка API: {response.status} - {error_text}")
             
-            data = await response.json()
+            data = await fast_json.read_json(response)
             
             # Извлекаем ответ
             if 'choices' in data and len(data['choices']) > 0:
@@ -151,10 +391,13 @@ class LMStudioClient:
         session: aiohttp.ClientSession,
         payload: dict
     ) -> str:
-        """Потоковая генерация (для будущей реализации)"""
-        # TODO: Реализовать потоковую генерацию
-        payload['stream'] = False
-        return await self._generate_sync(session, payload)
+        """
+        Генерация через SSE поток с накоплением ответа
+        
+        Для показа ответа по мере генерации используйте generate_response_stream
+        """
+        parts = [delta async for delta in self._iter_stream(session, payload)]
+        return ''.join(parts)
     
     async def generate_with_context(
         self,
@@ -188,14 +431,8 @@ class LMStudioClient:
         question_type: str
     ) -> str:
         """Построение промпта с контекстом"""
-        prompts = {
-            "code": f"Контекст: {context}\n\nВопрос по коду: {message}",
-            "creative": f"Творческий контекст: {context}\n\nЗадание: {message}",
-            "analysis": f"Данные для анализа: {context}\n\nВопрос: {message}",
-            "general": f"Дополнительная информация: {context}\n\n{message}"
-        }
-        
-        return prompts.get(question_type, prompts["general"])
+        template = _CONTEXTUAL_PROMPTS.get(question_type, _CONTEXTUAL_PROMPTS["general"])
+        return template.format(context=context, message=message)
     
     async def generate_embedding(self, text: str) -> List[float]:
         """
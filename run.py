@@ -6,33 +6,29 @@
 import os
 import sys
 import asyncio
+import importlib.util
 import logging
 
 # Добавляем текущую директорию в путь
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import Config
-from bot import main
+
+# Обязательные зависимости: {модуль: пакет pip}
+REQUIRED_PACKAGES = {
+    'discord': 'discord.py',
+    'aiohttp': 'aiohttp',
+    'dotenv': 'python-dotenv',
+}
 
 
 def check_requirements():
     """Проверка установленных зависимостей"""
-    missing = []
-    
-    try:
-        import discord
-    except ImportError:
-        missing.append('discord.py')
-    
-    try:
-        import aiohttp
-    except ImportError:
-        missing.append('aiohttp')
-    
-    try:
-        from dotenv import load_dotenv
-    except ImportError:
-        missing.append('python-dotenv')
+    # find_spec только ищет модуль, не выполняя его (импорт discord.py долгий)
+    missing = [
+        package for module, package in REQUIRED_PACKAGES.items()
+        if importlib.util.find_spec(module) is None
+    ]
     
     if missing:
         print("❌ Отсутствуют зависимости:")
@@ -74,12 +70,16 @@ def check_config():
 
 def check_lm_studio():
     """Предупреждение о LM Studio"""
-    print("\n⚠️  Убедитесь что LM Studio запущен:")
-    print("   1. Откройте LM Studio")
-    print("   2. Перейдите на вкладку 'Local Server'")
-    print("   3. Нажмите 'Start Server'")
-    print(f"   4. Проверьте что сервер работает на {Config.LM_STUDIO_URL}")
-    print()
+    # Блок выводится одной записью в stdout, а не построчно
+    sys.stdout.write(
+        "\n⚠️  Убедитесь что LM Studio запущен:\n"
+        "   1. Откройте LM Studio\n"
+        "   2. Перейдите на вкладку 'Local Server'\n"
+        "   3. Нажмите 'Start Server'\n"
+        f"   4. Проверьте что сервер работает на {Config.LM_STUDIO_URL}\n"
+        "\n"
+    )
+    sys.stdout.flush()
 
 
 def print_banner():
@@ -98,14 +98,18 @@ def print_banner():
 
 def print_info():
     """Вывод информации о боте"""
-    print("📋 Конфигурация:")
-    print(f"   Префикс команд: {Config.PREFIX}")
-    print(f"   LM Studio URL: {Config.LM_STUDIO_URL}")
-    print(f"   Модель: {Config.LM_STUDIO_MODEL}")
-    print(f"   Температура: {Config.TEMPERATURE}")
-    print(f"   Макс. токенов: {Config.MAX_TOKENS}")
-    print(f"   Размер контекста: {Config.MAX_CONTEXT_MESSAGES} сообщений")
-    print()
+    # Блок выводится одной записью в stdout, а не построчно
+    sys.stdout.write(
+        "📋 Конфигурация:\n"
+        f"   Префикс команд: {Config.PREFIX}\n"
+        f"   LM Studio URL: {Config.LM_STUDIO_URL}\n"
+        f"   Модель: {Config.LM_STUDIO_MODEL}\n"
+        f"   Температура: {Config.TEMPERATURE}\n"
+        f"   Макс. токенов: {Config.MAX_TOKENS}\n"
+        f"   Размер контекста: {Config.MAX_CONTEXT_MESSAGES} сообщений\n"
+        "\n"
+    )
+    sys.stdout.flush()
 
 
 def run_checks():
@@ -149,6 +153,9 @@ def main_wrapper():
     print("🚀 Запуск бота...\n")
     print("=" * 60)
     
+    # Бот импортируется после проверок: без зависимостей - понятное сообщение, а не ImportError
+    from bot import main
+    
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
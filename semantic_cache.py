@@ -0,0 +1,255 @@
+"""
+Семантический кэш ответов LLM
+Повторные (в том числе перефразированные) вопросы обслуживаются без обращения к модели
+"""
+
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Hashable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Кэш ответов с поиском по косинусной близости эмбеддингов"""
+    
+    def __init__(
+        self,
+        model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        tau: float = 0.85,
+        max_entries: int = 5000,
+        enabled: bool = True,
+        ttl: Optional[float] = None
+    ):
+        """
+        Args:
+            model: Название модели sentence-transformers для эмбеддингов
+            tau: Порог косинусной близости для попадания в кэш
+            max_entries: Максимальное количество записей во всём кэше
+            enabled: Включить кэш (отключается сам, если нет зависимостей)
+            ttl: Время жизни записи в секундах (None = без ограничения)
+        """
+        self.model_name = model
+        self.tau = tau
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled and NUMPY_AVAILABLE and SENTENCE_TRANSFORMERS_AVAILABLE
+        
+        if enabled and not self.enabled:
+            logger.warning(
+                "Семантический кэш отключён: установите numpy и sentence-transformers"
+            )
+        
+        self._model = None
+        self._model_lock = threading.Lock()
+        
+        # Структура: {scope: матрица (N, D) float32}, строки в порядке добавления
+        # scope - ID канала или любой другой хэшируемый ключ (например, команда + промпт)
+        self._vectors: Dict[Hashable, "np.ndarray"] = {}
+        self._responses: Dict[Hashable, List[str]] = {}
+        self._created: Dict[Hashable, List[float]] = {}
+        
+        # Порядок добавления записей (по scope) для вытеснения самых старых
+        self._order: deque = deque()
+        # Записи, удалённые по TTL, но ещё стоящие в _order: {scope: количество}
+        self._dropped: Dict[Hashable, int] = {}
+        self._size = 0
+        
+        self.stats = {
+            'hits': 0,
+            'misses': 0
+        }
+    
+    def _encode_sync(self, text: str) -> "np.ndarray":
+        """Синхронное вычисление нормализованного эмбеддинга"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    logger.info(f"Загрузка модели эмбеддингов {self.model_name}")
+                    self._model = SentenceTransformer(self.model_name)
+        
+        return self._model.encode(
+            text,
+            normalize_embeddings=True
+        ).astype(np.float32)
+    
+    async def encode(self, text: str) -> Optional["np.ndarray"]:
+        """
+        Вычисление эмбеддинга текста вне event loop
+        
+        Args:
+            text: Текст для эмбеддинга
+        
+        Returns:
+            Нормализованный вектор или None если кэш недоступен
+        """
+        if not self.enabled:
+            return None
+        
+        try:
+            return await asyncio.to_thread(self._encode_sync, text)
+        except Exception as e:
+            logger.error(f"Ошибка вычисления эмбеддинга: {e}")
+            return None
+    
+    def lookup(
+        self,
+        embedding: Optional["np.ndarray"],
+        scope: Hashable,
+        tau: Optional[float] = None
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Поиск ближайшего ответа в кэше
+        
+        Args:
+            embedding: Нормализованный эмбеддинг запроса
+            scope: ID канала или другой ключ области кэша
+            tau: Порог близости (None = порог кэша)
+        
+        Returns:
+            (ответ, близость) если близость >= tau и запись не устарела, иначе None
+        """
+        if embedding is None:
+            return None
+        
+        # Устаревшая запись не должна заслонять свежую - удаляем их до поиска
+        self._expire(scope)
+        vectors = self._vectors.get(scope)
+        
+        if vectors is None or not len(vectors):
+            self.stats['misses'] += 1
+            return None
+        
+        # Векторы нормализованы - скалярное произведение равно косинусу
+        scores = np.dot(vectors, embedding)
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+        
+        if similarity < (self.tau if tau is None else tau):
+            self.stats['misses'] += 1
+            return None
+        
+        self.stats['hits'] += 1
+        return self._responses[scope][best], similarity
+    
+    def insert(
+        self,
+        embedding: Optional["np.ndarray"],
+        scope: Hashable,
+        response: str
+    ):
+        """
+        Добавление ответа в кэш
+        
+        Args:
+            embedding: Нормализованный эмбеддинг запроса
+            scope: ID канала или другой ключ области кэша
+            response: Ответ модели
+        """
+        if embedding is None:
+            return
+        
+        self._expire(scope)
+        vectors = self._vectors.get(scope)
+        row = embedding.reshape(1, -1)
+        now = time.monotonic()
+        
+        if vectors is None:
+            self._vectors[scope] = row.copy()
+            self._responses[scope] = [response]
+            self._created[scope] = [now]
+        else:
+            self._vectors[scope] = np.vstack((vectors, row))
+            self._responses[scope].append(response)
+            self._created[scope].append(now)
+        
+        self._order.append(scope)
+        self._size += 1
+        
+        # Вытесняем самые старые записи
+        while self._size > self.max_entries:
+            self._evict_oldest()
+    
+    def _drop_first(self, scope: Hashable, count: int):
+        """Удаление первых (самых старых) записей области"""
+        self._vectors[scope] = self._vectors[scope][count:]
+        del self._responses[scope][:count]
+        del self._created[scope][:count]
+        self._size -= count
+        
+        if not self._responses[scope]:
+            del self._vectors[scope]
+            del self._responses[scope]
+            del self._created[scope]
+    
+    def _expire(self, scope: Hashable):
+        """Удаление устаревших по TTL записей области"""
+        created = self._created.get(scope)
+        if self.ttl is None or not created:
+            return
+        
+        # Записи области в порядке добавления - устаревшие идут первыми
+        expired = bisect.bisect_left(created, time.monotonic() - self.ttl)
+        if expired:
+            self._drop_first(scope, expired)
+            # Их места в _order пропускаются при вытеснении
+            self._dropped[scope] = self._dropped.get(scope, 0) + expired
+    
+    def _evict_oldest(self):
+        """Удаление самой старой записи из кэша"""
+        while True:
+            scope = self._order.popleft()
+            
+            dropped = self._dropped.get(scope)
+            if not dropped:
+                break
+            
+            # Запись уже удалена по TTL
+            if dropped == 1:
+                del self._dropped[scope]
+            else:
+                self._dropped[scope] = dropped - 1
+        
+        # Записи хранятся в порядке добавления - самая старая первая
+        self._drop_first(scope, 1)
+    
+    def clear(self, scope: Optional[Hashable] = None):
+        """
+        Очистка кэша
+        
+        Args:
+            scope: ID канала или другой ключ области кэша (None = весь кэш)
+        """
+        if scope is None:
+            self._vectors.clear()
+            self._responses.clear()
+            self._created.clear()
+            self._order.clear()
+            self._dropped.clear()
+            self._size = 0
+            return
+        
+        self._vectors.pop(scope, None)
+        self._size -= len(self._responses.pop(scope, ()))
+        self._created.pop(scope, None)
+        self._dropped.pop(scope, None)
+        self._order = deque(key for key in self._order if key != scope)
+    
+    def __len__(self) -> int:
+        return self._size
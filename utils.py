@@ -2,11 +2,14 @@
 Утилиты для бота
 """
 
+import atexit
+import functools
 import logging
+import logging.handlers
+import queue
 import sys
 import traceback
-from datetime import datetime
-from typing import Optional
+from typing import Iterable, Optional
 import discord
 from discord.ext import commands
 from config import Config
@@ -25,19 +28,36 @@ def setup_logging():
     console_handler.setFormatter(formatter)
     console_handler.setLevel(getattr(logging, Config.LOG_LEVEL))
     
-    # Файловый handler
-    file_handler = logging.FileHandler(
+    # Файловый handler с ротацией
+    file_handler = logging.handlers.RotatingFileHandler(
         Config.LOG_FILE,
-        encoding='utf-8'
+        maxBytes=10 * 1024 * 1024,
+        backupCount=3,
+        encoding='utf-8',
+        delay=True
     )
     file_handler.setFormatter(formatter)
     file_handler.setLevel(logging.DEBUG)
     
+    # Запись в файл - в отдельном потоке: логирование в обработчиках не ждёт диск
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setLevel(logging.DEBUG)
+    
+    listener = logging.handlers.QueueListener(
+        log_queue,
+        file_handler,
+        respect_handler_level=True
+    )
+    listener.start()
+    # При выходе дописываем оставшиеся в очереди записи
+    atexit.register(listener.stop)
+    
     # Настройка root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG)
     root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
+    root_logger.addHandler(queue_handler)
     
     # Уменьшаем уровень логирования для discord.py
     logging.getLogger('discord').setLevel(logging.WARNING)
@@ -132,7 +152,7 @@ def create_embed(
         title=title,
         description=description,
         color=color or Config.EMBED_COLOR,
-        timestamp=datetime.utcnow()
+        timestamp=discord.utils.utcnow()
     )
     
     if fields:
@@ -157,7 +177,7 @@ def create_error_embed(title: str, description: str) -> discord.Embed:
         title=f"❌ {title}",
         description=description,
         color=Config.ERROR_COLOR,
-        timestamp=datetime.utcnow()
+        timestamp=discord.utils.utcnow()
     )
 
 
@@ -167,7 +187,7 @@ def create_success_embed(title: str, description: str) -> discord.Embed:
         title=f"✅ {title}",
         description=description,
         color=Config.EMBED_COLOR,
-        timestamp=datetime.utcnow()
+        timestamp=discord.utils.utcnow()
     )
 
 
@@ -177,10 +197,14 @@ def create_warning_embed(title: str, description: str) -> discord.Embed:
         title=f"⚠️ {title}",
         description=description,
         color=Config.WARNING_COLOR,
-        timestamp=datetime.utcnow()
+        timestamp=discord.utils.utcnow()
     )
 
 
+# Единицы времени работы: (секунд в единице, подпись), от крупных к мелким
+UPTIME_UNITS = ((86400, "д"), (3600, "ч"), (60, "м"), (1, "с"))
+
+
 def format_uptime(seconds: int) -> str:
     """
     Форматирование времени работы
@@ -191,21 +215,55 @@ def format_uptime(seconds: int) -> str:
     Returns:
         Форматированная строка
     """
-    days, remainder = divmod(int(seconds), 86400)
-    hours, remainder = divmod(remainder, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    
+    remainder = int(seconds)
     parts = []
-    if days > 0:
-        parts.append(f"{days}д")
-    if hours > 0:
-        parts.append(f"{hours}ч")
-    if minutes > 0:
-        parts.append(f"{minutes}м")
-    if seconds > 0 or not parts:
-        parts.append(f"{seconds}с")
     
-    return " ".join(parts)
+    for size, label in UPTIME_UNITS:
+        value, remainder = divmod(remainder, size)
+        if value > 0:
+            parts.append(f"{value}{label}")
+    
+    return " ".join(parts) or "0с"
+
+
+# Расширения изображений для вложений без content_type
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
+
+
+@functools.lru_cache(maxsize=32)
+def _content_type_is_image(content_type: str) -> bool:
+    """Проверка MIME-типа (вариантов немного - результат кэшируется)"""
+    return content_type.startswith('image/')
+
+
+def is_image_attachment(attachment: discord.Attachment) -> bool:
+    """
+    Проверка, является ли вложение изображением
+    
+    Args:
+        attachment: Вложение Discord
+        
+    Returns:
+        True если вложение - изображение
+    """
+    if attachment.content_type:
+        return _content_type_is_image(attachment.content_type)
+    
+    # Discord не всегда присылает content_type - смотрим на расширение файла
+    return attachment.filename.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def first_image_url(attachments: Iterable[discord.Attachment]) -> Optional[str]:
+    """
+    URL первого изображения среди вложений
+    
+    Args:
+        attachments: Вложения сообщения
+        
+    Returns:
+        URL изображения или None
+    """
+    return next((a.url for a in attachments if is_image_attachment(a)), None)
 
 
 def truncate_text(text: str, max_length: int = 2000) -> str:
@@ -239,12 +297,17 @@ def is_admin(ctx: commands.Context) -> bool:
         return True
     
     if Config.ADMIN_ROLE_IDS:
-        user_role_ids = [role.id for role in ctx.author.roles]
-        return any(role_id in Config.ADMIN_ROLE_IDS for role_id in user_role_ids)
+        return not Config.ADMIN_ROLE_IDS.isdisjoint(role.id for role in ctx.author.roles)
     
     return False
 
 
+@functools.lru_cache(maxsize=4)
+def _moderator_role_ids(admin_ids: frozenset, moderator_ids: frozenset) -> frozenset:
+    """Роли с правами модератора: админские и модераторские (объединение кэшируется)"""
+    return admin_ids | moderator_ids
+
+
 def is_moderator(ctx: commands.Context) -> bool:
     """
     Проверка прав модератора
@@ -255,12 +318,13 @@ def is_moderator(ctx: commands.Context) -> bool:
     Returns:
         True если пользователь модератор
     """
-    if is_admin(ctx):
+    if ctx.author.guild_permissions.administrator:
         return True
     
-    if Config.MODERATOR_ROLE_IDS:
-        user_role_ids = [role.id for role in ctx.author.roles]
-        return any(role_id in Config.MODERATOR_ROLE_IDS for role_id in user_role_ids)
+    # Роли пользователя просматриваются один раз - сразу против обоих списков
+    role_ids = _moderator_role_ids(Config.ADMIN_ROLE_IDS, Config.MODERATOR_ROLE_IDS)
+    if role_ids:
+        return not role_ids.isdisjoint(role.id for role in ctx.author.roles)
     
     return False
 
@@ -5,53 +5,458 @@
 
 import aiohttp
 from aiohttp_socks import ProxyConnector
+import asyncio
 import logging
-from typing import List, Dict, Optional
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Dict, Optional
 from datetime import datetime
-import json
+from html import unescape
+from urllib.parse import parse_qs, urlparse
+from config import Config
+import fast_json
 
 logger = logging.getLogger(__name__)
 
+try:
+    import lxml  # noqa: F401 - только проверка наличия парсера для BeautifulSoup
+    HTML_PARSER = 'lxml'
+except ImportError:
+    # Встроенный парсер на чистом Python в разы медленнее
+    HTML_PARSER = 'html.parser'
+    logger.warning("lxml не установлен, HTML разбирается медленным html.parser (pip install lxml)")
+
+try:
+    from selectolax.parser import HTMLParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    SELECTOLAX_AVAILABLE = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Регулярные выражения разбора HTML (компилируются один раз)
+# Результат выдачи DuckDuckGo: ссылка-заголовок и (если есть до следующего результата) описание
+_DDG_RESULT_RE = re.compile(
+    r'<a[^>]*class="result__a"[^>]*href="(?P<href>[^"]+)"[^>]*>(?P<title>.*?)</a>'
+    r'(?:(?:(?!class="result__a").)*?<a[^>]*class="result__snippet"[^>]*>(?P<snippet>.*?)</a>)?',
+    re.DOTALL
+)
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+_SPACES_RE = re.compile(r' +')
+_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+# Кириллица в запросе - ищем сначала в русской Wikipedia
+_CYRILLIC_RE = re.compile(r'[А-Яа-яЁё]')
+# Начало запроса, на который Instant Answer API может дать готовый ответ
+_INSTANT_QUERY_RE = re.compile(r'^(what|who|where|define|когда|кто|что|где|определение)\b', re.IGNORECASE)
+
+# Теги страницы: без содержимого для LLM и с основным текстом
+_DROP_TAGS = ['script', 'style', 'nav', 'footer', 'header']
+_CONTENT_TAGS = ['p', 'h1', 'h2', 'h3', 'li']
+_CONTENT_SELECTOR = ', '.join(_CONTENT_TAGS)
+
+# Пул соединений собственной сессии (как у общей сессии бота)
+POOL_SETTINGS = {
+    'limit': 100,
+    'limit_per_host': 20,
+    'ttl_dns_cache': 300,
+    'keepalive_timeout': 75,
+}
+
+# Ограничения запросов к поисковым сервисам: {сайт: (одновременных запросов, мин. интервал в секундах)}
+SITE_LIMITS = {
+    'duckduckgo.com': (4, 0.25),
+    'wikipedia.org': (8, 0.0),
+}
+# Пауза после ответа "слишком много запросов": удваивается до максимума, сбрасывается успехом
+THROTTLE_BACKOFF_START = 1.0
+THROTTLE_BACKOFF_MAX = 60.0
+
+# Лимит загрузки страницы для извлечения текста (сжатие gzip/deflate aiohttp снимает сам)
+MAX_PAGE_BYTES = 512 * 1024
+PAGE_CONTENT_TYPES = frozenset({'text/html', 'application/xhtml+xml', 'text/plain'})
+
+
+def _looks_like_instant(query: str) -> bool:
+    """Короткий или фактоидный запрос, для которого стоит спрашивать Instant Answer API"""
+    return len(query.split()) <= 4 or _INSTANT_QUERY_RE.match(query.strip()) is not None
+
+
+def _ddg_result(title: str, href: str, snippet: str, query: str) -> Optional[Dict[str, str]]:
+    """
+    Результат поиска из ссылки HTML выдачи DuckDuckGo
+    
+    Returns:
+        Словарь результата или None, если ссылку не удалось разобрать
+    """
+    try:
+        parsed = urlparse(href)
+        
+        # Получаем реальный URL (DuckDuckGo использует редиректы);
+        # parse_qs уже декодирует значение параметра
+        if parsed.netloc == 'duckduckgo.com' and parsed.path.startswith('/l/'):
+            url = parse_qs(parsed.query).get('uddg', [''])[0]
+            if not url:
+                return None
+            parsed = urlparse(url)
+        else:
+            url = href
+        
+        # Извлекаем домен для источника
+        source = parsed.netloc.replace('www.', '') or 'Web'
+    except ValueError:
+        return None
+    
+    if not snippet:
+        snippet = f'Результат поиска для "{query}"'
+    
+    return {
+        'title': title,
+        'snippet': snippet[:300],  # Ограничиваем длину
+        'url': url,
+        'source': source
+    }
+
+
+def _parse_ddg_regex(html: str, query: str, max_results: int) -> List[Dict[str, str]]:
+    """Разбор HTML выдачи DuckDuckGo одним регулярным выражением (без построения дерева)"""
+    results = []
+    
+    for match in _DDG_RESULT_RE.finditer(html):
+        title = unescape(_TAG_RE.sub('', match['title'])).strip()
+        if not title:
+            continue
+        
+        snippet = unescape(_TAG_RE.sub('', match['snippet'] or '')).strip()
+        result = _ddg_result(title, unescape(match['href']), snippet, query)
+        if result:
+            results.append(result)
+            if len(results) >= max_results:
+                break
+    
+    return results
+
+
+def _parse_ddg_selectolax(html: str, query: str, max_results: int) -> List[Dict[str, str]]:
+    """Разбор HTML выдачи DuckDuckGo через selectolax (парсер на C)"""
+    results = []
+    
+    for div in HTMLParser(html).css('div.result')[:max_results]:
+        try:
+            # Заголовок и ссылка
+            title_link = div.css_first('a.result__a')
+            if title_link is None:
+                continue
+            
+            # Описание (snippet)
+            snippet_elem = div.css_first('a.result__snippet')
+            
+            result = _ddg_result(
+                title_link.text(strip=True),
+                title_link.attributes.get('href') or '',
+                snippet_elem.text(strip=True) if snippet_elem is not None else '',
+                query
+            )
+            if result:
+                results.append(result)
+            
+        except Exception as e:
+            logger.debug(f"Ошибка парсинга результата: {e}")
+            continue
+    
+    return results
+
+
+def _parse_ddg_bs4(html: str, query: str, max_results: int) -> List[Dict[str, str]]:
+    """
+    Разбор HTML выдачи DuckDuckGo через BeautifulSoup
+    
+    Raises:
+        ImportError: BeautifulSoup не установлен
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+    # Дерево строится только из блоков результатов, остальная страница пропускается
+    soup = BeautifulSoup(
+        html,
+        HTML_PARSER,
+        parse_only=SoupStrainer('div', class_='result')
+    )
+    
+    results = []
+    
+    # Ищем все результаты поиска
+    for div in soup.find_all('div', class_='result')[:max_results]:
+        try:
+            # Заголовок и ссылка
+            title_link = div.find('a', class_='result__a')
+            if not title_link:
+                continue
+            
+            # Описание (snippet)
+            snippet_elem = div.find('a', class_='result__snippet')
+            
+            result = _ddg_result(
+                title_link.get_text(strip=True),
+                title_link.get('href', ''),
+                snippet_elem.get_text(strip=True) if snippet_elem else '',
+                query
+            )
+            if result:
+                results.append(result)
+            
+        except Exception as e:
+            logger.debug(f"Ошибка парсинга результата: {e}")
+            continue
+    
+    return results
+
+
+def _page_text_selectolax(html: str) -> str:
+    """Текст основного содержимого страницы через selectolax (парсер на C)"""
+    tree = HTMLParser(html)
+    
+    # Удаляем скрипты, стили и навигацию
+    tree.strip_tags(_DROP_TAGS)
+    
+    # Ищем основной контент
+    main_content = tree.css_first('article') or tree.css_first('main') or tree.body
+    
+    if main_content is None:
+        return tree.text(separator='\n', strip=True)
+    
+    # Извлекаем текст с параграфов
+    text_parts = (node.text(strip=True) for node in main_content.css(_CONTENT_SELECTOR))
+    return '\n'.join(part for part in text_parts if part)
+
+
+def _page_text_bs4(html: str) -> str:
+    """
+    Текст основного содержимого страницы через BeautifulSoup
+    
+    Raises:
+        ImportError: BeautifulSoup не установлен
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, HTML_PARSER)
+    
+    # Ищем основной контент
+    main_content = soup.find('article') or soup.find('main') or soup.find('body')
+    
+    # Скрипты, стили и навигацию удаляем только внутри него - обход поддерева, а не всей страницы
+    for script in (main_content or soup)(_DROP_TAGS):
+        script.decompose()
+    
+    if not main_content:
+        return soup.get_text(separator='\n', strip=True)
+    
+    # Извлекаем текст с параграфов (get_text один раз на параграф)
+    text_parts = (p.get_text(strip=True) for p in main_content.find_all(_CONTENT_TAGS))
+    return '\n'.join(part for part in text_parts if part)
+
+
+def _parse_ddg_html(html: str, query: str, max_results: int) -> List[Dict[str, str]]:
+    """Разбор HTML выдачи DuckDuckGo (выполняется в пуле потоков)"""
+    # Разметка выдачи простая и стабильная - сначала разбираем регулярным выражением
+    results = _parse_ddg_regex(html, query, max_results)
+    if results:
+        return results
+    
+    # Разметка изменилась - разбираем парсером: selectolax (быстрее) или BeautifulSoup
+    try:
+        if SELECTOLAX_AVAILABLE:
+            return _parse_ddg_selectolax(html, query, max_results)
+        return _parse_ddg_bs4(html, query, max_results)
+    except ImportError:
+        logger.warning("BeautifulSoup не установлен, разбор HTML парсером недоступен")
+        return []
+
+
+def _page_text(html: str) -> str:
+    """Очищенный текст страницы (выполняется в пуле потоков)"""
+    # Умное извлечение текста: selectolax (быстрее) или BeautifulSoup
+    try:
+        if SELECTOLAX_AVAILABLE:
+            clean_text = _page_text_selectolax(html)
+        else:
+            clean_text = _page_text_bs4(html)
+        
+        # Убираем множественные переносы строк
+        clean_text = _BLANK_LINES_RE.sub('\n\n', clean_text)
+        return _SPACES_RE.sub(' ', clean_text)
+        
+    except ImportError:
+        # Fallback на простую очистку HTML
+        logger.warning("BeautifulSoup не установлен, используем простую очистку")
+        clean_text = _TAG_RE.sub('', html)
+        return _WHITESPACE_RE.sub(' ', clean_text).strip()
+
 
 class WebSearchTool:
     """Инструмент веб-поиска для LLM с поддержкой прокси"""
     
-    def __init__(self, proxy_url: str = None):
+    def __init__(
+        self,
+        proxy_url: str = None,
+        session: Optional[aiohttp.ClientSession] = None
+    ):
         """
         Инициализация веб-поиска
         
         Args:
             proxy_url: URL прокси для обхода блокировок
+            session: Общая HTTP сессия бота (если None - создаётся своя)
         """
-        self.session: Optional[aiohttp.ClientSession] = None
+        self.session: Optional[aiohttp.ClientSession] = session
+        # Внешнюю сессию закрывает её владелец (бот)
+        self._owns_session = session is None
         self.proxy_url = proxy_url
         self.search_api = "https://api.duckduckgo.com/"
         
+        # Одновременных загрузок страниц для search_with_content
+        self._fetch_slots = asyncio.Semaphore(8)
+        
+        # Разбор HTML в отдельных потоках: страница в сотни КБ не блокирует event loop
+        # (lxml и selectolax отпускают GIL на время разбора)
+        self._parse_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='html')
+        
+        # LRU кэш ответов источников с TTL: {(источник, параметры...): (время, значение)}
+        self._cache: OrderedDict = OrderedDict()
+        # Запросы к источникам, которые выполняются прямо сейчас: {ключ: задача}
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        # Текст страниц с ETag/Last-Modified для условных запросов после истечения TTL:
+        # {(url, max_length): (etag, last_modified, текст)}
+        self._page_validators: OrderedDict = OrderedDict()
+        
+        # Ограничение частоты запросов к сервисам (см. SITE_LIMITS)
+        self._site_slots = {site: asyncio.Semaphore(limit) for site, (limit, _) in SITE_LIMITS.items()}
+        self._site_next_call: Dict[str, float] = {}
+        # Сервис ответил 429: {сайт: (не обращаться до, текущая пауза)}
+        self._site_backoff: Dict[str, tuple] = {}
+        
     async def _get_session(self) -> aiohttp.ClientSession:
         """Получение или создание сессии с прокси"""
         if self.session is None or self.session.closed:
+            self._owns_session = True
+            connector = None
+            
             # Создаём сессию с прокси если указан
             if self.proxy_url:
                 try:
-                    connector = ProxyConnector.from_url(self.proxy_url)
-                    self.session = aiohttp.ClientSession(connector=connector)
+                    connector = ProxyConnector.from_url(self.proxy_url, **POOL_SETTINGS)
                     logger.info(f"WebSearchTool: Используется прокси {self.proxy_url}")
                 except Exception as e:
                     logger.warning(f"WebSearchTool: Не удалось создать прокси коннектор: {e}")
-                    self.session = aiohttp.ClientSession()
-            else:
-                self.session = aiohttp.ClientSession()
+            
+            if connector is None:
+                connector = aiohttp.TCPConnector(**POOL_SETTINGS)
+            
+            # Одна сессия на все запросы: DuckDuckGo, Wikipedia и страницы
+            # переиспользуют keep-alive соединения
+            self.session = aiohttp.ClientSession(connector=connector)
         return self.session
     
     async def close(self):
         """Закрытие сессии"""
-        if self.session and not self.session.closed:
+        if self._owns_session and self.session and not self.session.closed:
             await self.session.close()
+        self._parse_pool.shutdown(wait=False)
+    
+    async def _run_parse(self, func: Callable[..., Any], *args) -> Any:
+        """Выполнение разбора HTML в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._parse_pool, func, *args)
+    
+    @asynccontextmanager
+    async def _site_slot(self, site: str) -> AsyncIterator[None]:
+        """Слот запроса к сервису: не больше N одновременно и не чаще минимального интервала"""
+        _, interval = SITE_LIMITS[site]
+        async with self._site_slots[site]:
+            # Время запроса резервируется заранее, чтобы параллельные запросы шли с интервалом
+            now = time.monotonic()
+            call_at = max(now, self._site_next_call.get(site, 0.0))
+            self._site_next_call[site] = call_at + interval
+            if call_at > now:
+                await asyncio.sleep(call_at - now)
+            yield
+    
+    def _is_throttled(self, site: str) -> bool:
+        """Сервис недавно ответил 429 и пауза ещё не прошла"""
+        backoff = self._site_backoff.get(site)
+        if backoff is not None and time.monotonic() < backoff[0]:
+            logger.info(f"{site}: пауза после 429, запрос пропущен")
+            return True
+        return False
+    
+    def _note_status(self, site: str, status: int):
+        """Учёт ответа сервиса: 429 увеличивает паузу, успешный ответ её сбрасывает"""
+        if status == 429:
+            _, delay = self._site_backoff.get(site, (0.0, THROTTLE_BACKOFF_START / 2))
+            delay = min(delay * 2, THROTTLE_BACKOFF_MAX)
+            self._site_backoff[site] = (time.monotonic() + delay, delay)
+            logger.warning(f"{site}: слишком много запросов, пауза {delay:.0f} с")
+        elif status == 200:
+            self._site_backoff.pop(site, None)
+    
+    async def _cached(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ответ источника из кэша или общего запроса
+        
+        Одинаковые одновременные запросы ждут одну загрузку. Пустые ответы
+        не кэшируются - это может быть временная ошибка источника.
+        
+        Args:
+            key: Ключ кэша (источник и параметры запроса)
+            fetch: Функция без аргументов, возвращающая корутину загрузки
+            
+        Returns:
+            Ответ источника
+        """
+        entry = self._cache.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            if time.monotonic() - stored_at < Config.SEARCH_CACHE_TTL:
+                self._cache.move_to_end(key)
+                return value
+            del self._cache[key]
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        
+        # shield: отмена одного ожидающего не отменяет загрузку для остальных
+        value = await asyncio.shield(task)
+        
+        if value and key not in self._cache:
+            self._cache[key] = (time.monotonic(), value)
+            if len(self._cache) > Config.SEARCH_CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+        
+        return value
     
     async def search_duckduckgo(
         self,
         query: str,
         max_results: int = 5
+    ) -> List[Dict[str, str]]:
+        """Поиск через DuckDuckGo Instant Answer API (с кэшем, см. _search_duckduckgo)"""
+        return await self._cached(
+            ('ddg', query, max_results),
+            lambda: self._search_duckduckgo(query, max_results)
+        )
+    
+    async def _search_duckduckgo(
+        self,
+        query: str,
+        max_results: int = 5
     ) -> List[Dict[str, str]]:
         """
         Поиск через DuckDuckGo Instant Answer API
@@ -73,13 +478,18 @@ class WebSearchTool:
                 'skip_disambig': '1'
             }
             
+            if self._is_throttled('duckduckgo.com'):
+                return []
+            
             logger.info(f"Выполняется поиск DuckDuckGo: '{query}'")
             
-            async with session.get(
+            async with self._site_slot('duckduckgo.com'), session.get(
                 self.search_api,
                 params=params,
                 timeout=aiohttp.ClientTimeout(total=15)
             ) as response:
+                self._note_status('duckduckgo.com', response.status)
+                
                 # DuckDuckGo может возвращать 202 (Accepted) - это нормально
                 if response.status == 202:
                     logger.warning(f"DuckDuckGo вернул 202 (запрос принят, но нет мгновенных результатов)")
@@ -89,7 +499,7 @@ class WebSearchTool:
                     logger.error(f"DuckDuckGo API error: {response.status}")
                     return []
                 
-                data = await response.json()
+                data = await fast_json.read_json(response)
                 results = []
                 
                 # Обработка основного ответа
@@ -101,13 +511,24 @@ class WebSearchTool:
                         'source': data.get('AbstractSource', 'DuckDuckGo')
                     })
                 
-                # Обработка связанных тем
-                for topic in data.get('RelatedTopics', [])[:max_results - len(results)]:
-                    if isinstance(topic, dict) and 'Text' in topic:
+                # Обработка связанных тем (группы тем разворачиваются в порядке выдачи)
+                topics = list(reversed(data.get('RelatedTopics') or []))
+                while topics and len(results) < max_results:
+                    topic = topics.pop()
+                    if not isinstance(topic, dict):
+                        continue
+                    
+                    if 'Topics' in topic:
+                        topics.extend(reversed(topic['Topics']))
+                        continue
+                    
+                    text = topic.get('Text')
+                    if text:
+                        url = topic.get('FirstURL', '')
                         results.append({
-                            'title': topic.get('FirstURL', '').split('/')[-1].replace('_', ' '),
-                            'snippet': topic.get('Text', ''),
-                            'url': topic.get('FirstURL', ''),
+                            'title': url.rsplit('/', 1)[-1].replace('_', ' '),
+                            'snippet': text,
+                            'url': url,
                             'source': 'DuckDuckGo'
                         })
                 
@@ -125,6 +546,17 @@ class WebSearchTool:
         self,
         query: str,
         max_results: int = 5
+    ) -> List[Dict[str, str]]:
+        """Поиск через HTML версию DuckDuckGo (с кэшем, см. _search_duckduckgo_html)"""
+        return await self._cached(
+            ('ddg_html', query, max_results),
+            lambda: self._search_duckduckgo_html(query, max_results)
+        )
+    
+    async def _search_duckduckgo_html(
+        self,
+        query: str,
+        max_results: int = 5
     ) -> List[Dict[str, str]]:
         """
         Альтернативный поиск через HTML версию DuckDuckGo
@@ -145,9 +577,12 @@ class WebSearchTool:
                 'kl': 'ru-ru'  # Регион
             }
             
+            if self._is_throttled('duckduckgo.com'):
+                return []
+            
             logger.info(f"Выполняется HTML поиск DuckDuckGo: '{query}'")
             
-            async with session.get(
+            async with self._site_slot('duckduckgo.com'), session.get(
                 "https://html.duckduckgo.com/html/",
                 params=params,
                 timeout=aiohttp.ClientTimeout(total=15),
@@ -155,103 +590,31 @@ class WebSearchTool:
                     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
                 }
             ) as response:
+                self._note_status('duckduckgo.com', response.status)
+                
                 if response.status != 200:
                     logger.error(f"DuckDuckGo HTML error: {response.status}")
                     return []
                 
                 html = await response.text()
                 
-                # Парсинг результатов с BeautifulSoup для лучшего качества
-                try:
-                    from bs4 import BeautifulSoup
-                    soup = BeautifulSoup(html, 'html.parser')
-                    
-                    results = []
-                    
-                    # Ищем все результаты поиска
-                    result_divs = soup.find_all('div', class_='result')
-                    
-                    for div in result_divs[:max_results]:
-                        try:
-                            # Заголовок и ссылка
-                            title_link = div.find('a', class_='result__a')
-                            if not title_link:
-                                continue
-                            
-                            title = title_link.get_text(strip=True)
-                            href = title_link.get('href', '')
-                            
-                            # Получаем реальный URL (DuckDuckGo использует редиректы)
-                            if href.startswith('//duckduckgo.com/l/?'):
-                                import urllib.parse
-                                parsed = urllib.parse.urlparse(href)
-                                params = urllib.parse.parse_qs(parsed.query)
-                                url = params.get('uddg', [''])[0]
-                                if not url:
-                                    continue
-                                # Декодируем URL
-                                url = urllib.parse.unquote(url)
-                            else:
-                                url = href
-                            
-                            # Описание (snippet)
-                            snippet_elem = div.find('a', class_='result__snippet')
-                            snippet = snippet_elem.get_text(strip=True) if snippet_elem else ''
-                            
-                            if not snippet:
-                                snippet = f'Результат поиска для "{query}"'
-                            
-                            # Извлекаем домен для источника
-                            try:
-                                from urllib.parse import urlparse
-                                domain = urlparse(url).netloc
-                                source = domain.replace('www.', '')
-                            except:
-                                source = 'Web'
-                            
-                            results.append({
-                                'title': title,
-                                'snippet': snippet[:300],  # Ограничиваем длину
-                                'url': url,
-                                'source': source
-                            })
-                            
-                        except Exception as e:
-                            logger.debug(f"Ошибка парсинга результата: {e}")
-                            continue
-                    
-                    logger.info(f"DuckDuckGo HTML вернул {len(results)} результатов с разных сайтов")
-                    return results
-                    
-                except ImportError:
-                    # Fallback на regex если BeautifulSoup не установлен
-                    logger.warning("BeautifulSoup не установлен, используем простой парсинг")
-                    import re
-                    results = []
-                    
-                    pattern = r'<a class="result__a"[^>]*href="([^"]*)"[^>]*>([^<]*)</a>'
-                    matches = re.findall(pattern, html)
-                    
-                    for url, title in matches[:max_results]:
-                        if url and title:
-                            if url.startswith('//duckduckgo.com/l/?'):
-                                continue
-                            
-                            results.append({
-                                'title': title.strip(),
-                                'snippet': f'Результат поиска для "{query}"',
-                                'url': url,
-                                'source': 'Web'
-                            })
-                    
-                    logger.info(f"DuckDuckGo HTML вернул {len(results)} результатов")
-                    return results
+                results = await self._run_parse(_parse_ddg_html, html, query, max_results)
+                
+                logger.info(f"DuckDuckGo HTML вернул {len(results)} результатов с разных сайтов")
+                return results
                 
         except Exception as e:
             logger.error(f"Ошибка HTML поиска DuckDuckGo: {e}", exc_info=True)
             return []
     
     async def search_wikipedia(self, query: str, lang: str = 'en') -> Optional[Dict[str, str]]:
+        """Поиск в Wikipedia (с кэшем, см. _search_wikipedia)"""
+        return await self._cached(
+            ('wiki', lang, query),
+            lambda: self._search_wikipedia(query, lang)
+        )
+    
+    async def _search_wikipedia(self, query: str, lang: str = 'en') -> Optional[Dict[str, str]]:
         """
         Поиск в Wikipedia через API
         
@@ -267,68 +630,52 @@ class WebSearchTool:
             
             logger.info(f"Поиск в Wikipedia ({lang}): '{query}'")
             
-            # Поиск статьи
+            # Поиск статьи и её вступление - одним запросом (generator=search + prop=extracts)
             search_url = f"https://{lang}.wikipedia.org/w/api.php"
             search_params = {
                 'action': 'query',
                 'format': 'json',
-                'list': 'search',
-                'srsearch': query,
-                'srlimit': 1
+                'formatversion': 2,
+                'generator': 'search',
+                'gsrsearch': query,
+                'gsrlimit': 1,
+                'prop': 'extracts',
+                'exintro': 1,
+                'explaintext': 1
             }
             
-            async with session.get(
+            if self._is_throttled('wikipedia.org'):
+                return None
+            
+            async with self._site_slot('wikipedia.org'), session.get(
                 search_url,
                 params=search_params,
                 timeout=aiohttp.ClientTimeout(total=15)
             ) as response:
-                if response.status != 200:
-                    return None
+                self._note_status('wikipedia.org', response.status)
                 
-                search_data = await response.json()
-                search_results = search_data.get('query', {}).get('search', [])
-                
-                if not search_results:
-                    logger.info("Wikipedia: ничего не найдено")
+                if response.status != 200:
                     return None
                 
-                page_id = search_results[0]['pageid']
-                title = search_results[0]['title']
+                search_data = await fast_json.read_json(response)
             
-            # Получение содержимого
-            content_params = {
-                'action': 'query',
-                'format': 'json',
-                'prop': 'extracts',
-                'exintro': True,
-                'explaintext': True,
-                'pageids': page_id
-            }
+            pages = search_data.get('query', {}).get('pages', [])
             
-            async with session.get(
-                search_url,
-                params=content_params,
-                timeout=aiohttp.ClientTimeout(total=15)
-            ) as response:
-                if response.status != 200:
-                    return None
-                
-                content_data = await response.json()
-                pages = content_data.get('query', {}).get('pages', {})
-                
-                if str(page_id) in pages:
-                    extract = pages[str(page_id)].get('extract', '')
-                    
-                    logger.info(f"Wikipedia: найдена статья '{title}'")
-                    
-                    return {
-                        'title': title,
-                        'snippet': extract[:500] + '...' if len(extract) > 500 else extract,
-                        'url': f"https://{lang}.wikipedia.org/wiki/{title.replace(' ', '_')}",
-                        'source': f'Wikipedia ({lang.upper()})'
-                    }
-                
+            if not pages:
+                logger.info("Wikipedia: ничего не найдено")
                 return None
+            
+            title = pages[0]['title']
+            extract = pages[0].get('extract', '')
+            
+            logger.info(f"Wikipedia: найдена статья '{title}'")
+            
+            return {
+                'title': title,
+                'snippet': extract[:500] + '...' if len(extract) > 500 else extract,
+                'url': f"https://{lang}.wikipedia.org/wiki/{title.replace(' ', '_')}",
+                'source': f'Wikipedia ({lang.upper()})'
+            }
                 
         except asyncio.TimeoutError:
             logger.error(f"Таймаут при поиске Wikipedia")
@@ -361,6 +708,17 @@ class WebSearchTool:
         self,
         url: str,
         max_length: int = 2000
+    ) -> Optional[str]:
+        """Получение текста страницы по URL (с кэшем, см. _fetch_url_content)"""
+        return await self._cached(
+            ('url', url, max_length),
+            lambda: self._fetch_url_content(url, max_length)
+        )
+    
+    async def _fetch_url_content(
+        self,
+        url: str,
+        max_length: int = 2000
     ) -> Optional[str]:
         """
         Получение содержимого страницы по URL с умным извлечением текста
@@ -377,55 +735,68 @@ class WebSearchTool:
             
             logger.info(f"Загрузка содержимого URL: {url}")
             
+            headers = {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            }
+            
+            # Страница уже загружалась - спрашиваем сервер, изменилась ли она
+            key = (url, max_length)
+            validator = self._page_validators.get(key)
+            if validator is not None:
+                etag, last_modified, _ = validator
+                if etag:
+                    headers['If-None-Match'] = etag
+                if last_modified:
+                    headers['If-Modified-Since'] = last_modified
+            
             async with session.get(
                 url,
                 timeout=aiohttp.ClientTimeout(total=20),
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
+                headers=headers
             ) as response:
+                if response.status == 304 and validator is not None:
+                    logger.info("Страница не изменилась (304), используем сохранённый текст")
+                    self._page_validators.move_to_end(key)
+                    return validator[2]
+                
                 if response.status != 200:
                     logger.warning(f"URL вернул статус {response.status}")
                     return None
                 
-                # Получаем текст
-                html = await response.text()
+                # PDF, картинки и прочие не-HTML ответы не разбираем
+                if response.content_type not in PAGE_CONTENT_TYPES:
+                    logger.warning(f"Пропуск URL с типом {response.content_type}")
+                    return None
                 
-                # Пробуем использовать BeautifulSoup для умного извлечения
-                try:
-                    from bs4 import BeautifulSoup
-                    soup = BeautifulSoup(html, 'html.parser')
-                    
-                    # Удаляем скрипты и стили
-                    for script in soup(['script', 'style', 'nav', 'footer', 'header']):
-                        script.decompose()
-                    
-                    # Ищем основной контент
-                    main_content = soup.find('article') or soup.find('main') or soup.find('body')
-                    
-                    if main_content:
-                        # Извлекаем текст с параграфов
-                        paragraphs = main_content.find_all(['p', 'h1', 'h2', 'h3', 'li'])
-                        text_parts = [p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)]
-                        clean_text = '\n'.join(text_parts)
-                    else:
-                        clean_text = soup.get_text(separator='\n', strip=True)
-                    
-                    # Убираем множественные переносы строк
-                    import re
-                    clean_text = re.sub(r'\n\s*\n', '\n\n', clean_text)
-                    clean_text = re.sub(r' +', ' ', clean_text)
-                    
-                    logger.info(f"Извлечено {len(clean_text)} символов текста")
-                    return clean_text[:max_length]
-                    
-                except ImportError:
-                    # Fallback на простую очистку HTML
-                    logger.warning("BeautifulSoup не установлен, используем простую очистку")
-                    import re
-                    clean_text = re.sub(r'<[^>]+>', '', html)
-                    clean_text = re.sub(r'\s+', ' ', clean_text).strip()
-                    return clean_text[:max_length]
+                if (response.content_length or 0) > MAX_PAGE_BYTES:
+                    logger.warning(f"Пропуск URL: страница {response.content_length} байт")
+                    return None
+                
+                # Читаем не больше MAX_PAGE_BYTES: из страницы нужно лишь max_length символов
+                buffer = bytearray()
+                async for chunk in response.content.iter_chunked(16384):
+                    buffer += chunk
+                    if len(buffer) >= MAX_PAGE_BYTES:
+                        break
+                
+                html = buffer[:MAX_PAGE_BYTES].decode(response.charset or 'utf-8', errors='replace')
+                
+                clean_text = await self._run_parse(_page_text, html)
+                
+                logger.info(f"Извлечено {len(clean_text)} символов текста")
+                text = clean_text[:max_length]
+                
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                if text and (etag or last_modified):
+                    self._page_validators[key] = (etag, last_modified, text)
+                    self._page_validators.move_to_end(key)
+                    if len(self._page_validators) > Config.SEARCH_CACHE_MAX_ENTRIES:
+                        self._page_validators.popitem(last=False)
+                else:
+                    self._page_validators.pop(key, None)
+                
+                return text
                 
         except asyncio.TimeoutError:
             logger.error(f"Таймаут при загрузке URL")
@@ -434,6 +805,59 @@ class WebSearchTool:
             logger.error(f"Ошибка получения содержимого URL: {e}")
             return None
     
+    @staticmethod
+    def _normalize_result(result: Dict[str, str]) -> Dict[str, str]:
+        """
+        Приведение результата к единому виду: все ключи есть, пустые значения заменены
+        
+        Args:
+            result: Результат одного из источников
+            
+        Returns:
+            Словарь с ключами title, snippet, url, source
+        """
+        return {
+            'title': result.get('title') or 'Без названия',
+            'snippet': result.get('snippet') or 'Нет описания',
+            'url': result.get('url') or '',
+            'source': result.get('source') or 'Неизвестно'
+        }
+    
+    @staticmethod
+    def _dedupe_results(results: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Удаление повторов: одна и та же страница из разных источников
+        (ответ DuckDuckGo со ссылкой на Wikipedia, одна статья в выдаче API и HTML)
+        
+        Args:
+            results: Результаты в порядке приоритета источников
+            
+        Returns:
+            Результаты без повторов по URL и заголовку, порядок сохранён
+        """
+        seen = set()
+        unique = []
+        
+        for result in results:
+            keys = []
+            url = result.get('url')
+            if url:
+                parsed = urlparse(url)
+                netloc = parsed.netloc.lower().removeprefix('www.')
+                keys.append(('url', netloc + parsed.path.rstrip('/')))
+            title = (result.get('title') or '').strip().lower()
+            if title:
+                keys.append(('title', title))
+            
+            if any(key in seen for key in keys):
+                continue
+            seen.update(keys)
+            unique.append(result)
+        
+        if len(unique) < len(results):
+            logger.info(f"Убрано повторов в результатах: {len(results) - len(unique)}")
+        return unique
+    
     async def search(
         self,
         query: str,
@@ -451,43 +875,47 @@ class WebSearchTool:
         Returns:
             Список результатов поиска
         """
-        all_results = []
-        
-        # Поиск в DuckDuckGo (Instant Answer API)
-        ddg_results = await self.search_duckduckgo(query, max_results)
-        all_results.extend(ddg_results)
-        
-        # Если DuckDuckGo API не дал результатов (например, 202), пробуем HTML версию
-        if len(all_results) == 0:
-            logger.info("API не дал результатов, пробуем HTML версию DuckDuckGo")
-            ddg_html_results = await self.search_duckduckgo_html(query, max_results)
-            all_results.extend(ddg_html_results)
-        
-        # Если DuckDuckGo не дал результатов или дал мало, пробуем Wikipedia
-        if include_wikipedia and len(all_results) < max_results:
+        # Wikipedia не зависит от DuckDuckGo - запрашиваем её параллельно с ним
+        wiki_tasks = []
+        if include_wikipedia:
             # Определяем язык запроса (простая эвристика)
-            is_russian = any(ord('а') <= ord(char.lower()) <= ord('я') for char in query)
+            is_russian = _CYRILLIC_RE.search(query) is not None
             
+            # Для русского запроса - сначала русская Wikipedia, затем английская
             if is_russian:
-                # Сначала пробуем русскую Wikipedia
                 logger.info("Запрос на русском, пробуем ru.wikipedia.org")
-                wiki_result = await self.search_wikipedia(query, lang='ru')
-                if wiki_result:
-                    all_results.append(wiki_result)
-                
-                # Если всё ещё мало результатов, пробуем английскую
-                if len(all_results) < max_results:
-                    wiki_result_en = await self.search_wikipedia(query, lang='en')
-                    if wiki_result_en:
-                        all_results.append(wiki_result_en)
-            else:
-                # Для английского запроса - только английская Wikipedia
-                wiki_result = await self.search_wikipedia(query, lang='en')
-                if wiki_result:
-                    all_results.append(wiki_result)
+            wiki_langs = ('ru', 'en') if is_russian else ('en',)
+            wiki_tasks = [
+                asyncio.create_task(self.search_wikipedia(query, lang=lang))
+                for lang in wiki_langs
+            ]
+        
+        try:
+            # Поиск в DuckDuckGo (Instant Answer API) - только для коротких фактоидных запросов,
+            # на развёрнутые вопросы он почти всегда отвечает пусто (202)
+            all_results = []
+            if _looks_like_instant(query):
+                all_results = list(await self.search_duckduckgo(query, max_results))
+            
+            # Если DuckDuckGo API не дал результатов (например, 202), пробуем HTML версию
+            if len(all_results) == 0:
+                logger.info("API не дал результатов, пробуем HTML версию DuckDuckGo")
+                all_results = list(await self.search_duckduckgo_html(query, max_results))
+            
+            # Wikipedia дополняет результаты, если DuckDuckGo дал мало
+            if wiki_tasks and len(all_results) < max_results:
+                for wiki_result in await asyncio.gather(*wiki_tasks):
+                    if wiki_result:
+                        all_results.append(wiki_result)
+        finally:
+            # Ответы Wikipedia не понадобились (или поиск отменён) - не ждём их
+            for task in wiki_tasks:
+                task.cancel()
+        
+        all_results = self._dedupe_results(all_results)
         
         logger.info(f"Всего найдено результатов: {len(all_results)}")
-        return all_results[:max_results]
+        return [self._normalize_result(result) for result in all_results[:max_results]]
     
     async def search_with_content(
         self,
@@ -516,28 +944,31 @@ class WebSearchTool:
         # Загружаем контент для каждого результата
         logger.info(f"Загрузка полного контента для {len(results)} результатов...")
         
-        enhanced_results = []
-        for result in results:
-            url = result.get('url', '')
-            
-            # Пропускаем если нет URL или это Wikipedia (уже есть snippet)
-            if not url or 'wikipedia.org' in url:
-                enhanced_results.append(result)
-                continue
-            
-            # Загружаем контент
-            content = await self.fetch_url_content(url, max_length=1500)
-            
+        # Пропускаем результаты без URL и Wikipedia (уже есть snippet)
+        to_fetch = [
+            result for result in results
+            if result.get('url') and 'wikipedia.org' not in result['url']
+        ]
+        
+        # Страницы загружаются параллельно, результаты остаются в исходном порядке
+        contents = await asyncio.gather(*(
+            self._fetch_limited(result['url'], max_length=1500) for result in to_fetch
+        ))
+        
+        for result, content in zip(to_fetch, contents):
             if content:
                 # Добавляем полный контент к результату
                 result['full_content'] = content
                 result['snippet'] = content[:500] + '...' if len(content) > 500 else content
                 logger.info(f"✅ Загружен контент с {result.get('source', 'сайта')}")
-            
-            enhanced_results.append(result)
         
-        logger.info(f"Подготовлено {len(enhanced_results)} результатов с контентом")
-        return enhanced_results
+        logger.info(f"Подготовлено {len(results)} результатов с контентом")
+        return results
+    
+    async def _fetch_limited(self, url: str, max_length: int) -> Optional[str]:
+        """Загрузка содержимого страницы с ограничением числа одновременных загрузок"""
+        async with self._fetch_slots:
+            return await self.fetch_url_content(url, max_length=max_length)
     
     def format_search_results(
         self,
@@ -557,14 +988,14 @@ class WebSearchTool:
         if not results:
             return f"Поиск по запросу '{query}' не дал результатов."
         
-        # Группируем результаты по источникам
-        sources_count = {}
-        for result in results:
-            source = result.get('source', 'Unknown')
-            sources_count[source] = sources_count.get(source, 0) + 1
+        # Число различных источников
+        sources_count = len({result.get('source', 'Unknown') for result in results})
         
-        formatted = f"🔍 Результаты поиска по запросу '{query}':\n"
-        formatted += f"Найдено: {len(results)} результатов с {len(sources_count)} источников\n\n"
+        # Части собираются в список и склеиваются один раз в конце
+        parts = [
+            f"🔍 Результаты поиска по запросу '{query}':\n",
+            f"Найдено: {len(results)} результатов с {sources_count} источников\n\n"
+        ]
         
         for i, result in enumerate(results, 1):
             title = result.get('title', 'Без названия')
@@ -572,24 +1003,84 @@ class WebSearchTool:
             url = result.get('url', '')
             snippet = result.get('snippet', 'Нет описания')
             
-            formatted += f"═══ Результат #{i} ═══\n"
-            formatted += f"📌 {title}\n"
-            formatted += f"🌐 Источник: {source}\n"
+            parts.append(f"═══ Результат #{i} ═══\n")
+            parts.append(f"📌 {title}\n")
+            parts.append(f"🌐 Источник: {source}\n")
             
             if url:
-                formatted += f"🔗 URL: {url}\n"
+                parts.append(f"🔗 URL: {url}\n")
             
-            formatted += f"📄 Описание:\n{snippet}\n"
+            parts.append(f"📄 Описание:\n{snippet}\n")
             
             # Если есть полный контент, добавляем его
             if 'full_content' in result and result['full_content']:
-                formatted += f"\n📖 Полный текст (фрагмент):\n{result['full_content'][:800]}...\n"
+                parts.append(f"\n📖 Полный текст (фрагмент):\n{result['full_content'][:800]}...\n")
             
-            formatted += "\n"
+            parts.append("\n")
         
-        formatted += f"💡 Используй информацию из этих {len(results)} источников для ответа.\n"
+        parts.append(f"💡 Используй информацию из этих {len(results)} источников для ответа.\n")
         
-        return formatted
+        return ''.join(parts)
+
+
+# Ключевые слова, при которых LLM получает данные из веб-поиска
+SEARCH_KEYWORDS = (
+    # Вопросительные слова
+    'что такое', 'кто такой', 'кто такая', 'где находится', 'когда',
+    'какой', 'какая', 'какие', 'сколько', 'почему', 'зачем',
+    
+    # Запросы актуальной информации
+    'последние новости', 'актуальная информация', 'новости',
+    'последние события', 'что нового', 'свежие новости',
+    'сегодня', 'вчера', 'недавно', 'в этом году', 'в этом месяце',
+    
+    # Явные запросы поиска
+    'поиск', 'найди', 'найди информацию', 'расскажи о', 
+    'информация о', 'узнай', 'проверь', 'погугли',
+    
+    # Вопросы о текущем состоянии
+    'кто сейчас', 'кто является', 'кто занимает', 'кто возглавляет',
+    'текущий', 'сейчас', 'на данный момент', 'в настоящее время',
+    'актуальный', 'современный',
+    
+    # Вопросы требующие фактов
+    'факты о', 'статистика', 'данные о', 'цифры',
+    'победитель', 'лидер', 'чемпион', 'рекорд',
+    
+    # События и персоналии
+    'биография', 'история', 'достижения', 'карьера'
+)
+
+# Ключевые слова на английском
+ENGLISH_KEYWORDS = (
+    'what is', 'who is', 'where is', 'when', 'how',
+    'latest news', 'current', 'today', 'recent',
+    'search for', 'find', 'tell me about', 'information about',
+    'who won', 'winner', 'champion', 'latest'
+)
+
+# Вопросительные слова в начале короткого вопроса
+QUESTION_WORDS = frozenset({
+    'кто', 'что', 'где', 'когда', 'почему', 'как', 'какой',
+    'who', 'what', 'where', 'when', 'why', 'how', 'which'
+})
+
+# Все ключевые слова ищутся за один проход по сообщению, а не отдельным `in` на каждое
+if AHOCORASICK_AVAILABLE:
+    _KEYWORD_AUTOMATON = ahocorasick.Automaton()
+    for _keyword in SEARCH_KEYWORDS + ENGLISH_KEYWORDS:
+        _KEYWORD_AUTOMATON.add_word(_keyword, _keyword)
+    _KEYWORD_AUTOMATON.make_automaton()
+    del _keyword
+else:
+    _KEYWORD_RE = re.compile('|'.join(map(re.escape, SEARCH_KEYWORDS + ENGLISH_KEYWORDS)))
+
+
+def _has_search_keyword(message_lower: str) -> bool:
+    """Есть ли в сообщении (в нижнем регистре) ключевое слово для поиска"""
+    if AHOCORASICK_AVAILABLE:
+        return next(_KEYWORD_AUTOMATON.iter(message_lower), None) is not None
+    return _KEYWORD_RE.search(message_lower) is not None
 
 
 class SearchEnhancedLLM:
@@ -602,6 +1093,31 @@ class SearchEnhancedLLM:
         self.lm_client = lm_client
         self.web_search = web_search_tool
     
+    @staticmethod
+    def needs_search(user_message: str) -> bool:
+        """
+        Нужен ли веб-поиск для ответа на сообщение
+        
+        Args:
+            user_message: Сообщение пользователя
+            
+        Returns:
+            True, если generate_with_search выполнит поиск (при auto_search=True)
+        """
+        message_lower = user_message.lower()
+        
+        if _has_search_keyword(message_lower):
+            return True
+        
+        # Дополнительная проверка: если в сообщении есть вопросительный знак и оно короткое
+        # (вероятно, простой вопрос требующий факта)
+        if '?' in user_message and len(user_message.split()) < 15:
+            # Проверяем, начинается ли с вопросительного слова
+            first_words = message_lower.split()[:2]
+            return any(word in QUESTION_WORDS for word in first_words)
+        
+        return False
+    
     async def generate_with_search(
         self,
         user_message: str,
@@ -621,60 +1137,7 @@ class SearchEnhancedLLM:
         Returns:
             Ответ LLM с учетом данных из интернета
         """
-        # Определяем, нужен ли поиск
-        search_keywords = [
-            # Вопросительные слова
-            'что такое', 'кто такой', 'кто такая', 'где находится', 'когда',
-            'какой', 'какая', 'какие', 'сколько', 'почему', 'зачем',
-            
-            # Запросы актуальной информации
-            'последние новости', 'актуальная информация', 'новости',
-            'последние события', 'что нового', 'свежие новости',
-            'сегодня', 'вчера', 'недавно', 'в этом году', 'в этом месяце',
-            
-            # Явные запросы поиска
-            'поиск', 'найди', 'найди информацию', 'расскажи о', 
-            'информация о', 'узнай', 'проверь', 'погугли',
-            
-            # Вопросы о текущем состоянии
-            'кто сейчас', 'кто является', 'кто занимает', 'кто возглавляет',
-            'текущий', 'сейчас', 'на данный момент', 'в настоящее время',
-            'актуальный', 'современный',
-            
-            # Вопросы требующие фактов
-            'факты о', 'статистика', 'данные о', 'цифры',
-            'победитель', 'лидер', 'чемпион', 'рекорд',
-            
-            # События и персоналии
-            'биография', 'история', 'достижения', 'карьера'
-        ]
-        
-        # Проверяем на английском
-        english_keywords = [
-            'what is', 'who is', 'where is', 'when', 'how',
-            'latest news', 'current', 'today', 'recent',
-            'search for', 'find', 'tell me about', 'information about',
-            'who won', 'winner', 'champion', 'latest'
-        ]
-        
-        message_lower = user_message.lower()
-        
-        needs_search = auto_search and (
-            any(keyword in message_lower for keyword in search_keywords) or
-            any(keyword in message_lower for keyword in english_keywords)
-        )
-        
-        # Дополнительная проверка: если в сообщении есть вопросительный знак и оно короткое
-        # (вероятно, простой вопрос требующий факта)
-        if not needs_search and '?' in user_message and len(user_message.split()) < 15:
-            # Проверяем, начинается ли с вопросительного слова
-            first_words = message_lower.split()[:2]
-            question_words = ['кто', 'что', 'где', 'когда', 'почему', 'как', 'какой', 
-                            'who', 'what', 'where', 'when', 'why', 'how', 'which']
-            if any(word in question_words for word in first_words):
-                needs_search = True
-        
-        if needs_search:
+        if auto_search and self.needs_search(user_message):
             logger.info(f"🔍 Автоматический поиск активирован для запроса: {user_message[:50]}...")
             
             # Выполняем расширенный поиск с загрузкой контента